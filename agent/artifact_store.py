@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+import pandas as pd
+
+MANIFEST_DIR = "artifacts/manifests"
+HASH_LENGTH = 16
+
+
+# --- Nommage par contenu ---------------------------------------------------
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """Empreinte d'un fichier, lue par blocs (pas de chargement complet en mémoire)."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hash_dataframe(df):
+    """Empreinte du contenu d'un DataFrame (colonnes, types et valeurs), vectorisée."""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hash_key(*parts):
+    """Empreinte d'une clé composite (ex : données + type de graphique + titre)."""
+    return hash_bytes(json.dumps(parts, default=str, ensure_ascii=False).encode('utf-8'))
+
+
+def _atomic_write(filepath, data):
+    # Écriture dans un fichier temporaire unique puis renommage atomique :
+    # deux écritures concurrentes du même contenu ne se corrompent jamais
+    tmp = f"{filepath}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, filepath)
+
+
+def save_bytes(data, directory, prefix, extension):
+    """
+    Enregistre un artefact sous un nom dérivé de son contenu ({prefix}_{hash}.{ext}).
+    Un contenu identique n'est écrit qu'une seule fois.
+
+    Returns:
+        str: Chemin de l'artefact
+    """
+    os.makedirs(directory, exist_ok=True)
+    filepath = os.path.join(directory, f"{prefix}_{hash_bytes(data)}.{extension}")
+    if not os.path.exists(filepath):
+        _atomic_write(filepath, data)
+    return filepath
+
+
+def adopt_file(tmp_path, directory, prefix, extension, content_hash=None):
+    """
+    Renomme un fichier écrit sous un nom temporaire vers son nom par contenu
+    (ou supprime le doublon si cet artefact existe déjà).
+    """
+    content_hash = content_hash or hash_file(tmp_path)
+    filepath = os.path.join(directory, f"{prefix}_{content_hash}.{extension}")
+    if os.path.exists(filepath):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, filepath)
+    return filepath
+
+
+def temp_path(directory, extension):
+    """Nom temporaire unique (UUID) pour une écriture en streaming."""
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"tmp_{uuid.uuid4().hex}.{extension}")
+
+
+# --- Manifeste par session --------------------------------------------------
+
+class SessionManifest:
+    """
+    Liste des artefacts (résultats, exports, graphiques) produits pour une session,
+    persistée en JSON dans artifacts/manifests/<session_id>.json.
+    """
+
+    def __init__(self, session_id, directory=MANIFEST_DIR):
+        self.session_id = session_id
+        self.path = os.path.join(directory, f"{session_id}.json")
+        self._lock = threading.Lock()
+        self.entries = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def record(self, kind, path=None, **meta):
+        entry = {'kind': kind, 'path': path, 'created_at': time.time(), **meta}
+        with self._lock:
+            self.entries.append(entry)
+            self._save()
+        return entry
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        _atomic_write(self.path, json.dumps(self.entries, ensure_ascii=False, indent=2, default=str).encode('utf-8'))
+
+    def since(self, index):
+        """Artefacts enregistrés après la position donnée (ex : pendant une question)."""
+        with self._lock:
+            return self.entries[index:]
+
+    def latest(self, kind, entries=None):
+        for entry in reversed(entries if entries is not None else self.entries):
+            if entry['kind'] == kind:
+                return entry
+        return None
+
+    def clear(self, delete_files=True, keep_kinds=()):
+        """
+        Vide le manifeste et supprime les fichiers de la session
+        (sauf ceux des types listés dans keep_kinds, gérés par ailleurs).
+        """
+        with self._lock:
+            if delete_files:
+                for entry in self.entries:
+                    if entry['kind'] in keep_kinds:
+                        continue
+                    if entry.get('path') and os.path.exists(entry['path']):
+                        try:
+                            os.remove(entry['path'])
+                        except OSError:
+                            pass
+            self.entries = []
+            self._save()
+
+
+_current_manifest = contextvars.ContextVar("current_manifest", default=None)
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(session_id):
+    with _manifests_lock:
+        if session_id not in _manifests:
+            _manifests[session_id] = SessionManifest(session_id)
+        return _manifests[session_id]
+
+
+@contextmanager
+def session_scope(session_id):
+    """
+    Rattache les artefacts produits dans ce bloc (outils compris) au manifeste
+    de la session. Utilisé par l'interface autour de l'appel à l'agent/au pipeline.
+    """
+    manifest = get_manifest(session_id)
+    token = _current_manifest.set(manifest)
+    try:
+        yield manifest
+    finally:
+        _current_manifest.reset(token)
+
+
+def record_artifact(kind, path=None, **meta):
+    """Enregistre un artefact dans le manifeste de la session courante (s'il y en a une)."""
+    manifest = _current_manifest.get()
+    if manifest is not None:
+        return manifest.record(kind, path, **meta)
+    return None
@@ -0,0 +1,300 @@
+"""
+Exécution par lots d'une liste de questions (ex : data/user_input.txt chaque nuit).
+
+    python batch_runner.py data/user_input.txt --workers 4 --rpm 60
+    python batch_runner.py questions.jsonl --mode agent --output artifacts/batch/nuit.jsonl
+
+Chaque question terminée est ajoutée immédiatement au journal JSONL (--output) :
+après un arrêt brutal, relancer la même commande ne retraite que les questions
+absentes ou en échec transitoire (quota, indisponibilité de l'API), sans
+redépenser d'appels LLM pour les autres : un échec déterministe (SQL invalide
+après réparation, plan refusé...) n'est refait qu'avec --retry-all. À la fin,
+le manifeste consolidé (SQL, nombre de lignes, fichiers produits, durées,
+erreurs) est écrit à côté du journal (même nom, extension .json).
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from artifact_store import hash_key, session_scope
+from llm_registry import set_rate_limit
+from orchestrator import arun_pipeline, create_agent, PIPELINE_CONCURRENCY
+from result_store import get_result_store
+from tool_results import ChartResult, QueryResult, SqlSpec, message_text, on_tool_result
+
+BATCH_DIR = "artifacts/batch"
+MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", 4))
+BACKOFF_SECONDS = float(os.getenv("BATCH_BACKOFF_SECONDS", 2))
+
+# Erreurs de quota / indisponibilité de l'API Gemini : on réessaie plus tard
+_TRANSIENT_ERROR = re.compile(
+    r"429|503|resource.?exhausted|quota|rate.?limit|unavailable|deadline|timed? ?out",
+    re.IGNORECASE,
+)
+
+
+# --- Lecture des questions ---------------------------------------------------
+
+def load_questions(filepath):
+    """
+    Lit un fichier de questions.
+    - .jsonl : un objet par ligne ({"id", "question"} ; "input", "body" ou "title" acceptés)
+    - texte : les questions entre « » si le fichier en contient (format de
+      data/user_input.txt), sinon une question par ligne non vide.
+
+    Returns:
+        list: [{'id', 'question'}] - l'id est stable d'une exécution à l'autre (reprise)
+    """
+    with open(filepath, encoding='utf-8') as f:
+        content = f.read()
+
+    questions = []
+    if filepath.endswith('.jsonl'):
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            text = item.get('question') or item.get('input') or item.get('body') or item.get('title')
+            if text:
+                questions.append({'id': item.get('id') or item.get('request_id'), 'question': text.strip()})
+    else:
+        quoted = re.findall(r"«\s*(.+?)\s*»", content, re.DOTALL)
+        lines = quoted or [
+            re.sub(r"^\d+[.)]\s*", "", line).strip()
+            for line in content.splitlines()
+            if line.strip() and not line.strip().startswith('---')
+        ]
+        questions = [{'id': None, 'question': " ".join(text.split())} for text in lines if text]
+
+    for question in questions:
+        if not question['id']:
+            question['id'] = hash_key(question['question'])
+    return questions
+
+
+# --- Journal (reprise après arrêt) --------------------------------------------
+
+def pending_questions(questions, records, retry_failed=True, retry_deterministic=False):
+    """
+    Questions à (re)traiter : absentes du journal, ou en échec transitoire
+    (quota, indisponibilité) si retry_failed ; les échecs déterministes
+    ne sont refaits qu'avec retry_deterministic.
+    """
+    todo = []
+    for question in questions:
+        record = records.get(question['id'])
+        if record is None:
+            todo.append(question)
+        elif not record['success'] and retry_failed:
+            # Journal antérieur au champ is_transient : classé d'après le message d'erreur
+            transient = record.get('is_transient')
+            if transient is None:
+                transient = is_transient(record.get('error') or "")
+            if transient or retry_deterministic:
+                todo.append(question)
+    return todo
+
+
+def read_journal(journal_path):
+    """Dernier enregistrement par question déjà traitée ({id: record})."""
+    records = {}
+    if not os.path.exists(journal_path):
+        return records
+    with open(journal_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Dernière ligne tronquée par un arrêt brutal : ignorée, la question sera refaite
+                continue
+            records[record['id']] = record
+    return records
+
+
+def append_journal(journal_path, record):
+    # Écriture immédiate et synchronisée : une question terminée n'est jamais perdue
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_manifest(manifest_path, questions, records, started_at):
+    results = [records[q['id']] for q in questions if q['id'] in records]
+    manifest = {
+        'started_at': started_at,
+        'finished_at': time.time(),
+        'total': len(questions),
+        'succeeded': sum(1 for r in results if r['success']),
+        'failed': sum(1 for r in results if not r['success']),
+        'results': results,
+    }
+    tmp = f"{manifest_path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+# --- Exécution ---------------------------------------------------------------
+
+def is_transient(error):
+    """Erreur de quota / indisponibilité (exception ou message) : un nouvel essai peut réussir."""
+    if isinstance(error, str):
+        return bool(_TRANSIENT_ERROR.search(error))
+    return bool(_TRANSIENT_ERROR.search(f"{type(error).__name__} {error}"))
+
+
+async def _run_agent(agent, question):
+    """Une question en mode agent : les objets des outils donnent SQL, résultat et graphique."""
+    collected = []
+    with on_tool_result(collected.append):
+        response = await agent.ainvoke({"input": question})
+
+    result = {'success': False, 'question': question, 'sql': None, 'viz_type': None,
+              'result_id': None, 'viz_path': None, 'row_count': 0, 'truncated': False,
+              'columns': [], 'llm_calls': None, 'error': None,
+              'output': message_text(response.get('output', ''))}
+    for item in collected:
+        if isinstance(item, SqlSpec):
+            result['sql'], result['viz_type'] = item.sql, item.viz_type
+        elif isinstance(item, QueryResult):
+            if item.success:
+                result.update(sql=item.sql or result['sql'], result_id=item.result_id,
+                              row_count=item.row_count, truncated=item.truncated,
+                              columns=item.columns, error=None)
+            else:
+                result['error'] = item.error
+        elif isinstance(item, ChartResult) and item.success:
+            result['viz_path'] = item.filepath
+    result['success'] = result['result_id'] is not None
+    return result
+
+
+def _record(question, result, attempts, started, export_path=None):
+    return {
+        'id': question['id'],
+        'question': question['question'],
+        'success': result['success'],
+        'sql': result['sql'],
+        'viz_type': result['viz_type'],
+        'row_count': result['row_count'],
+        'truncated': result['truncated'],
+        'columns': result['columns'],
+        'export_path': export_path,
+        'viz_path': result['viz_path'],
+        'llm_calls': result['llm_calls'],
+        'attempts': attempts,
+        'duration_s': round(time.perf_counter() - started, 3),
+        'finished_at': time.time(),
+        'error': result['error'],
+        # Échec transitoire (quota, API indisponible) : seul cas refait par défaut à la reprise
+        'is_transient': not result['success'] and result.get(
+            'is_transient', bool(result['error']) and is_transient(result['error'])),
+    }
+
+
+async def run_question(question, semaphore, agent=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Traite une question (pipeline ou agent) avec réessais et backoff exponentiel
+    sur les erreurs de quota de l'API. Ne lève jamais : l'erreur est dans le résultat.
+    """
+    async with semaphore:
+        started = time.perf_counter()
+        for attempt in range(1, max_attempts + 1):
+            try:
+                if agent is not None:
+                    result = await _run_agent(agent, question['question'])
+                else:
+                    # Rapport de nuit : on veut les images sur disque
+                    result = await arun_pipeline(question['question'], chart_output='png')
+                break
+            except Exception as e:
+                if attempt == max_attempts or not is_transient(e):
+                    result = {'success': False, 'sql': None, 'viz_type': None, 'row_count': 0,
+                              'truncated': False, 'columns': [], 'viz_path': None,
+                              'llm_calls': None, 'result_id': None, 'error': str(e),
+                              'is_transient': is_transient(e)}
+                    break
+                # Backoff exponentiel avec gigue : les workers ne repartent pas tous ensemble
+                delay = BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                print(f"⏳ {question['id']} : {e} - nouvel essai dans {delay:.1f}s", file=sys.stderr)
+                await asyncio.sleep(delay)
+
+        # Le stockage mémoire ne survit pas au processus : le résultat est exporté en CSV
+        export_path = None
+        if result.get('result_id'):
+            export_path = await asyncio.to_thread(get_result_store().export, result['result_id'], 'csv')
+        return _record(question, result, attempt, started, export_path)
+
+
+async def run_batch(questions, journal_path, workers=PIPELINE_CONCURRENCY, mode='pipeline',
+                    max_attempts=MAX_ATTEMPTS, retry_failed=True, retry_deterministic=False):
+    """
+    Traite les questions pas encore terminées du journal, `workers` à la fois
+    (voir pending_questions pour les échecs refaits).
+
+    Returns:
+        dict: le manifeste consolidé
+    """
+    started_at = time.time()
+    records = read_journal(journal_path)
+    todo = pending_questions(questions, records, retry_failed, retry_deterministic)
+    print(f"📋 {len(questions)} question(s), {len(questions) - len(todo)} déjà traitée(s), {len(todo)} à faire")
+
+    semaphore = asyncio.Semaphore(max(1, workers))
+    agent = create_agent() if mode == 'agent' else None
+    batch_name = os.path.splitext(os.path.basename(journal_path))[0]
+
+    async def run_one(question):
+        record = await run_question(question, semaphore, agent, max_attempts)
+        append_journal(journal_path, record)
+        records[question['id']] = record
+        status = "✅" if record['success'] else f"❌ {record['error']}"
+        print(f"{status} [{record['duration_s']:.1f}s] {question['question'][:80]}")
+
+    # Les fichiers produits sont rattachés au manifeste de session du lot
+    with session_scope(f"batch_{batch_name}"):
+        await asyncio.gather(*(run_one(q) for q in todo))
+
+    return write_manifest(os.path.splitext(journal_path)[0] + ".json", questions, records, started_at)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exécute une liste de questions en parallèle.")
+    parser.add_argument("questions", help="Fichier de questions (.txt ou .jsonl)")
+    parser.add_argument("--output", help="Journal JSONL (défaut : artifacts/batch/<nom du fichier>.jsonl)")
+    parser.add_argument("--workers", type=int, default=PIPELINE_CONCURRENCY, help="Questions traitées simultanément")
+    parser.add_argument("--rpm", type=float, default=None, help="Appels LLM maximum par minute (défaut : LLM_REQUESTS_PER_MINUTE)")
+    parser.add_argument("--mode", choices=["pipeline", "agent"], default="pipeline")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Essais par question (erreurs de quota)")
+    parser.add_argument("--no-retry-failed", action="store_true", help="Ne pas refaire les questions en échec du journal")
+    parser.add_argument("--retry-all", action="store_true", help="Refaire aussi les échecs déterministes (SQL, plan refusé)")
+    args = parser.parse_args(argv)
+
+    journal_path = args.output or os.path.join(
+        BATCH_DIR, os.path.splitext(os.path.basename(args.questions))[0] + ".jsonl"
+    )
+    os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+    if args.rpm is not None:
+        set_rate_limit(args.rpm)
+
+    manifest = asyncio.run(run_batch(
+        load_questions(args.questions),
+        journal_path,
+        workers=args.workers,
+        mode=args.mode,
+        max_attempts=args.max_attempts,
+        retry_failed=not args.no_retry_failed,
+        retry_deterministic=args.retry_all,
+    ))
+    print(f"\n📦 {manifest['succeeded']}/{manifest['total']} réussie(s) - manifeste : {os.path.splitext(journal_path)[0]}.json")
+    return 0 if manifest['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
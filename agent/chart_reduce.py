@@ -0,0 +1,145 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Taille maximale des données envoyées à un renderer (surchargeables par variables d'environnement)
+MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", 20))       # barres
+MAX_SLICES = int(os.getenv("CHART_MAX_SLICES", 8))                # parts de donut
+MAX_LINE_POINTS = int(os.getenv("CHART_MAX_LINE_POINTS", 1000))
+MAX_SCATTER_POINTS = int(os.getenv("CHART_MAX_SCATTER_POINTS", 5000))
+MAX_TABLE_ROWS = int(os.getenv("CHART_MAX_TABLE_ROWS", 50))
+
+OTHER_LABEL = "Autres"
+# Échantillonnage reproductible : mêmes données -> même image (cache de rendus)
+SAMPLE_SEED = 0
+
+
+def _top_n(df, limit):
+    """
+    Les limit-1 plus grandes valeurs, dans l'ordre des lignes (ORDER BY de la
+    requête conservé), le reste regroupé dans « Autres » en dernier.
+    """
+    values = pd.to_numeric(df.iloc[:, 1], errors='coerce')
+    if values.isna().all():
+        return df.head(limit), f"{limit} premières valeurs sur {len(df)}"
+    order = np.argsort(-values.fillna(-np.inf).to_numpy(), kind='stable')
+    top = df.iloc[np.sort(order[:limit - 1]), :2]
+    other = pd.DataFrame(
+        [[OTHER_LABEL, values.iloc[order[limit - 1:]].sum()]],
+        columns=df.columns[:2]
+    )
+    rest = len(df) - (limit - 1)
+    return pd.concat([top, other], ignore_index=True), f"top {limit - 1} + {rest} regroupées"
+
+
+def _numeric_axis(series):
+    """Axe x numérique pour la décimation (position si l'axe n'est pas numérique)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype('int64').to_numpy(dtype=float)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=float)
+    return np.arange(len(series), dtype=float)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets : indices des points qui conservent au mieux
+    la forme de la courbe. Une itération par bucket (threshold), chaque bucket
+    étant traité en NumPy : le coût ne dépend pas de la taille de l'entrée en Python.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y.astype(float))
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Point moyen du bucket suivant (ou dernier point)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Aire du triangle (précédent, candidat, moyenne suivante) pour chaque candidat
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        indices[i + 1] = previous
+    return indices
+
+
+def minmax_indices(values, threshold):
+    """
+    Décimation min/max : pour chaque bucket, les indices du minimum et du maximum
+    de chaque série (vectorisé par reshape ; les pics ne disparaissent pas).
+    """
+    n = len(values)
+    buckets = max(1, threshold // (2 * values.shape[1]))
+    size = int(np.ceil(n / buckets))
+    padded = np.full((buckets * size, values.shape[1]), np.nan)
+    padded[:n] = values
+    blocks = padded.reshape(buckets, size, values.shape[1])
+    offsets = (np.arange(buckets) * size)[:, None]
+    # Un bucket entièrement NaN (fin de tableau ou série vide) renvoie son premier indice
+    filled_min = np.where(np.isnan(blocks), np.inf, blocks)
+    filled_max = np.where(np.isnan(blocks), -np.inf, blocks)
+    picks = np.concatenate([
+        (filled_min.argmin(axis=1) + offsets).ravel(),
+        (filled_max.argmax(axis=1) + offsets).ravel(),
+        [0, n - 1],
+    ])
+    return np.unique(picks[picks < n])
+
+
+def _decimate_line(df, limit):
+    x = _numeric_axis(df.iloc[:, 0])
+    values = df.iloc[:, 1:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    if values.shape[1] == 1:
+        indices = lttb_indices(x, values[:, 0], limit)
+    else:
+        indices = minmax_indices(values, limit)
+    return df.iloc[indices].reset_index(drop=True), f"{len(indices)} points sur {len(df)}"
+
+
+def _sample(df, limit):
+    rng = np.random.default_rng(SAMPLE_SEED)
+    indices = np.sort(rng.choice(len(df), size=limit, replace=False))
+    return df.iloc[indices].reset_index(drop=True), f"échantillon de {limit} points sur {len(df)}"
+
+
+def _truncate(df, limit):
+    return df.head(limit), f"{limit} premières lignes sur {len(df)}"
+
+
+def reduce_for_chart(kind, df):
+    """
+    Réduit les données avant le rendu pour que le temps de rendu reste borné
+    quelle que soit la taille du résultat :
+    - bar/donut : top N + « Autres »
+    - line : LTTB (une série) ou min/max par bucket (plusieurs séries)
+    - scatter : échantillon aléatoire reproductible
+    - table : premières lignes
+
+    Returns:
+        tuple: (DataFrame réduit, note à ajouter au titre ou None si rien n'a été réduit)
+    """
+    limits = {
+        'bar': (MAX_CATEGORIES, _top_n),
+        'donut': (MAX_SLICES, _top_n),
+        'line': (MAX_LINE_POINTS, _decimate_line),
+        'scatter': (MAX_SCATTER_POINTS, _sample),
+        'table': (MAX_TABLE_ROWS, _truncate),
+    }
+    if kind not in limits:
+        return df, None
+    limit, reducer = limits[kind]
+    if len(df) <= limit or (kind in ('bar', 'donut') and len(df.columns) < 2):
+        return df, None
+    return reducer(df, limit)
+
+
+def reduced_title(title, note):
+    return f"{title} ({note})" if note else title
@@ -0,0 +1,262 @@
+import io
+import os
+import threading
+import concurrent.futures
+import multiprocessing
+import matplotlib
+from matplotlib.artist import setp
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+
+# Nombre de processus de rendu (0 = rendu dans un thread du processus courant)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+RENDER_DPI = 200
+# À incrémenter à chaque changement visuel des renderers : invalide le cache de rendus
+RENDER_STYLE_VERSION = 1
+
+
+# --- Renderers (API objet Figure/Agg : aucun état global, sûrs en parallèle) ---
+
+def _new_figure(figsize):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _create_donut_chart(df, title):
+    """Crée un Donut Chart (plus lisible qu'un Pie Chart classique)"""
+    if len(df.columns) < 2:
+        raise ValueError("Nécessite 2 colonnes (Labels, Valeurs)")
+
+    labels = df.iloc[:, 0]
+    values = df.iloc[:, 1]
+
+    # Création de la figure
+    fig, ax = _new_figure((10, 7))
+
+    # Création du donut
+    wedges, texts, autotexts = ax.pie(
+        values,
+        labels=labels,
+        autopct='%1.1f%%',
+        startangle=90,
+        pctdistance=0.85, # Pourcentage plus vers l'extérieur
+        wedgeprops=dict(width=0.5, edgecolor='white', linewidth=2), # L'anneau
+        colors=matplotlib.colormaps['Pastel1'].colors
+    )
+
+    # Styliser le texte
+    setp(texts, size=10, fontweight="bold")
+    setp(autotexts, size=9, color="white", fontweight="bold")
+
+    # Cercle blanc au centre (optionnel si wedgeprops width est utilisé, mais sécurise le look)
+    ax.add_artist(Circle((0, 0), 0.70, fc='white'))
+
+    ax.set_title(title, pad=20)
+    ax.axis('equal')
+
+    return fig
+
+def _create_bar_chart(df, title):
+    """Crée un Bar Chart avec annotations de valeurs"""
+    categories = df.iloc[:, 0].astype(str) # Force string pour x
+    values = df.iloc[:, 1]
+
+    fig, ax = _new_figure((12, 7))
+
+    # Barres avec une couleur unique mais esthétique
+    bars = ax.bar(categories, values, color='#3498db', alpha=0.8, edgecolor='white', linewidth=1)
+
+    ax.set_title(title, pad=20)
+    ax.set_xlabel(df.columns[0])
+    ax.set_ylabel(df.columns[1])
+
+    # Rotation des labels si beaucoup de catégories
+    if len(categories) > 5:
+        setp(ax.get_xticklabels(), rotation=45, ha='right')
+
+    # Grille horizontale seulement
+    ax.yaxis.grid(True, linestyle='--', alpha=0.7)
+    ax.xaxis.grid(False)
+
+    # Suppression des bordures inutiles (Haut et Droite)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    # Annotation des valeurs sur les barres
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(
+            bar.get_x() + bar.get_width()/2.,
+            height,
+            f'{height:,.0f}' if height > 100 else f'{height:.2f}', # Format intelligent
+            ha='center',
+            va='bottom',
+            fontsize=10,
+            fontweight='bold',
+            color='#444444'
+        )
+
+    return fig
+
+def _create_line_plot(df, title):
+    """Crée un Line Plot multi-séries"""
+    fig, ax = _new_figure((12, 7))
+
+    x_col = df.iloc[:, 0]
+
+    # Tracer toutes les colonnes restantes comme des lignes
+    for i, col in enumerate(df.columns[1:]):
+        ax.plot(
+            x_col,
+            df[col],
+            marker='o',
+            linewidth=2.5,
+            label=col,
+            alpha=0.9
+        )
+    ax.set_title(title, pad=20)
+    ax.set_xlabel(df.columns[0])
+    ax.legend(frameon=True, fancybox=True, shadow=True)
+    ax.grid(True, linestyle='--', alpha=0.5)
+
+    # Si x contient beaucoup de points, on allège les labels
+    if len(x_col) > 10:
+        setp(ax.get_xticklabels(), rotation=45)
+    return fig
+
+def _create_scatter_plot(df, title):
+    fig, ax = _new_figure((10, 7))
+
+    # Ajout d'une dimension couleur si 3ème colonne existe
+    c = df.iloc[:, 2] if len(df.columns) > 2 else None
+
+    scatter = ax.scatter(
+        df.iloc[:, 0],
+        df.iloc[:, 1],
+        c=c,
+        cmap='viridis' if c is not None else None,
+        alpha=0.7,
+        s=100,
+        edgecolor='white'
+    )
+
+    if c is not None:
+        fig.colorbar(scatter, ax=ax, label=df.columns[2])
+    ax.set_title(title)
+    ax.set_xlabel(df.columns[0])
+    ax.set_ylabel(df.columns[1])
+    ax.grid(True, linestyle=':', alpha=0.6)
+
+    return fig
+
+def _create_styled_table(df, title):
+    """Crée un tableau rendu comme une image haute qualité"""
+    fig, ax = _new_figure((12, len(df) * 0.5 + 2)) # Hauteur dynamique
+    ax.axis('off')
+
+    # Couleurs du tableau
+    header_color = '#40466e'
+    row_colors = ['#f1f1f2', 'w']
+    edge_color = 'w'
+    # Création du tableau
+    table = ax.table(
+        cellText=df.values,
+        colLabels=df.columns,
+        loc='center',
+        cellLoc='center'
+    )
+
+    # Styling avancé
+    table.auto_set_font_size(False)
+    table.set_fontsize(11)
+    table.scale(1, 1.8) # Plus d'espace vertical
+    for k, cell in table.get_celld().items():
+        cell.set_edgecolor(edge_color)
+        if k[0] == 0: # Header
+            cell.set_text_props(weight='bold', color='w')
+            cell.set_facecolor(header_color)
+        else: # Rows
+            cell.set_facecolor(row_colors[k[0]%len(row_colors)])
+
+    ax.set_title(title, fontsize=16, weight='bold', pad=10)
+    return fig
+
+
+# Type de rendu -> renderer (le type sert aussi de préfixe au nom de l'image)
+RENDERERS = {
+    'donut': _create_donut_chart,
+    'bar': _create_bar_chart,
+    'line': _create_line_plot,
+    'scatter': _create_scatter_plot,
+    'table': _create_styled_table,
+}
+
+
+def render_png(kind, df, title):
+    """
+    Dessine le DataFrame et renvoie le PNG en mémoire.
+    Point d'entrée exécuté dans les processus de rendu.
+    """
+    fig = RENDERERS[kind](df, title)
+    buffer = io.BytesIO()
+    # bbox_inches='tight' est crucial pour ne pas couper les légendes
+    fig.savefig(buffer, format='png', dpi=RENDER_DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+# --- Service de rendu ---------------------------------------------------------
+
+class RenderService:
+    """
+    Pool de processus dédiés au rendu matplotlib : le calcul (CPU) ne bloque ni le
+    thread de l'interface ni le GIL, et plusieurs rendus tournent sur plusieurs cœurs.
+    submit() renvoie un Future dont le résultat est le PNG (bytes).
+    """
+
+    def __init__(self, workers=RENDER_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # spawn : pas de fork d'un processus multi-threadé (Streamlit)
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="render")
+            return self._executor
+
+    def submit(self, kind, df, title):
+        """Soumet un rendu et renvoie un Future (résultat : PNG en bytes)."""
+        if kind not in RENDERERS:
+            raise ValueError(f"Rendu inconnu : {kind}")
+        try:
+            return self._get_executor().submit(render_png, kind, df, title)
+        except concurrent.futures.process.BrokenProcessPool:
+            # Un processus de rendu a planté : on recrée le pool une fois
+            self.shutdown(wait=False)
+            return self._get_executor().submit(render_png, kind, df, title)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_render_service():
+    """Service de rendu partagé du processus (pool créé au premier rendu)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RenderService()
+        return _service
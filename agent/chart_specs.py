@@ -0,0 +1,154 @@
+import json
+import pandas as pd
+
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+
+# --- Spécifications Vega-Lite (rendu côté navigateur, st.vega_lite_chart) ---
+# Même logique visuelle que les renderers PNG de chart_renderer.py
+
+def _field(name):
+    # Vega-Lite interprète '.', '[' et ']' dans les noms de champs : on les échappe
+    return str(name).replace("\\", "\\\\").replace(".", "\\.").replace("[", "\\[").replace("]", "\\]")
+
+
+def _vl_type(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "nominal"
+    if pd.api.types.is_numeric_dtype(series):
+        return "quantitative"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "temporal"
+    return "nominal"
+
+
+def _values(df):
+    # Passage par le JSON de pandas : types numpy, dates et NaN deviennent sérialisables
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _base(df, title):
+    return {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": title,
+        "data": {"values": _values(df)},
+        "width": "container",
+    }
+
+
+def _donut_spec(df, title):
+    if len(df.columns) < 2:
+        raise ValueError("Nécessite 2 colonnes (Labels, Valeurs)")
+    label, value = df.columns[0], df.columns[1]
+    spec = _base(df, title)
+    spec.update({
+        "transform": [
+            {"joinaggregate": [{"op": "sum", "field": _field(value), "as": "__total"}]},
+            # Expression JS : accès direct à la clé, sans échappement de chemin
+            {"calculate": f"datum[{json.dumps(str(value))}] / datum.__total", "as": "pourcentage"},
+        ],
+        "mark": {"type": "arc", "innerRadius": 70, "stroke": "white", "strokeWidth": 2},
+        "encoding": {
+            "theta": {"field": _field(value), "type": "quantitative", "stack": True},
+            "color": {"field": _field(label), "type": "nominal", "scale": {"scheme": "pastel1"}},
+            "tooltip": [
+                {"field": _field(label), "type": "nominal"},
+                {"field": _field(value), "type": "quantitative"},
+                {"field": "pourcentage", "type": "quantitative", "format": ".1%"},
+            ],
+        },
+        "view": {"stroke": None},
+    })
+    return spec
+
+
+def _bar_spec(df, title):
+    x, y = df.columns[0], df.columns[1]
+    values = pd.to_numeric(df[y], errors="coerce")
+    # Format intelligent (comme les annotations du PNG)
+    value_format = ",.0f" if values.abs().max() > 100 else ".2f"
+    spec = _base(df, title)
+    spec.update({
+        "encoding": {
+            "x": {"field": _field(x), "type": "nominal", "sort": None,
+                  "axis": {"labelAngle": -45 if len(df) > 5 else 0}},
+            "y": {"field": _field(y), "type": "quantitative"},
+            "tooltip": [
+                {"field": _field(x), "type": "nominal"},
+                {"field": _field(y), "type": "quantitative", "format": value_format},
+            ],
+        },
+        "layer": [
+            {"mark": {"type": "bar", "color": "#3498db", "opacity": 0.8}},
+            {
+                "mark": {"type": "text", "dy": -6, "fontWeight": "bold", "color": "#444444"},
+                "encoding": {"text": {"field": _field(y), "type": "quantitative", "format": value_format}},
+            },
+        ],
+    })
+    return spec
+
+
+def _line_spec(df, title):
+    x = df.columns[0]
+    x_type = "ordinal" if _vl_type(df[x]) == "nominal" else _vl_type(df[x])
+    series = [str(col) for col in df.columns[1:]]
+    spec = _base(df, title)
+    spec.update({
+        # Toutes les colonnes restantes deviennent des séries (format long)
+        "transform": [{"fold": [_field(col) for col in series], "as": ["série", "valeur"]}],
+        "mark": {"type": "line", "point": True, "strokeWidth": 2.5},
+        "encoding": {
+            "x": {"field": _field(x), "type": x_type, "sort": None},
+            "y": {"field": "valeur", "type": "quantitative"},
+            "color": {"field": "série", "type": "nominal"},
+            "tooltip": [
+                {"field": _field(x), "type": x_type},
+                {"field": "série", "type": "nominal"},
+                {"field": "valeur", "type": "quantitative"},
+            ],
+        },
+    })
+    return spec
+
+
+def _scatter_spec(df, title):
+    x, y = df.columns[0], df.columns[1]
+    encoding = {
+        "x": {"field": _field(x), "type": _vl_type(df[x])},
+        "y": {"field": _field(y), "type": _vl_type(df[y])},
+        "tooltip": [{"field": _field(col), "type": _vl_type(df[col])} for col in df.columns[:3]],
+    }
+    # Ajout d'une dimension couleur si 3ème colonne existe
+    if len(df.columns) > 2:
+        c = df.columns[2]
+        encoding["color"] = {"field": _field(c), "type": _vl_type(df[c])}
+        if encoding["color"]["type"] == "quantitative":
+            encoding["color"]["scale"] = {"scheme": "viridis"}
+    spec = _base(df, title)
+    spec.update({
+        "mark": {"type": "circle", "size": 100, "opacity": 0.7, "stroke": "white"},
+        "encoding": encoding,
+    })
+    return spec
+
+
+# Type de rendu (voir chart_renderer.RENDERERS) -> spécification.
+# Le tableau n'a pas de spécification : l'interface l'affiche avec st.dataframe.
+SPEC_BUILDERS = {
+    'donut': _donut_spec,
+    'bar': _bar_spec,
+    'line': _line_spec,
+    'scatter': _scatter_spec,
+}
+
+
+def build_spec(kind, df, title):
+    """
+    Spécification Vega-Lite (dict JSON) du graphique, données incluses,
+    ou None pour un tableau.
+    """
+    builder = SPEC_BUILDERS.get(kind)
+    if builder is None:
+        return None
+    return builder(df, title)
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+DB_PATH = "data/boutique.db"
+
+# Réglages de performance des connexions de lecture
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))     # cache de pages : 64 Mo
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))     # lecture mmap : 256 Mo
+CACHED_STATEMENTS = 256                                               # requêtes préparées gardées
+
+_local = threading.local()
+_all_connections = []
+# Réentrant : la fermeture à la fin d'un thread peut survenir pendant une collecte
+_lock = threading.RLock()
+_generation = 0   # incrémenté par close_all() pour invalider les connexions des threads
+
+
+def _open(db_path):
+    # mode=ro : aucune écriture possible au niveau du fichier. Le journal WAL
+    # (lectures non bloquées par les écritures) est activé par data/init_db.py
+    conn = sqlite3.connect(
+        f"file:{os.path.abspath(db_path)}?mode=ro",
+        uri=True,
+        cached_statements=CACHED_STATEMENTS,
+        # Chaque connexion reste propre à un thread ; désactivé pour permettre close_all()
+        check_same_thread=False
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def get_connection(db_path=DB_PATH):
+    """
+    Renvoie la connexion en lecture seule du thread courant pour cette base.
+
+    La connexion est créée à la première demande puis réutilisée par le thread,
+    ce qui conserve le cache de pages et le cache de requêtes préparées de SQLite
+    entre deux questions. Si le fichier de la base a été recréé (init_db.py),
+    la connexion est rouverte automatiquement. Les connexions d'un thread sont
+    fermées quand il se termine (ex : thread d'exécution d'un rerun Streamlit).
+
+    Raises:
+        FileNotFoundError: si la base n'existe pas
+    """
+    try:
+        inode = os.stat(db_path).st_ino
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Base de données introuvable : {db_path}")
+
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+        weakref.finalize(threading.current_thread(), _close_connections, connections)
+
+    entry = connections.get(db_path)
+    if entry is not None and entry[1:] == (inode, _generation):
+        return entry[0]
+    if entry is not None:
+        entry[0].close()
+        with _lock:
+            if entry[0] in _all_connections:
+                _all_connections.remove(entry[0])
+
+    conn = _open(db_path)
+    connections[db_path] = (conn, inode, _generation)
+    with _lock:
+        _all_connections.append(conn)
+    return conn
+
+
+def _close_connections(connections):
+    """Ferme les connexions d'un thread terminé."""
+    with _lock:
+        for conn, *_ in connections.values():
+            conn.close()
+            if conn in _all_connections:
+                _all_connections.remove(conn)
+    connections.clear()
+
+
+def close_all():
+    """Ferme toutes les connexions ouvertes par le pool (arrêt du processus)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for conn in _all_connections:
+            conn.close()
+        _all_connections.clear()
@@ -1,22 +1,128 @@
 import streamlit as st
 import os
-import json
-import re
+import uuid
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
-from PIL import Image
 
 # Import de votre agent (assurez-vous que le fichier principal s'appelle agent.py)
 try:
-    from orchestrator import create_agent
+    from orchestrator import create_agent, run_pipeline
+    from db_pool import get_connection
+    from result_io import load_fastest
+    from result_store import get_result_store
+    from result_types import coerce_types
+    from artifact_store import get_manifest, session_scope
+    from tool_results import ChartResult, QueryResult, SqlSpec, message_text, on_tool_result
+    from ui_callbacks import StreamlitAgentCallbackHandler
+    from visual_generator import render_chart
     DB_PATH = "data/boutique.db"
     EXPORT_DIR = "exports"
     VIZ_DIR = "visualizations"
+    MODE_PIPELINE = "⚡ Pipeline rapide"
+    MODE_AGENT = "🧠 Agent (questions ouvertes)"
 except ImportError:
     st.error("⚠️ Impossible d'importer l'agent. Vérifiez que tous les fichiers sont présents.")
     st.stop()
 
+def load_result_df(results):
+    """DataFrame d'un message : depuis la mémoire (result_id), sinon depuis le fichier exporté."""
+    result_id = results.get("result_id")
+    if result_id and result_id in get_result_store():
+        return get_result_store().get(result_id)
+    if results.get("csv_path") and os.path.exists(results["csv_path"]):
+        return coerce_types(load_fastest(results["csv_path"]), sql_query=results.get("sql"))
+    return None
+
+def csv_download(results):
+    """(données, nom de fichier) du bouton CSV : l'export n'est écrit qu'au clic."""
+    result_id = results.get("result_id")
+    if result_id and result_id in get_result_store():
+        session_id = st.session_state.session_id
+        
+        def export_csv():
+            # Exécuté dans un autre thread au clic : on rattache l'export au manifeste de la session
+            with session_scope(session_id):
+                return get_result_store().export_bytes(result_id, 'csv')
+        return export_csv, f"export_{result_id}.csv"
+    csv_path = results.get("csv_path")
+    if csv_path and os.path.exists(csv_path):
+        return (lambda: Path(csv_path).read_bytes()), os.path.basename(csv_path)
+    return None, None
+
+def png_download(results):
+    """
+    (données, nom de fichier) du bouton image. En mode Vega-Lite, le PNG n'est
+    rendu (côté serveur) qu'au clic sur le bouton.
+    """
+    viz_path = results.get("viz_path")
+    if viz_path and os.path.exists(viz_path):
+        return (lambda: Path(viz_path).read_bytes()), os.path.basename(viz_path)
+    chart_type = results.get("chart_type")
+    df = load_result_df(results) if chart_type else None
+    if df is None or df.empty:
+        return None, None
+    session_id = st.session_state.session_id
+    
+    def render_png():
+        with session_scope(session_id):
+            return Path(render_chart(df, chart_type, results.get("chart_title") or "")).read_bytes()
+    return render_png, f"graphique_{results.get('result_id') or 'export'}.png"
+
+def show_table(results, msg_id, page_size=50):
+    """
+    Données d'un message, page par page : tri, filtre et pagination sont exécutés
+    en SQL sur le résultat en mémoire, seule la page affichée est envoyée au navigateur.
+    """
+    store = get_result_store()
+    result_id = results.get("result_id")
+    if not (result_id and result_id in store):
+        # Résultat évincé de la mémoire : rechargé depuis son export
+        df = load_result_df(results)
+        if df is None:
+            return
+        result_id = results["result_id"] = store.put(df, results.get("sql_query"))
+    
+    columns = store.table(result_id).table_columns
+    
+    st.markdown("---")
+    st.markdown("**📊 Données :**")
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        search = st.text_input("🔍 Filtrer", key=f"search_{msg_id}", placeholder="Texte à rechercher")
+    with col2:
+        sort_by = st.selectbox("Trier par", ["—"] + columns, key=f"sort_{msg_id}")
+    with col3:
+        descending = st.checkbox("Décroissant", key=f"desc_{msg_id}")
+    
+    sort_by = None if sort_by == "—" else sort_by
+    page_key = f"page_{msg_id}"
+    page = st.session_state.get(page_key, 1)
+    rows, total = store.page(result_id, page - 1, page_size, sort_by, descending, search or None)
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        # Filtre plus restrictif : on revient à la dernière page disponible
+        page = st.session_state[page_key] = pages
+        rows, total = store.page(result_id, page - 1, page_size, sort_by, descending, search or None)
+    
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.number_input("Page", min_value=1, max_value=pages, key=page_key)
+    with col2:
+        st.caption(f"{total} ligne(s) - page {page}/{pages}")
+
+def show_chart(results):
+    """Graphique d'un message : spécification Vega-Lite (navigateur) ou image PNG."""
+    if results.get("chart_spec"):
+        st.markdown("---")
+        st.markdown("**📈 Visualisation :**")
+        st.vega_lite_chart(results["chart_spec"], use_container_width=True)
+    elif results.get("viz_path") and os.path.exists(results["viz_path"]):
+        st.markdown("---")
+        st.markdown("**📈 Visualisation :**")
+        st.image(results["viz_path"], use_container_width=True)
+
 # Configuration de la page
 st.set_page_config(
     page_title="Agent Data Analyst AI",
@@ -122,6 +228,9 @@ st.markdown("""
 # Initialisation de la session
 if 'messages' not in st.session_state:
     st.session_state.messages = []
+if 'session_id' not in st.session_state:
+    # Identifiant de session : clé du manifeste des fichiers produits pour cet utilisateur
+    st.session_state.session_id = uuid.uuid4().hex
 if 'agent' not in st.session_state:
     if os.path.exists(DB_PATH):
         st.session_state.agent = create_agent()
@@ -145,20 +254,21 @@ with st.sidebar:
     
     st.markdown("---")
     
+    # Mode pipeline : 1 appel LLM par question. Mode agent : raisonnement libre (plus lent)
+    st.markdown("### ⚙️ Mode")
+    mode = st.radio(
+        "Mode d'exécution",
+        [MODE_PIPELINE, MODE_AGENT],
+        label_visibility="collapsed"
+    )
+    
+    st.markdown("---")
+    
     if st.button("🗑️ Effacer l'historique", use_container_width=True):
         st.session_state.messages = []
-        # Supprimer les fichiers dans visualizations
-        for file in Path(VIZ_DIR).glob("*.png"):
-            try:
-                file.unlink()
-            except:
-                pass
-        # Supprimer les fichiers dans exports
-        for file in Path(EXPORT_DIR).glob("*.csv"):
-            try:
-                file.unlink()
-            except:
-                pass
+        # Supprimer uniquement les exports de cette session : les graphiques appartiennent
+        # au cache de rendus (partagé entre sessions, avec sa propre éviction)
+        get_manifest(st.session_state.session_id).clear(keep_kinds=('chart',))
         st.rerun()
     
     st.markdown("---")
@@ -181,7 +291,12 @@ with col1:
     st.markdown("*Posez vos questions en langage naturel - L'IA s'occupe du reste*")
 
 with col2:
-    st.metric("📊 Statut", "En ligne", delta="Actif")
+    # Vérification de la base via la connexion en lecture seule partagée avec l'exécuteur
+    try:
+        nb_produits = get_connection(DB_PATH).execute("SELECT COUNT(*) FROM produits").fetchone()[0]
+        st.metric("📊 Statut", "En ligne", delta=f"{nb_produits} produits")
+    except Exception:
+        st.metric("📊 Statut", "Hors ligne", delta="Base indisponible", delta_color="inverse")
 
 st.markdown("---")
 
@@ -206,6 +321,10 @@ with chat_container:
                         tools_html += '<span class="tool-badge">📊 Création graphique</span> '
                 st.markdown(tools_html, unsafe_allow_html=True)
             
+            if message.get("timings"):
+                with st.expander("⏱️ Détails d'exécution"):
+                    st.dataframe(pd.DataFrame(message["timings"]), use_container_width=True)
+            
             # Affichage des résultats
             if "results" in message:
                 results = message["results"]
@@ -217,21 +336,16 @@ with chat_container:
                     st.markdown("**📝 Requête SQL générée :**")
                     st.code(results["sql_query"], language="sql")
                 
-                # Affichage de l'aperçu CSV
-                if "csv_path" in results and results["csv_path"] and os.path.exists(results["csv_path"]):
-                    st.markdown("---")
-                    st.markdown("**📊 Aperçu des données :**")
-                    df = pd.read_csv(results["csv_path"])
-                    st.dataframe(df, use_container_width=True)
+                # Affichage des données (paginées)
+                show_table(results, msg_id)
                 
                 # Affichage du graphique
-                if "viz_path" in results and results["viz_path"] and os.path.exists(results["viz_path"]):
-                    st.markdown("---")
-                    st.markdown("**📈 Visualisation :**")
-                    st.image(results["viz_path"], use_container_width=True)
+                show_chart(results)
                 
                 # Section téléchargement
-                if results.get("csv_path") or results.get("viz_path") or results.get("sql_query"):
+                csv_data, csv_name = csv_download(results)
+                png_data, png_name = png_download(results)
+                if csv_data or png_data or results.get("sql_query"):
                     st.markdown("---")
                     st.markdown("**📥 Téléchargements :**")
                     st.markdown('<div class="download-section">', unsafe_allow_html=True)
@@ -239,28 +353,26 @@ with chat_container:
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        if "csv_path" in results and results["csv_path"] and os.path.exists(results["csv_path"]):
-                            with open(results["csv_path"], "rb") as f:
-                                st.download_button(
-                                    label="📥 Télécharger CSV",
-                                    data=f,
-                                    file_name=os.path.basename(results["csv_path"]),
-                                    mime="text/csv",
-                                    use_container_width=True,
-                                    key=f"hist_csv_{msg_id}"
-                                )
+                        if csv_data:
+                            st.download_button(
+                                label="📥 Télécharger CSV",
+                                data=csv_data,
+                                file_name=csv_name,
+                                mime="text/csv",
+                                use_container_width=True,
+                                key=f"hist_csv_{msg_id}"
+                            )
                     
                     with col2:
-                        if "viz_path" in results and results["viz_path"] and os.path.exists(results["viz_path"]):
-                            with open(results["viz_path"], "rb") as f:
-                                st.download_button(
-                                    label="🖼️ Télécharger Image",
-                                    data=f,
-                                    file_name=os.path.basename(results["viz_path"]),
-                                    mime="image/png",
-                                    use_container_width=True,
-                                    key=f"hist_img_{msg_id}"
-                                )
+                        if png_data:
+                            st.download_button(
+                                label="🖼️ Télécharger Image",
+                                data=png_data,
+                                file_name=png_name,
+                                mime="image/png",
+                                use_container_width=True,
+                                key=f"hist_img_{msg_id}"
+                            )
                     
                     with col3:
                         if "sql_query" in results and results["sql_query"]:
@@ -297,123 +409,96 @@ if user_query:
         response_placeholder = st.empty()
         
         tools_used = []
+        timings = []
         
         try:
-            # Capture de la sortie verbose pour détecter les outils
-            import io
-            import sys
-            from contextlib import redirect_stdout
-            
-            # Affichage initial
-            tools_placeholder.markdown("**Analyse de la requête...**")
-            
-            f = io.StringIO()
-            with redirect_stdout(f):
-                result = st.session_state.agent.invoke({"input": user_query})
-            
-            output = f.getvalue()
+            csv_path = None
+            result_id = None
+            viz_path = None
+            chart_spec = None
+            chart_type = None
+            chart_title = None
+            sql_query = None
             
-            # Détection des outils utilisés
-            if "generate_sql_query" in output or "generate_visualization" in output or "execute_and_export_sql" in output:
-                # Affichage progressif des outils au fur et à mesure
-                tools_html = "**🔧 Raisonnement :** "
+            if mode == MODE_PIPELINE:
+                # Pipeline déterministe : chemins et SQL renvoyés explicitement
+                tools_placeholder.markdown("**Analyse de la requête...**")
+                with session_scope(st.session_state.session_id):
+                    pipeline_result = run_pipeline(user_query)
                 
-                if "generate_sql_query" in output:
+                tools_html = "**🔧 Raisonnement :** "
+                if pipeline_result['sql']:
                     tools_used.append("Générateur SQL")
                     tools_html += '<span class="tool-badge">⚡ Génération SQL</span> '
-                    tools_placeholder.markdown(tools_html, unsafe_allow_html=True)
-                
-                if "execute_and_export_sql" in output:
+                if pipeline_result['result_id']:
                     tools_used.append("Exécuteur SQL")
                     tools_html += '<span class="tool-badge">🗄️ Exécution requête</span> '
-                    tools_placeholder.markdown(tools_html, unsafe_allow_html=True)
-                
-                if "generate_visualization" in output:
+                if pipeline_result['viz_path'] or pipeline_result['chart_spec']:
                     tools_used.append("Générateur de visualisation")
                     tools_html += '<span class="tool-badge">📊 Création graphique</span>'
-                    tools_placeholder.markdown(tools_html, unsafe_allow_html=True)
+                tools_placeholder.markdown(tools_html, unsafe_allow_html=True)
+                
+                result_id = pipeline_result['result_id']
+                viz_path = pipeline_result['viz_path']
+                chart_spec = pipeline_result['chart_spec']
+                chart_type = pipeline_result['viz_type']
+                chart_title = user_query
+                sql_query = pipeline_result['sql']
+                response_text = pipeline_result['output']
             else:
-                # Pas d'outils utilisés, on efface le message de raisonnement
-                tools_placeholder.empty()
-            
-            # Extraction des fichiers générés (uniquement les plus récents de cette session)
-            csv_path = None
-            viz_path = None
-            sql_query = None
+                # Progression en direct : outils, tokens de la réponse et durées par étape
+                tools_placeholder.markdown("**Analyse de la requête...**")
+                handler = StreamlitAgentCallbackHandler(tools_placeholder, response_placeholder)
             
-            # Sauvegarder le timestamp actuel pour ne récupérer que les nouveaux fichiers
-            current_time = datetime.now()
-            
-            # Recherche du dernier CSV généré (dans les 10 dernières secondes)
-            csv_files = sorted(Path(EXPORT_DIR).glob("*.csv"), key=os.path.getmtime, reverse=True)
-            if csv_files:
-                csv_mtime = os.path.getmtime(csv_files[0])
-                if (current_time.timestamp() - csv_mtime) < 10:  # Fichier créé il y a moins de 10 secondes
-                    csv_path = str(csv_files[0])
-            
-            # Recherche du dernier graphique généré (dans les 10 dernières secondes)
-            viz_files = sorted(Path(VIZ_DIR).glob("*.png"), key=os.path.getmtime, reverse=True)
-            if viz_files:
-                viz_mtime = os.path.getmtime(viz_files[0])
-                if (current_time.timestamp() - viz_mtime) < 10:  # Fichier créé il y a moins de 10 secondes
-                    viz_path = str(viz_files[0])
+                # Les outils transmettent leurs résultats complets (SqlSpec, QueryResult, ChartResult)
+                tool_results = []
+                with session_scope(st.session_state.session_id), on_tool_result(tool_results.append):
+                    result = st.session_state.agent.invoke(
+                        {"input": user_query},
+                        config={"callbacks": [handler]}
+                    )
             
-            # Extraction de la requête SQL du output
-            sql_match = re.search(
-            r'"sql"\s*:\s*"(.*?)"\s*(,|\})',
-            output,
-            re.DOTALL
-            )       
-
-            if sql_match:
-                sql_query = sql_match.group(1).replace('\\"', '"').strip()
-            # Affichage de la réponse
-            response_text = result.get('output', '')
+                tools_used = handler.tools_used
+                timings = handler.summary()
+                if not tools_used:
+                    # Pas d'outils utilisés, on efface le message de raisonnement
+                    tools_placeholder.empty()
             
-            # Nettoyage de la réponse pour extraire uniquement le texte pertinent
-            if response_text:
-                # Vérifier si c'est déjà une liste
-                if isinstance(response_text, list):
-                    # Extraire le texte du premier élément
-                    if len(response_text) > 0 and isinstance(response_text[0], dict):
-                        response_text = response_text[0].get('text', '')
-                    else:
-                        response_text = str(response_text)
+                # Requête, résultat et graphique : directement depuis les objets des outils
+                for tool_result in tool_results:
+                    if isinstance(tool_result, SqlSpec):
+                        sql_query = tool_result.sql
+                    elif isinstance(tool_result, QueryResult) and tool_result.success:
+                        sql_query = tool_result.sql or sql_query
+                        result_id = tool_result.result_id
+                        csv_path = tool_result.csv_path
+                    elif isinstance(tool_result, ChartResult) and tool_result.success:
+                        viz_path = tool_result.filepath
+                        chart_spec = tool_result.spec
+                        chart_type = tool_result.chart_type
+                        chart_title = tool_result.title
                 
-                # Convertir en string si ce n'est pas déjà le cas
-                response_text = str(response_text)
-                
-                # Si la réponse contient la structure [{'type': 'text', ...}]
-                if "[{'type': 'text'" in response_text or '[{"type": "text"' in response_text:
-                    # Extraction du texte entre les guillemets
-                    import ast
-                    try:
-                        # Parse la structure
-                        parsed = ast.literal_eval(response_text)
-                        if isinstance(parsed, list) and len(parsed) > 0:
-                            response_text = parsed[0].get('text', response_text)
-                    except:
-                        # Si le parsing échoue, essayer avec regex
-                        match = re.search(r"'text':\s*'([^']*(?:\\'[^']*)*)'", response_text)
-                        if match:
-                            response_text = match.group(1).replace("\\'", "'")
-                
-                # Nettoyer les chemins de fichiers du texte
-                if isinstance(response_text, str):
-                    lines = response_text.split('\n')
-                    clean_lines = []
-                    for line in lines:
-                        # Ignorer les lignes qui contiennent des chemins, métadonnées ou listes à puces
-                        if not any(x in line.lower() for x in [
-                            'visualizations\\', 'exports\\', 'disponible ici', 
-                            '.png', '.csv', 'graphique a été généré', 
-                            'fichier:', 'chemin:', 'path:', 'signature'
-                        ]):
-                            # Ignorer les lignes qui commencent par * (listes à puces)
-                            if line.strip() and not line.strip().startswith('*'):
-                                clean_lines.append(line)
+                # Affichage de la réponse
+                response_text = message_text(result.get('output', ''))
+            
+                # Nettoyage de la réponse pour extraire uniquement le texte pertinent
+                if response_text:
+                    # Nettoyer les chemins de fichiers du texte
+                    if isinstance(response_text, str):
+                        lines = response_text.split('\n')
+                        clean_lines = []
+                        for line in lines:
+                            # Ignorer les lignes qui contiennent des chemins, métadonnées ou listes à puces
+                            if not any(x in line.lower() for x in [
+                                'visualizations\\', 'exports\\', 'disponible ici', 
+                                '.png', '.csv', 'graphique a été généré', 
+                                'fichier:', 'chemin:', 'path:', 'signature'
+                            ]):
+                                # Ignorer les lignes qui commencent par * (listes à puces)
+                                if line.strip() and not line.strip().startswith('*'):
+                                    clean_lines.append(line)
                     
-                    response_text = '\n'.join(clean_lines).strip()
+                        response_text = '\n'.join(clean_lines).strip()
             
             # Si après nettoyage il ne reste rien, on met un message par défaut
             if not response_text:
@@ -421,37 +506,41 @@ if user_query:
             
             response_placeholder.markdown(response_text)
             
+            # Durée de chaque étape (appels LLM et outils)
+            if timings:
+                with st.expander("⏱️ Détails d'exécution"):
+                    st.dataframe(pd.DataFrame(timings), use_container_width=True)
+            
             # Affichage de la requête SQL si disponible
             if sql_query:
                 st.markdown("---")
                 st.markdown("**📝 Requête SQL générée :**")
                 st.code(sql_query, language="sql")
             
-            # Affichage de l'aperçu CSV
-            if csv_path and os.path.exists(csv_path):
-                st.markdown("---")
-                st.markdown("**📊 Aperçu des données :**")
-                df = pd.read_csv(csv_path)
-                st.dataframe(df, use_container_width=True)
-            
-            # Affichage des visualisations
-            if viz_path and os.path.exists(viz_path):
-                st.markdown("---")
-                st.markdown("**📈 Visualisation :**")
-                st.image(viz_path, use_container_width=True)
-            
             # Stockage des résultats pour l'historique
             results = {
+                "result_id": result_id,
                 "csv_path": csv_path,
                 "viz_path": viz_path,
+                "chart_spec": chart_spec,
+                "chart_type": chart_type,
+                "chart_title": chart_title,
                 "sql_query": sql_query
             }
             
             # Générer un ID unique pour ce message
             msg_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
             
+            # Affichage des données (paginées)
+            show_table(results, msg_id)
+            
+            # Affichage des visualisations
+            show_chart(results)
+            
             # Section téléchargement
-            if csv_path or viz_path or sql_query:
+            csv_data, csv_name = csv_download(results)
+            png_data, png_name = png_download(results)
+            if csv_data or png_data or sql_query:
                 st.markdown("---")
                 st.markdown("**📥 Téléchargements :**")
                 st.markdown('<div class="download-section">', unsafe_allow_html=True)
@@ -459,28 +548,26 @@ if user_query:
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                if csv_path and os.path.exists(csv_path):
-                    with open(csv_path, "rb") as f:
-                        st.download_button(
-                            label="📥 Télécharger CSV",
-                            data=f,
-                            file_name=os.path.basename(csv_path),
-                            mime="text/csv",
-                            use_container_width=True,
-                            key=f"csv_{msg_id}"
-                        )
+                if csv_data:
+                    st.download_button(
+                        label="📥 Télécharger CSV",
+                        data=csv_data,
+                        file_name=csv_name,
+                        mime="text/csv",
+                        use_container_width=True,
+                        key=f"csv_{msg_id}"
+                    )
             
             with col2:
-                if viz_path and os.path.exists(viz_path):
-                    with open(viz_path, "rb") as f:
-                        st.download_button(
-                            label="🖼️ Télécharger Image",
-                            data=f,
-                            file_name=os.path.basename(viz_path),
-                            mime="image/png",
-                            use_container_width=True,
-                            key=f"img_{msg_id}"
-                        )
+                if png_data:
+                    st.download_button(
+                        label="🖼️ Télécharger Image",
+                        data=png_data,
+                        file_name=png_name,
+                        mime="image/png",
+                        use_container_width=True,
+                        key=f"img_{msg_id}"
+                    )
             
             with col3:
                 if sql_query:
@@ -500,6 +587,7 @@ if user_query:
                 "role": "assistant",
                 "content": response_text,
                 "tools": tools_used,
+                "timings": timings,
                 "results": results,
                 "msg_id": msg_id
             })
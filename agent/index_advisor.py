@@ -0,0 +1,471 @@
+"""
+Conseiller d'index : rejoue le SQL produit par generate_sql_query (journal
+data/sql_workload.db) avec EXPLAIN QUERY PLAN, propose des index - dont des
+index couvrants - et peut les créer en mesurant le gain réel.
+
+    python index_advisor.py                  # propositions (coût estimé avant / après)
+    python index_advisor.py --apply          # création des index, ANALYZE et temps mesurés
+    python index_advisor.py --apply --json artifacts/index_report.json
+
+Les index candidats sont évalués sur une copie en mémoire du schéma (tables,
+index existants et statistiques, sans les données) : rien n'est écrit dans la
+base tant que --apply n'est pas demandé.
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+from db_pool import get_connection
+from query_guard import ensure_limit, estimate_cost, explain, statement_timeout, table_aliases, table_rows
+from schema_service import user_tables
+
+DB_PATH = "data/boutique.db"
+WORKLOAD_PATH = "data/sql_workload.db"
+
+# Gain de coût estimé minimal (sur au moins une requête) pour proposer un index
+MIN_GAIN = float(os.getenv("INDEX_ADVISOR_MIN_GAIN", 0.2))
+MAX_INDEX_COLUMNS = 6
+MAX_INDEXES = int(os.getenv("INDEX_ADVISOR_MAX_INDEXES", 10))   # index proposés au plus
+MEASURE_MAX_ROWS = 100_000       # lignes lues au plus par requête rejouée
+INDEX_PREFIX = "idx_auto_"
+
+_CLAUSE_END = re.compile(r"\b(?:HAVING|ORDER\s+BY|LIMIT|UNION|EXCEPT|INTERSECT|WINDOW)\b|\)", re.IGNORECASE)
+
+
+# --- Journal des requêtes générées -------------------------------------------
+
+def _sql_key(sql):
+    normalized = " ".join(sql.split()).rstrip(";").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16], normalized
+
+
+class WorkloadLog:
+    """
+    Journal persistant (SQLite) du SQL généré : requête normalisée -> nombre
+    d'occurrences. C'est la charge rejouée par le conseiller d'index.
+    """
+
+    def __init__(self, path=WORKLOAD_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS queries (
+                    sql_key TEXT PRIMARY KEY,
+                    sql TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, sql):
+        key, normalized = _sql_key(sql)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO queries (sql_key, sql, count, first_seen, last_seen) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(sql_key) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen",
+                (key, normalized, now, now)
+            )
+
+    def queries(self, limit=None):
+        """[(sql, occurrences)], les plus fréquentes d'abord."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT sql, count FROM queries ORDER BY count DESC, last_seen DESC LIMIT ?",
+                (limit or -1,)
+            ).fetchall()
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM queries")
+
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_workload_log():
+    """Instance partagée du journal (désactivable avec SQL_WORKLOAD_LOG=0)."""
+    global _log
+    if os.getenv("SQL_WORKLOAD_LOG", "1") == "0":
+        return None
+    with _log_lock:
+        if _log is None:
+            _log = WorkloadLog()
+        return _log
+
+
+def log_sql(sql):
+    """Ajoute une requête générée au journal ; une erreur d'écriture n'interrompt jamais la génération."""
+    log = get_workload_log()
+    if log is None or not sql:
+        return
+    try:
+        log.record(sql)
+    except sqlite3.Error:
+        pass
+
+
+# --- Analyse ------------------------------------------------------------------
+
+def _whatif_db(conn, row_counts):
+    """
+    Copie en mémoire du schéma seul (tables, index, statistiques) : les index
+    candidats y sont créés instantanément et le planificateur y fait les mêmes
+    choix que sur la vraie base.
+    """
+    whatif = sqlite3.connect(":memory:")
+    for sql, in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('table', 'index', 'view') "
+        "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY type = 'view', type = 'index'"
+    ):
+        try:
+            whatif.execute(sql)
+        except sqlite3.Error:
+            # Tables internes d'une table virtuelle, déjà créées avec elle
+            pass
+    whatif.execute("ANALYZE")
+    whatif.execute("DELETE FROM sqlite_stat1")
+    try:
+        stats = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1").fetchall()
+    except sqlite3.Error:
+        stats = []
+    if not stats:
+        # Base jamais analysée : au moins le nombre de lignes de chaque table
+        stats = [(table, None, str(rows)) for table, rows in row_counts.items()]
+    whatif.executemany("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)", stats)
+    whatif.execute("ANALYZE sqlite_master")   # recharge les statistiques
+    return whatif
+
+
+def _index_columns(conn):
+    """{table: {index: [colonnes]}} des index existants."""
+    indexes = {}
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    for table in tables:
+        for index in conn.execute(f'PRAGMA index_list("{table}")'):
+            columns = [r[2] for r in conn.execute(f'PRAGMA index_info("{index[1]}")')]
+            indexes.setdefault(table, {})[index[1]] = columns
+    return indexes
+
+
+def _clause_spans(sql):
+    """Positions des clauses GROUP BY / ORDER BY (colonnes de tri)."""
+    spans = []
+    for match in re.finditer(r"\b(?:GROUP|ORDER)\s+BY\b", sql, re.IGNORECASE):
+        end = _CLAUSE_END.search(sql, match.end())
+        spans.append((match.end(), end.start() if end else len(sql)))
+    return spans
+
+
+def column_roles(sql, table, aliases, columns):
+    """
+    Rôle de chaque colonne de la table dans la requête :
+    'eq' (égalité ou IN sur une valeur), 'join' (égalité avec une colonne d'une
+    autre table), 'range' (<, >, BETWEEN), 'order' (GROUP BY / ORDER BY) ou
+    'use' (simplement lue). Une colonne a le rôle le plus utile à un index.
+
+    Returns:
+        dict: {role: [colonnes]} dans l'ordre des colonnes de la table
+    """
+    names = {alias for alias, target in aliases.items() if target == table}
+    spans = _clause_spans(sql)
+    roles = {'eq': [], 'join': [], 'range': [], 'order': [], 'use': []}
+    for column in columns:
+        found = None
+        for match in re.finditer(rf"(?<![\w.])(?:(\w+)\.)?{re.escape(column)}\b", sql, re.IGNORECASE):
+            qualifier = match.group(1)
+            if qualifier and qualifier not in names:
+                continue
+            before, after = sql[:match.start()], sql[match.end():]
+            if re.match(r"\s*==?\s*\w+\.\w+", after) or re.search(r"\w+\.\w+\s*==?\s*$", before):
+                role = 'join'
+            elif re.match(r"\s*(?:==?(?!=)|IN\s*\(|IS\b)", after, re.IGNORECASE) or re.search(r"(?<![<>!])==?\s*$", before):
+                role = 'eq'
+            elif re.match(r"\s*(?:[<>]|BETWEEN\b)", after, re.IGNORECASE) or re.search(r"[<>]=?\s*$", before):
+                role = 'range'
+            elif any(start <= match.start() < end for start, end in spans):
+                role = 'order'
+            else:
+                role = 'use'
+            if found is None or list(roles).index(role) < list(roles).index(found):
+                found = role
+        if found:
+            roles[found].append(column)
+    return roles
+
+
+def candidate_indexes(conn, sql):
+    """
+    Index candidats pour une requête : clé (égalités et jointure dans les deux
+    ordres, puis une plage ou les colonnes de tri) et sa version couvrante
+    (colonnes lues ajoutées), ex. stocks(produit_id, taille, couleur, quantite_disponible).
+
+    Returns:
+        list: [(table, (colonnes...), couvrant)]
+    """
+    aliases = table_aliases(sql)
+    select_all = re.search(r"SELECT\s+(?:DISTINCT\s+)?\*", sql, re.IGNORECASE)
+    candidates = []
+    modules = user_tables(conn)
+    for table in sorted(set(aliases.values())):
+        # Pas d'index classique sur une table virtuelle (index plein texte)
+        if table not in modules or modules[table]:
+            continue
+        info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        if not info:
+            continue
+        # La clé primaire entière est le rowid : déjà indexée
+        columns = [r[1] for r in info if not (r[5] and (r[2] or "").upper() == "INTEGER")]
+        roles = column_roles(sql, table, aliases, columns)
+        tail = roles['range'][:1] or roles['order']
+        # Filtres d'abord (table lue en premier) ou jointure d'abord (table lue par clé)
+        keys = {tuple(roles['eq'] + roles['join'] + tail), tuple(roles['join'] + roles['eq'] + tail)}
+        for key in sorted(k for k in keys if k):
+            candidates.append((table, key, False))
+            cover = key + tuple(c for c in roles['range'] + roles['order'] + roles['use'] if c not in key)
+            if not select_all and cover != key and len(cover) <= MAX_INDEX_COLUMNS:
+                candidates.append((table, cover, True))
+    return candidates
+
+
+def _is_prefix(short, long):
+    return tuple(long[:len(short)]) == tuple(short)
+
+
+def _index_name(table, columns):
+    name = f"{INDEX_PREFIX}{table}_{'_'.join(columns)}"
+    return re.sub(r"\W", "_", name)[:60]
+
+
+def drop_index_sql(name):
+    return f'DROP INDEX IF EXISTS "{name}"'
+
+
+def create_index_sql(table, columns):
+    cols = ", ".join(f'"{c}"' for c in columns)
+    return f'CREATE INDEX IF NOT EXISTS "{_index_name(table, columns)}" ON "{table}" ({cols})'
+
+
+def advise(workload, db_path=DB_PATH, min_gain=MIN_GAIN, max_indexes=MAX_INDEXES):
+    """
+    Sélection gloutonne : à chaque tour, l'index candidat qui réduit le plus le
+    coût estimé de la charge (compte tenu des index déjà retenus) est ajouté,
+    s'il fait gagner au moins min_gain sur une requête. Un index redondant
+    (préfixe d'un index existant ou retenu) n'est jamais proposé ; à l'inverse,
+    un index retenu remplace les index automatiques (idx_auto_*) dont la clé est
+    un préfixe de la sienne, qu'ils aient été retenus plus tôt ou déjà créés.
+
+    Args:
+        workload (list): [(sql, occurrences)]
+
+    Returns:
+        dict: recommendations, dropped (index idx_auto_* existants à supprimer),
+        cost_before, cost_after, skipped (requêtes non analysables)
+    """
+    conn = get_connection(db_path)
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    counts = {}
+    for table in tables:
+        table_rows(conn, table, counts)
+    whatif = _whatif_db(conn, counts)
+    indexed = _index_columns(conn)
+
+    def cost(sql):
+        return estimate_cost(whatif, sql, explain(whatif, sql), counts)[0]
+
+    weights = {}
+    current = {}
+    candidates = {}      # (table, colonnes) -> {'covering', 'queries'}
+    skipped = []
+    for sql, weight in workload:
+        try:
+            current[sql] = cost(sql)
+        except sqlite3.Error as e:
+            skipped.append({'sql': sql, 'error': str(e)})
+            continue
+        weights[sql] = weight
+        for table, columns, covering in candidate_indexes(whatif, sql):
+            entry = candidates.setdefault((table, columns), {'covering': covering, 'queries': []})
+            entry['queries'].append(sql)
+    cost_before = sum(current[sql] * weights[sql] for sql in current)
+
+    def evaluate(table, columns, queries):
+        """Coût de chaque requête concernée avec l'index en plus, et gain pondéré."""
+        whatif.execute(create_index_sql(table, columns))
+        try:
+            costs = {sql: cost(sql) for sql in queries}
+        finally:
+            whatif.execute(f'DROP INDEX "{_index_name(table, columns)}"')
+        qualifies = any(current[sql] > 0 and (current[sql] - new) / current[sql] >= min_gain
+                        for sql, new in costs.items())
+        gain = sum((current[sql] - new) * weights[sql] for sql, new in costs.items())
+        return costs, gain if qualifies else 0.0
+
+    chosen = []
+    dropped = []
+    while len(chosen) < max_indexes:
+        best = None
+        for (table, columns), entry in candidates.items():
+            if any(_is_prefix(columns, cols) for cols in indexed.get(table, {}).values()):
+                continue
+            costs, gain = evaluate(table, columns, entry['queries'])
+            if gain > 0 and (best is None or gain > best[3]):
+                best = (table, columns, costs, gain)
+        if best is None:
+            break
+        table, columns, costs, gain = best
+        # Préfixe strict du nouvel index (retenu plus tôt ou créé par un passage précédent) : inutile
+        for name, cols in list(indexed.get(table, {}).items()):
+            if name.startswith(INDEX_PREFIX) and len(cols) < len(columns) and _is_prefix(cols, columns):
+                whatif.execute(drop_index_sql(name))
+                del indexed[table][name]
+                previous = [rec for rec in chosen if rec['name'] == name]
+                if previous:
+                    chosen.remove(previous[0])
+                else:
+                    dropped.append({'table': table, 'columns': cols, 'name': name, 'sql': drop_index_sql(name)})
+        whatif.execute(create_index_sql(table, columns))
+        indexed.setdefault(table, {})[_index_name(table, columns)] = list(columns)
+        # Les requêtes concernées par un autre candidat sont réévaluées avec le nouvel index
+        current.update({sql: cost(sql) for sql in current})
+        chosen.append({
+            'table': table,
+            'columns': list(columns),
+            'name': _index_name(table, columns),
+            'covering': candidates[(table, columns)]['covering'],
+            'sql': create_index_sql(table, columns),
+            'estimated_benefit': round(gain),
+            'queries': len(costs),
+        })
+    whatif.close()
+
+    return {
+        'recommendations': chosen,
+        'dropped': dropped,
+        'cost_before': round(cost_before),
+        'cost_after': round(sum(current[sql] * weights[sql] for sql in current)),
+        'skipped': skipped,
+    }
+
+
+def apply_indexes(recommendations, db_path=DB_PATH, dropped=()):
+    """
+    Crée les index proposés, supprime les index automatiques devenus préfixes
+    d'un index proposé, puis met à jour les statistiques du planificateur (ANALYZE).
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            for rec in recommendations:
+                conn.execute(rec['sql'])
+            for rec in dropped:
+                conn.execute(rec['sql'])
+        # Statistiques échantillonnées : ANALYZE reste rapide sur une grosse base
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def measure(workload, db_path=DB_PATH, repeat=3):
+    """
+    Temps d'exécution réel de chaque requête (meilleur de `repeat` passages).
+
+    Returns:
+        list: [{'sql', 'seconds'}] - seconds vaut None si la requête échoue
+    """
+    conn = get_connection(db_path)
+    timings = []
+    for sql, _ in workload:
+        best = None
+        try:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                with statement_timeout(conn) as timed:
+                    timed(lambda: conn.execute(ensure_limit(sql, MEASURE_MAX_ROWS)).fetchall())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+        except (sqlite3.Error, ValueError):
+            best = None
+        timings.append({'sql': sql, 'seconds': best})
+    return timings
+
+
+def _total(timings):
+    return sum(t['seconds'] for t in timings if t['seconds'] is not None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose (et crée) des index d'après le SQL généré.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--workload", default=WORKLOAD_PATH, help="Journal des requêtes générées")
+    parser.add_argument("--apply", action="store_true", help="Créer les index proposés et mesurer le gain")
+    parser.add_argument("--repeat", type=int, default=3, help="Passages par requête pour la mesure")
+    parser.add_argument("--min-gain", type=float, default=MIN_GAIN)
+    parser.add_argument("--json", help="Écrire le rapport JSON dans ce fichier")
+    args = parser.parse_args(argv)
+
+    workload = WorkloadLog(args.workload).queries()
+    if not workload:
+        print("📭 Journal vide : posez d'abord des questions (le SQL généré y est enregistré).")
+        return 1
+
+    report = advise(workload, args.db, args.min_gain)
+    report['queries'] = len(workload)
+    print(f"🔎 {len(workload)} requête(s) analysée(s), coût estimé {report['cost_before']:,} -> {report['cost_after']:,}")
+    for rec in report['recommendations']:
+        kind = "couvrant" if rec['covering'] else "clé"
+        print(f"  + [{kind}] {rec['sql']}  ({rec['queries']} requête(s))")
+    for rec in report['dropped']:
+        print(f"  - [préfixe] {rec['sql']}")
+    if not report['recommendations']:
+        print("  ✅ Aucun index utile à ajouter.")
+
+    if args.apply and report['recommendations']:
+        before = measure(workload, args.db, args.repeat)
+        apply_indexes(report['recommendations'], args.db, report['dropped'])
+        after = measure(workload, args.db, args.repeat)
+        report['measured'] = {
+            'before_s': round(_total(before), 6),
+            'after_s': round(_total(after), 6),
+            'speedup': round(_total(before) / _total(after), 2) if _total(after) else None,
+            'per_query': [
+                {'sql': b['sql'], 'before_s': b['seconds'], 'after_s': a['seconds']}
+                for b, a in zip(before, after)
+            ],
+        }
+        print(f"⏱️ Charge rejouée : {report['measured']['before_s']:.3f}s -> {report['measured']['after_s']:.3f}s"
+              f" (x{report['measured']['speedup']})")
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
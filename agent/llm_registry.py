@@ -0,0 +1,92 @@
+import os
+import threading
+from dotenv import load_dotenv
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+load_dotenv()
+
+# Configuration centralisée des modèles (surchargeable par variables d'environnement)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))        # secondes par requête
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+# Débit maximal d'appels au modèle (0 = illimité), pour rester sous le quota de l'API
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+
+_models = {}
+_lock = threading.Lock()
+_rate_limiter = None
+
+
+def set_rate_limit(requests_per_minute):
+    """
+    Limite le débit des appels au modèle, partagé par tous les clients du processus
+    (token bucket de LangChain). 0 ou None désactive la limite.
+    Les clients déjà créés sont oubliés pour prendre en compte la nouvelle limite.
+    """
+    global _rate_limiter
+    with _lock:
+        if requests_per_minute:
+            _rate_limiter = InMemoryRateLimiter(
+                requests_per_second=requests_per_minute / 60,
+                check_every_n_seconds=0.05,
+            )
+        else:
+            _rate_limiter = None
+        _models.clear()
+
+
+def get_llm(model=None, temperature=0, **kwargs):
+    """
+    Renvoie le client Gemini partagé pour cette configuration.
+
+    Le client est créé à la première demande puis réutilisé par tous les appels
+    (orchestrateur, générateur SQL...), ce qui garde les connexions HTTP ouvertes
+    au lieu de refaire l'initialisation client/authentification à chaque outil.
+
+    Args:
+        model (str): Nom du modèle (LLM_MODEL par défaut)
+        temperature (float): Température
+        **kwargs: Paramètres supplémentaires de ChatGoogleGenerativeAI
+    """
+    model = model or LLM_MODEL
+    key = ("chat", model, temperature, tuple(sorted(kwargs.items())))
+    llm = _models.get(key)
+    if llm is None:
+        with _lock:
+            # Double vérification : un autre thread a pu le créer entre-temps
+            llm = _models.get(key)
+            if llm is None:
+                params = {"timeout": LLM_TIMEOUT, "max_retries": LLM_MAX_RETRIES}
+                if _rate_limiter is not None:
+                    params["rate_limiter"] = _rate_limiter
+                params.update(kwargs)
+                llm = ChatGoogleGenerativeAI(model=model, temperature=temperature, **params)
+                _models[key] = llm
+    return llm
+
+
+def get_embeddings(model=None):
+    """Client d'embeddings partagé (utilisé par la recherche sémantique du cache)."""
+    model = model or EMBEDDING_MODEL
+    key = ("embeddings", model)
+    embeddings = _models.get(key)
+    if embeddings is None:
+        with _lock:
+            embeddings = _models.get(key)
+            if embeddings is None:
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                embeddings = GoogleGenerativeAIEmbeddings(model=model)
+                _models[key] = embeddings
+    return embeddings
+
+
+def reset_registry():
+    """Oublie les clients créés (ex : après un changement de clé API ou pour les tests)."""
+    with _lock:
+        _models.clear()
+
+
+if LLM_REQUESTS_PER_MINUTE:
+    set_rate_limit(LLM_REQUESTS_PER_MINUTE)
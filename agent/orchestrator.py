@@ -1,13 +1,19 @@
 from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from sql_executor import execute_and_export_sql
-from sql_generator import generate_sql_query
-from visual_generator import generate_visualization
+from llm_registry import get_llm
+from query_guard import QueryRejected
+from sql_executor import arun_sql_query, execute_and_export_sql, run_sql_query
+from result_store import get_result_store
+from sql_generator import agenerate_sql_spec, generate_sql_query, generate_sql_spec
+from visual_generator import (CHART_OUTPUT, UnsupportedChartType, arender_chart, chart_kind,
+                              chart_spec, generate_visualization, render_chart)
 import os
+import asyncio
 DB_PATH = "data/boutique.db"
 EXPORT_DIR = "exports"
 VIZ_DIR = "visualizations"
+# Nombre de questions traitées simultanément par arun_pipelines
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", 4))
 os.makedirs(EXPORT_DIR, exist_ok=True)
 os.makedirs(VIZ_DIR, exist_ok=True)
 
@@ -16,7 +22,7 @@ def create_agent():
     tools = [generate_sql_query, execute_and_export_sql, generate_visualization]
     
     # 2. Le modèle principal
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+    llm = get_llm()
     
     # 3. Le Prompt Système (Le "Cerveau" qui décide quel outil appeler)
     prompt = ChatPromptTemplate.from_messages([
@@ -25,8 +31,9 @@ def create_agent():
          "Pour chaque demande :"
          "1. Utilise 'generate_sql_query' pour obtenir le SQL et le type de graphique ."
          "2. Parse le JSON reçu (si nécessaire)."
-         "3. Utilise 'execute_sql_tool' avec le SQL. et utilise 'create_visualization_tool' avec le CSV et le type de graphique obtenu par generate_sql_query le titre du graphique doit etre significatif."
-         "4. Réponds à l'utilisateur avec le résultat final et le chemin du graphique."
+         "3. Utilise 'execute_and_export_sql' avec le SQL. et utilise 'generate_visualization' avec le result_id renvoyé et le type de graphique obtenu par generate_sql_query le titre du graphique doit etre significatif."
+         "4. Si 'execute_and_export_sql' renvoie une erreur (requête refusée ou trop lente), rappelle une seule fois 'generate_sql_query' avec feedback = la requête et l'erreur reçue, puis exécute la nouvelle requête."
+         "5. Réponds à l'utilisateur avec le résultat final et le chemin du graphique."
          ),
         ("human", "{input}"),
         ("placeholder", "{agent_scratchpad}"),
@@ -36,6 +43,221 @@ def create_agent():
     # verbose=True permet de voir le 'Reasoning' (Pensées) de l'agent dans la console
     return AgentExecutor(agent=agent, tools=tools, verbose=True)
 
+def _new_pipeline_result(question):
+    return {
+        'success': False,
+        'question': question,
+        'sql': None,
+        'viz_type': None,
+        'result_id': None,
+        'viz_path': None,
+        'chart_spec': None,
+        'row_count': 0,
+        'truncated': False,
+        'columns': [],
+        'output': '',
+        'llm_calls': 0,
+        'error': None,
+    }
+
+def _repair_feedback(result, spec, error):
+    """Message renvoyé au LLM pour la tentative suivante."""
+    result['error'] = str(error)
+    if spec is None:
+        return f"Ta réponse n'était pas un JSON valide : {error}"
+    if isinstance(error, QueryRejected):
+        # Plan d'exécution inclus : le LLM réécrit la requête en connaissance de cause
+        return f"Requête : {spec['sql']}\nRequête refusée (trop coûteuse ou trop lente) : {error}"
+    return f"Requête : {spec['sql']}\nErreur SQLite : {error}"
+
+def _store_result(result, df):
+    # Stockage en mémoire (l'export disque ne sera écrit qu'au téléchargement)
+    result['result_id'] = get_result_store().put(df, result['sql'])
+    result['row_count'] = len(df)
+    result['columns'] = list(df.columns)
+    result['truncated'] = df.attrs.get('truncated', False)
+
+def _finish_pipeline(result, question):
+    result['success'] = True
+    result['output'] = f"{result['row_count']} ligne(s) trouvée(s) pour : {question}"
+    if result['truncated']:
+        result['output'] += " (résultat tronqué au plafond de lignes)"
+    return result
+
+def _is_chart(viz_type):
+    # Les tableaux ne sont pas rendus en image : l'interface les affiche page par page,
+    # l'image n'est produite qu'à la demande (bouton de téléchargement)
+    try:
+        return chart_kind(viz_type) != 'table'
+    except UnsupportedChartType:
+        return False
+
+def _add_chart_spec(result, df, question):
+    # Spécification Vega-Lite (repli sur un tableau, affiché sans spécification)
+    try:
+        result['chart_spec'] = chart_spec(df, result['viz_type'], question)
+    except Exception:
+        result['chart_spec'] = None
+
+def _pipeline_steps(result, question, max_repairs, chart_output):
+    """
+    Déroulé du pipeline, commun à run_pipeline et arun_pipeline : génération SQL,
+    exécution (avec réparation), stockage et visualisation.
+    
+    Chaque opération coûteuse est demandée par un `yield (étape, *arguments)` ;
+    le moteur (_drive ou _adrive) l'exécute et renvoie son résultat par send(),
+    ou son exception par throw(). Le résultat final est la valeur de retour.
+    """
+    # 1. Génération SQL (+ réparation si le JSON ou la requête échoue)
+    df = None
+    feedback = None
+    for _ in range(max_repairs + 1):
+        result['llm_calls'] += 1
+        try:
+            spec = yield ('generate', question, feedback)
+        except ValueError as e:
+            feedback = _repair_feedback(result, None, e)
+            continue
+        
+        result['sql'] = spec['sql']
+        result['viz_type'] = spec['viz_type']
+        try:
+            df = yield ('execute', spec['sql'])
+            result['error'] = None
+            break
+        except Exception as e:
+            feedback = _repair_feedback(result, spec, e)
+    
+    if df is None:
+        result['output'] = f"Impossible de répondre à la question : {result['error']}"
+        return result
+    
+    # 2. Stockage en mémoire
+    yield ('store', result, df)
+    
+    # 3. Visualisation (repli sur le tableau de l'interface plutôt qu'un nouvel appel LLM)
+    if not df.empty and chart_output == 'vega':
+        yield ('spec', result, df, question)
+    elif not df.empty and _is_chart(result['viz_type']):
+        try:
+            result['viz_path'] = yield ('render', df, result['viz_type'], question)
+        except Exception:
+            result['viz_path'] = None
+    
+    return _finish_pipeline(result, question)
+
+def _sync_steps():
+    return {
+        'generate': generate_sql_spec,
+        'execute': run_sql_query,
+        'store': _store_result,
+        'spec': _add_chart_spec,
+        'render': render_chart,
+    }
+
+def _async_steps():
+    return {
+        # Appel Gemini par ainvoke, SQLite dans un thread de l'executor
+        'generate': agenerate_sql_spec,
+        'execute': arun_sql_query,
+        # Pandas, réduction et JSON du graphique : hors de la boucle d'événements
+        'store': lambda *args: asyncio.to_thread(_store_result, *args),
+        'spec': lambda *args: asyncio.to_thread(_add_chart_spec, *args),
+        'render': arender_chart,
+    }
+
+def _drive(steps):
+    """Exécute les étapes demandées par _pipeline_steps (mode synchrone)."""
+    implementations = _sync_steps()
+    try:
+        request = next(steps)
+        while True:
+            name, *args = request
+            try:
+                value = implementations[name](*args)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(value)
+    except StopIteration as done:
+        return done.value
+
+async def _adrive(steps):
+    """Exécute les étapes demandées par _pipeline_steps (mode asynchrone)."""
+    implementations = _async_steps()
+    try:
+        request = next(steps)
+        while True:
+            name, *args = request
+            try:
+                value = await implementations[name](*args)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(value)
+    except StopIteration as done:
+        return done.value
+
+def run_pipeline(question, max_repairs=1, chart_output=CHART_OUTPUT):
+    """
+    Mode pipeline déterministe : un seul appel LLM (génération SQL + type de graphique),
+    puis exécution et visualisation en direct, sans passer par l'AgentExecutor.
+    Le LLM n'est rappelé (avec l'erreur en retour) que si le JSON ou le SQL échoue.
+    
+    Args:
+        question (str): Question de l'utilisateur en langage naturel
+        max_repairs (int): Nombre maximum d'appels LLM supplémentaires en cas d'échec
+        chart_output (str): 'vega' (spécification pour le navigateur) ou 'png' (image rendue)
+    
+    Returns:
+        dict: sql, viz_type, result_id, viz_path, chart_spec, row_count, truncated, columns, output, llm_calls, error
+    """
+    result = _new_pipeline_result(question)
+    return _drive(_pipeline_steps(result, question, max_repairs, chart_output))
+
+async def arun_pipeline(question, max_repairs=1, semaphore=None, chart_output=CHART_OUTPUT):
+    """
+    Version asynchrone de run_pipeline (mêmes étapes) : l'appel Gemini passe par
+    ainvoke, SQLite, pandas et le rendu tournent dans des threads ou processus. Plusieurs
+    questions peuvent ainsi être traitées en parallèle (voir arun_pipelines).
+    
+    Args:
+        question (str): Question de l'utilisateur en langage naturel
+        max_repairs (int): Nombre maximum d'appels LLM supplémentaires en cas d'échec
+        semaphore (asyncio.Semaphore): Limite de concurrence partagée (optionnelle)
+        chart_output (str): 'vega' ou 'png' (voir run_pipeline)
+    
+    Returns:
+        dict: mêmes clés que run_pipeline
+    """
+    if semaphore is not None:
+        async with semaphore:
+            return await arun_pipeline(question, max_repairs, chart_output=chart_output)
+    
+    result = _new_pipeline_result(question)
+    return await _adrive(_pipeline_steps(result, question, max_repairs, chart_output))
+
+async def arun_pipelines(questions, concurrency=PIPELINE_CONCURRENCY, max_repairs=1, chart_output=CHART_OUTPUT):
+    """
+    Traite une liste de questions en parallèle, au plus `concurrency` à la fois.
+    Une question en erreur n'interrompt pas les autres.
+    
+    Returns:
+        list: un résultat (dict de run_pipeline) par question, dans l'ordre d'entrée
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run_one(question):
+        try:
+            return await arun_pipeline(question, max_repairs, semaphore, chart_output)
+        except Exception as e:
+            result = _new_pipeline_result(question)
+            result['error'] = str(e)
+            result['output'] = f"Impossible de répondre à la question : {e}"
+            return result
+    
+    return await asyncio.gather(*(run_one(q) for q in questions))
+
 # ==============================================================================
 # TEST
 # ==============================================================================
@@ -52,4 +274,15 @@ if __name__ == "__main__":
             result = agent_executor.invoke({"input": question})
             print(f"\n🤖 Réponse finale : {result['output']}")
         except Exception as e:
-            print(f"Erreur : {e}")
\ No newline at end of file
+            print(f"Erreur : {e}")
+        
+        print("\n--- TEST 2 : Même question en mode pipeline ---")
+        result = run_pipeline(question)
+        print(f"\n🤖 Réponse finale : {result['output']} ({result['llm_calls']} appel(s) LLM)")
+        print(f"SQL : {result['sql']}")
+        print(f"Graphique : {result['viz_path']}")
+        
+        print("\n--- TEST 3 : Plusieurs questions en parallèle (asyncio) ---")
+        questions = [question, "Top 5 produits les plus chers", "Répartition des tailles disponibles"]
+        for result in asyncio.run(arun_pipelines(questions)):
+            print(f"- {result['question']} : {result['output']}")
\ No newline at end of file
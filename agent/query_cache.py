@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from contextlib import contextmanager
+import numpy as np
+from db_pool import get_connection
+
+DB_PATH = "data/boutique.db"
+CACHE_PATH = "data/query_cache.db"
+
+# Paramètres par défaut (surchargeables par variables d'environnement)
+DEFAULT_TTL = int(os.getenv("QUERY_CACHE_TTL", 7 * 24 * 3600))          # 7 jours
+DEFAULT_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1000))
+DEFAULT_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", 0.92))
+PENDING_EMBEDDINGS = 64          # embeddings gardés entre un get() sans résultat et le put()
+
+
+def normalize_question(text):
+    """
+    Normalise une question pour la recherche exacte :
+    minuscules, sans accents, sans ponctuation, espaces compactés.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.lower()
+    text = re.sub(r"[^\w\s%]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+_fingerprints = {}
+
+def schema_fingerprint(db_path=DB_PATH):
+    """
+    Empreinte du schéma (sqlite_master) de la base, index exclus : ajouter un
+    index (index_advisor) ne change pas le SQL valide et n'invalide pas les caches.
+    Recalculée uniquement quand PRAGMA schema_version change (tout DDL l'incrémente,
+    y compris tant qu'il n'est que dans le fichier -wal) ou que la base est recréée.
+    """
+    try:
+        inode = os.stat(db_path).st_ino
+    except FileNotFoundError:
+        return "absent"
+    conn = get_connection(db_path)
+    key = (db_path, inode, conn.execute("PRAGMA schema_version").fetchone()[0])
+    if key not in _fingerprints:
+        rows = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE type != 'index' ORDER BY type, name"
+        ).fetchall()
+        _fingerprints[key] = hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()[:16]
+    return _fingerprints[key]
+
+
+class QueryCache:
+    """
+    Cache persistant (SQLite) question -> {"sql", "viz_type"}.
+
+    - Recherche exacte sur la question normalisée, puis recherche sémantique
+      optionnelle (similarité cosinus des embeddings) au-dessus d'un seuil.
+    - Les entrées sont liées à l'empreinte du schéma : elles sont purgées
+      automatiquement dès que le schéma de la base change.
+    - Éviction TTL (âge) et LRU (nombre maximum d'entrées).
+    - Compteurs hits / misses persistés pour mesurer les appels LLM évités.
+    """
+
+    def __init__(self, path=CACHE_PATH, db_path=DB_PATH, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, embed_fn=None,
+                 similarity_threshold=DEFAULT_SIMILARITY):
+        self.path = path
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self._schema_version = None
+        self._lock = threading.Lock()
+        self._embeddings = {}        # question normalisée -> embedding d'un get() sans résultat
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    question_key TEXT NOT NULL,
+                    schema_version TEXT NOT NULL,
+                    question TEXT,
+                    sql TEXT NOT NULL,
+                    viz_type TEXT,
+                    embedding TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER DEFAULT 0,
+                    PRIMARY KEY (question_key, schema_version)
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+                CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _incr(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def _current_schema(self, conn):
+        """Empreinte courante ; purge les entrées d'un ancien schéma si elle a changé."""
+        version = schema_fingerprint(self.db_path)
+        if version != self._schema_version:
+            cur = conn.execute("DELETE FROM entries WHERE schema_version != ?", (version,))
+            if cur.rowcount:
+                self._incr(conn, "invalidations", cur.rowcount)
+            self._schema_version = version
+        return version
+
+    def _evict(self, conn, now):
+        """Supprime les entrées expirées (TTL) puis les moins récemment utilisées (LRU)."""
+        evicted = 0
+        if self.ttl:
+            evicted += conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        if self.max_entries:
+            evicted += conn.execute("""
+                DELETE FROM entries WHERE rowid IN (
+                    SELECT rowid FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+        if evicted:
+            self._incr(conn, "evictions", evicted)
+
+    def _embed(self, question):
+        if self.embed_fn is None:
+            return None
+        try:
+            return np.asarray(self.embed_fn(question), dtype=np.float32)
+        except Exception:
+            # Le cache ne doit jamais faire échouer la génération
+            return None
+
+    def get(self, question):
+        """
+        Renvoie le {"sql", "viz_type"} mis en cache pour cette question, ou None.
+
+        L'embedding (appel réseau) est calculé hors du verrou et de toute
+        transaction ; après un échec, il est gardé pour le put() de la même question.
+        """
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            version = self._current_schema(conn)
+            self._evict(conn, now)
+
+            # 1. Recherche exacte
+            row = conn.execute(
+                "SELECT sql, viz_type FROM entries WHERE question_key = ? AND schema_version = ?",
+                (key, version)
+            ).fetchone()
+            if row is not None:
+                return self._hit(conn, key, version, row, "hits", now)
+            if self.embed_fn is None:
+                self._incr(conn, "misses")
+                return None
+            has_embeddings = conn.execute(
+                "SELECT 1 FROM entries WHERE schema_version = ? AND embedding IS NOT NULL LIMIT 1", (version,)
+            ).fetchone() is not None
+
+        # 2. Recherche sémantique (optionnelle) : embedding calculé sans verrou, gardé pour put()
+        query_vec = self._embed(question)
+        with self._lock, self._connect() as conn:
+            self._remember_embedding(key, query_vec)
+            version = self._current_schema(conn)
+            if has_embeddings and query_vec is not None:
+                row, match_key = self._semantic_lookup(conn, query_vec, version)
+                if row is not None:
+                    return self._hit(conn, match_key, version, row, "semantic_hits", now)
+            self._incr(conn, "misses")
+            return None
+
+    def _hit(self, conn, key, version, row, kind, now):
+        conn.execute(
+            "UPDATE entries SET last_access = ?, hits = hits + 1 "
+            "WHERE question_key = ? AND schema_version = ?",
+            (now, key, version)
+        )
+        self._incr(conn, kind)
+        return {"sql": row[0], "viz_type": row[1]}
+
+    def _remember_embedding(self, key, vector):
+        # Quelques embeddings récents seulement : un échec de génération n'appelle jamais put()
+        if vector is None:
+            return
+        self._embeddings.pop(key, None)
+        self._embeddings[key] = vector
+        while len(self._embeddings) > PENDING_EMBEDDINGS:
+            self._embeddings.pop(next(iter(self._embeddings)))
+
+    def _semantic_lookup(self, conn, query_vec, version):
+        candidates = conn.execute(
+            "SELECT question_key, sql, viz_type, embedding FROM entries "
+            "WHERE schema_version = ? AND embedding IS NOT NULL",
+            (version,)
+        ).fetchall()
+        if not candidates:
+            return None, None
+
+        matrix = np.array([json.loads(c[3]) for c in candidates], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vec)
+        scores = matrix @ query_vec / np.where(norms == 0, 1, norms)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None, None
+        return (candidates[best][1], candidates[best][2]), candidates[best][0]
+
+    def put(self, question, spec):
+        """Enregistre (ou remplace) la réponse du modèle pour cette question."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            embedding = self._embeddings.pop(key, None)
+        if embedding is None:
+            # Pas de get() préalable (ou embedding oublié) : calcul hors verrou
+            embedding = self._embed(question)
+        with self._lock, self._connect() as conn:
+            version = self._current_schema(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(question_key, schema_version, question, sql, viz_type, embedding, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, version, question, spec["sql"], spec.get("viz_type"),
+                 json.dumps(embedding.tolist()) if embedding is not None else None,
+                 now, now)
+            )
+            self._evict(conn, now)
+
+    def invalidate(self, question):
+        """Retire une question du cache (ex : SQL mis en cache qui échoue)."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE question_key = ?", (normalize_question(question),))
+
+    def stats(self):
+        """Compteurs cumulés : hits, semantic_hits, misses, evictions, invalidations, size, hit_rate."""
+        with self._connect() as conn:
+            stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            stats["size"] = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        for name in ("hits", "semantic_hits", "misses", "evictions", "invalidations"):
+            stats.setdefault(name, 0)
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["semantic_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Vide le cache et remet les compteurs à zéro."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM stats")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_query_cache():
+    """
+    Instance partagée du cache. La recherche sémantique est activée avec
+    QUERY_CACHE_EMBEDDINGS=1 (embeddings Gemini) ; le cache peut être
+    désactivé complètement avec QUERY_CACHE=0.
+    """
+    global _cache
+    if os.getenv("QUERY_CACHE", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            embed_fn = None
+            if os.getenv("QUERY_CACHE_EMBEDDINGS", "0") == "1":
+                from llm_registry import get_embeddings
+                embed_fn = get_embeddings().embed_query
+            _cache = QueryCache(embed_fn=embed_fn)
+        return _cache
+
+
+# --- Statistiques du cache ---
+if __name__ == "__main__":
+    import sys
+    cache = QueryCache()
+    if "--clear" in sys.argv:
+        cache.clear()
+        print("🗑️ Cache vidé.")
+    stats = cache.stats()
+    print(f"📦 Entrées : {stats['size']}")
+    print(f"✅ Hits : {stats['hits']} (dont sémantiques : {stats['semantic_hits']})")
+    print(f"❌ Misses : {stats['misses']}")
+    print(f"♻️ Évictions : {stats['evictions']} | Invalidations schéma : {stats['invalidations']}")
+    print(f"📈 Taux de hit : {stats['hit_rate']:.1%} -> appels LLM évités : {stats['hits'] + stats['semantic_hits']}")
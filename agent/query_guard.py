@@ -0,0 +1,279 @@
+import os
+import re
+import time
+import math
+import sqlite3
+from contextlib import contextmanager
+
+# Coût estimé (lignes visitées) au-delà duquel une requête est refusée avant exécution.
+# Calibré sur le catalogue généré de 1e6 produits (20e6 variantes) : les questions de
+# data/user_input.txt coûtent au plus ~7e8 (1 à 35 s), une sous-requête corrélée qui
+# reparcourt produits à chaque ligne ~1e12 (plusieurs heures)
+MAX_PLAN_COST = float(os.getenv("SQL_MAX_PLAN_COST", 1_000_000_000))
+# Durée maximale d'exécution d'une requête (0 = pas de limite)
+STATEMENT_TIMEOUT = float(os.getenv("SQL_TIMEOUT_SECONDS", 30))
+# Parcours complet signalé au-delà de ce nombre de lignes
+SCAN_WARN_ROWS = int(os.getenv("SQL_SCAN_WARN_ROWS", 10_000))
+PROGRESS_STEPS = 10_000          # instructions SQLite entre deux vérifications du délai
+DEFAULT_TABLE_ROWS = 1_000       # estimation pour une table sans rowid ni statistiques
+DEFAULT_FANOUT = 10              # lignes par valeur d'un index sans statistiques (hypothèse de SQLite)
+GROUPED_ROWS = 100               # lignes produites par un GROUP BY (plafond de l'optimiseur de SQLite)
+
+_PLAN_NODE = re.compile(r"^(SCAN|SEARCH) (\S+)")
+_TABLE_REF = re.compile(
+    r'(?:\bFROM|\bJOIN|,)\s+("[^"]+"|\w+)(?:\s+(?:AS\s+)?(?!(?:ON|USING|FROM|WHERE|JOIN|INNER|LEFT|CROSS|NATURAL|GROUP|ORDER|LIMIT|HAVING|UNION|WINDOW)\b)(\w+))?',
+    re.IGNORECASE,
+)
+_SEARCH_INDEX = re.compile(r"USING (AUTOMATIC )?(?:PARTIAL )?(?:COVERING )?INDEX (?:(\S+) )?\((.*)\)")
+_FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")
+_FINAL_LIMIT = re.compile(r"\bLIMIT\s+[^()]+$", re.IGNORECASE)
+
+
+class QueryRejected(ValueError):
+    """Requête refusée par le garde-fou : le message contient le plan, renvoyé au LLM pour réécriture."""
+
+    def __init__(self, message, plan_text=""):
+        super().__init__(f"{message}\nPlan d'exécution :\n{plan_text}" if plan_text else message)
+        self.plan_text = plan_text
+
+
+class QueryTimeout(QueryRejected):
+    """Requête interrompue après SQL_TIMEOUT_SECONDS."""
+
+
+def explain(conn, sql_query):
+    """Plan d'exécution : liste de (id, parent, detail)."""
+    return [(row[0], row[1], row[3]) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql_query}")]
+
+
+def format_plan(plan):
+    """Plan indenté façon sqlite3 (.eqp)."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append(f"{'  ' * depth[node_id]}{detail}")
+    return "\n".join(lines)
+
+
+def table_aliases(sql_query):
+    """{alias ou nom: table} d'après les clauses FROM / JOIN de la requête."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql_query):
+        table = table.strip('"')
+        aliases.setdefault(table, table)
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+
+def table_rows(conn, table, cache):
+    """Nombre de lignes estimé sans parcourir la table (sqlite_stat1 ou MAX(rowid))."""
+    if table not in cache:
+        rows = None
+        try:
+            stat = conn.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1", (table,)
+            ).fetchone()
+            if stat:
+                rows = int(stat[0].split()[0])
+        except sqlite3.Error:
+            pass
+        if rows is None:
+            try:
+                rows = conn.execute(f'SELECT MAX(rowid) FROM "{table.replace(chr(34), chr(34) * 2)}"').fetchone()[0]
+            except sqlite3.Error:
+                rows = None
+        cache[table] = DEFAULT_TABLE_ROWS if rows is None else max(int(rows), 1)
+    return cache[table]
+
+
+def index_fanout(conn, index, equalities, cache):
+    """
+    Lignes renvoyées par une recherche sur les `equalities` premières colonnes
+    de l'index (sqlite_stat1), DEFAULT_FANOUT sans statistiques.
+    """
+    key = ("index", index, equalities)
+    if key not in cache:
+        fanout = None
+        if index and equalities:
+            try:
+                stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE idx = ?", (index,)).fetchone()
+                if stat:
+                    fields = stat[0].split()
+                    if len(fields) > equalities:
+                        fanout = int(fields[equalities])
+            except (sqlite3.Error, ValueError):
+                pass
+        cache[key] = DEFAULT_FANOUT if fanout is None else max(fanout, 1)
+    return cache[key]
+
+
+def estimate_cost(conn, sql_query, plan, row_counts=None):
+    """
+    Coût estimé de la requête (nombre de lignes visitées) et anomalies du plan.
+
+    Chaque niveau du plan est une boucle imbriquée dont on suit la cardinalité :
+    un SCAN visite toute la table pour chaque ligne de la boucle, un SEARCH
+    descend l'index (log2) puis lit les lignes correspondantes (sqlite_stat1),
+    avec une lecture de la table en plus si l'index n'est pas couvrant. Une
+    sous-requête corrélée coûte son propre plan (une recherche, ou un parcours
+    complet) par ligne de la boucle englobante ; un B-tree temporaire (tri,
+    GROUP BY, DISTINCT) une insertion par ligne. Les CTE et sous-requêtes
+    matérialisées prennent la cardinalité estimée de leur propre plan, plafonnée
+    à GROUPED_ROWS après un GROUP BY (comme l'optimiseur de SQLite).
+
+    Args:
+        row_counts (dict): {table: lignes} connus (sinon estimés sur conn)
+
+    Returns:
+        tuple: (coût, [anomalies])
+    """
+    aliases = table_aliases(sql_query)
+    counts = dict(row_counts or {})
+    children = {}
+    for node_id, parent, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+    warnings = []
+
+    def level_cost(parent):
+        """(coût, lignes produites) d'un niveau du plan exécuté une fois."""
+        loop = 1.0
+        total = 0.0
+        scans = []
+        searched = False
+        grouped = False
+        for node_id, detail in children.get(parent, []):
+            match = _PLAN_NODE.match(detail)
+            if match:
+                name = match.group(2)
+                table = name if name in counts else aliases.get(name, name)
+                rows = table_rows(conn, table, counts)
+                if match.group(1) == "SCAN" and _FTS_MATCH.search(detail):
+                    # Table virtuelle interrogée par MATCH (index plein texte) : recherche, pas parcours
+                    searched = True
+                    total += loop * max(1.0, math.log2(rows))
+                    loop *= max(1.0, math.log2(rows))
+                elif match.group(1) == "SCAN":
+                    scans.append(table)
+                    if rows > SCAN_WARN_ROWS and "COVERING INDEX" not in detail:
+                        warnings.append(f"parcours complet de {table} (~{rows} lignes)")
+                    # Index couvrant : plus étroit que la table, moins de pages lues
+                    total += loop * (rows / 2 if "COVERING INDEX" in detail else rows)
+                    loop *= rows
+                elif "PRIMARY KEY" in detail or "rowid=" in detail:
+                    searched = True
+                    total += loop * max(1.0, math.log2(rows))
+                else:
+                    searched = True
+                    index = _SEARCH_INDEX.search(detail)
+                    terms = index.group(3) if index else ""
+                    equalities = terms.count("=?") - terms.count(">=?") - terms.count("<=?")
+                    if index and index.group(1):
+                        # Index automatique : construit à chaque exécution (parcours de la table)
+                        total += rows
+                        fanout = DEFAULT_FANOUT
+                    else:
+                        fanout = index_fanout(conn, index.group(2) if index else None, equalities, counts)
+                    if not equalities:
+                        fanout = rows
+                    if ">" in terms or "<" in terms:
+                        # Intervalle : un quart des lignes par borne (même hypothèse que SQLite)
+                        fanout /= 4
+                    reads = 1 if "COVERING INDEX" in detail else 2
+                    total += loop * (max(1.0, math.log2(rows)) + fanout * reads)
+                    loop *= max(fanout, 1.0)
+            elif detail.startswith("CORRELATED"):
+                warnings.append(f"sous-requête corrélée ({detail.lower()})")
+                total += loop * level_cost(node_id)[0]
+            elif detail.startswith(("MATERIALIZE", "CO-ROUTINE")):
+                # CTE ou sous-requête du FROM : exécutée une fois, sa cardinalité sert au SCAN qui la lit
+                cost, rows = level_cost(node_id)
+                total += cost
+                counts[detail.split(" ", 1)[1]] = max(int(rows), 1)
+            elif "TEMP B-TREE" in detail:
+                sorted_rows = min(loop, GROUPED_ROWS) if grouped else loop
+                if sorted_rows > SCAN_WARN_ROWS:
+                    warnings.append(f"{detail.lower()} (~{sorted_rows:,.0f} lignes)")
+                total += sorted_rows + level_cost(node_id)[0]
+                grouped = grouped or "GROUP BY" in detail
+            else:
+                # Sous-requête, UNION... : coût propre, additionné
+                total += level_cost(node_id)[0]
+        if len(scans) > 1 and not searched:
+            warnings.append(f"produit cartésien probable ({' x '.join(scans)})")
+        return total, (min(loop, GROUPED_ROWS) if grouped else loop)
+
+    return level_cost(0)[0], warnings
+
+
+def ensure_limit(sql_query, limit):
+    """Ajoute LIMIT à la requête si elle n'en a pas au niveau principal."""
+    sql_query = sql_query.strip().rstrip(";").strip()
+    if not limit or _FINAL_LIMIT.search(sql_query):
+        return sql_query
+    # Retour à la ligne : un commentaire -- final ne masque pas la clause
+    return f"{sql_query}\nLIMIT {int(limit)}"
+
+
+def check_query(conn, sql_query, limit=None, max_cost=MAX_PLAN_COST):
+    """
+    Contrôle avant exécution : plan, coût estimé et LIMIT.
+
+    Returns:
+        tuple: (requête à exécuter, plan, anomalies)
+
+    Raises:
+        QueryRejected: si le coût estimé dépasse max_cost
+    """
+    sql_query = ensure_limit(sql_query, limit)
+    plan = explain(conn, sql_query)
+    cost, warnings = estimate_cost(conn, sql_query, plan)
+    if max_cost and cost > max_cost:
+        raise QueryRejected(
+            f"Requête trop coûteuse (~{cost:,.0f} lignes visitées, maximum {max_cost:,.0f}) : "
+            + "; ".join(warnings or ["plan trop coûteux"])
+            + ". Réécris-la (JOIN sur les clés, filtres sur des colonnes indexées, pas de sous-requête corrélée).",
+            format_plan(plan),
+        )
+    return sql_query, plan, warnings
+
+
+@contextmanager
+def statement_timeout(conn, seconds=STATEMENT_TIMEOUT, plan=None):
+    """
+    Limite le temps passé dans SQLite par une requête (set_progress_handler).
+
+    Le gestionnaire fourni (timed(fonction, *args)) exécute execute / fetchmany
+    en décomptant leur durée : le temps passé par l'appelant entre deux lots
+    (écriture des exports) n'entre pas dans le budget. Au-delà de `seconds`,
+    SQLite interrompt la requête, levée en QueryTimeout.
+    """
+    if not seconds:
+        yield lambda fn, *args: fn(*args)
+        return
+    used = 0.0
+    deadline = None
+
+    def timed(fn, *args):
+        nonlocal used, deadline
+        started = time.monotonic()
+        deadline = started + seconds - used
+        try:
+            return fn(*args)
+        finally:
+            used += time.monotonic() - started
+            deadline = None
+
+    conn.set_progress_handler(lambda: deadline is not None and time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        yield timed
+    except sqlite3.OperationalError as e:
+        if "interrupt" not in str(e).lower():
+            raise
+        raise QueryTimeout(
+            f"Requête interrompue après {seconds:g} s : trop lente, réécris-la plus simplement.",
+            format_plan(plan) if plan else "",
+        ) from e
+    finally:
+        conn.set_progress_handler(None, 0)
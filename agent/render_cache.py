@@ -0,0 +1,167 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+CACHE_PATH = "data/render_cache.db"
+
+# Paramètres par défaut (surchargeables par variables d'environnement)
+DEFAULT_MAX_AGE = int(os.getenv("RENDER_CACHE_MAX_AGE", 30 * 24 * 3600))               # 30 jours
+DEFAULT_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 500 * 1024 * 1024))        # 500 Mo
+
+
+class RenderCache:
+    """
+    Cache persistant (SQLite) des images rendues :
+    clé (empreinte des données, type de rendu, titre, version du style) -> chemin du PNG.
+
+    - Partagé entre sessions et redémarrages : une question qui redonne les mêmes
+      données ressert immédiatement l'image existante, sans nouveau rendu.
+    - Éviction par âge (dernier accès) et par taille totale (LRU) ; le fichier
+      n'est supprimé que lorsqu'aucune entrée ne le référence plus.
+    - Le cache est propriétaire des images : l'historique d'une session ne les supprime pas.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_age=DEFAULT_MAX_AGE, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS renders (
+                    render_key TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_renders_last_access ON renders(last_access);
+                CREATE INDEX IF NOT EXISTS idx_renders_path ON renders(path);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Chemin de l'image déjà rendue pour cette clé (si elle existe encore), sinon None."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT path, last_access FROM renders WHERE render_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            path, last_access = row
+            if not os.path.exists(path) or (self.max_age and last_access < now - self.max_age):
+                conn.execute("DELETE FROM renders WHERE render_key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE renders SET last_access = ?, hits = hits + 1 WHERE render_key = ?",
+                (now, key)
+            )
+            return path
+
+    def put(self, key, path):
+        """Enregistre l'image rendue pour cette clé puis applique l'éviction."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO renders (render_key, path, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, path, os.path.getsize(path), now, now)
+            )
+            self._evict(conn, now, keep=path)
+
+    def _evict(self, conn, now, keep=None):
+        """Supprime les entrées trop anciennes, puis les moins récentes au-delà de max_bytes."""
+        evicted = []
+        if self.max_age:
+            evicted += conn.execute(
+                "SELECT render_key, path FROM renders WHERE last_access < ?", (now - self.max_age,)
+            ).fetchall()
+        if self.max_bytes:
+            # Taille réelle sur disque : une image partagée par plusieurs clés ne compte qu'une fois
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT path, size FROM renders)"
+            ).fetchone()[0]
+            expired = {key for key, _ in evicted}
+            freed = set()
+            for key, path, size in conn.execute(
+                "SELECT render_key, path, size FROM renders ORDER BY last_access"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if path == keep or key in expired:
+                    continue
+                evicted.append((key, path))
+                if path not in freed:
+                    freed.add(path)
+                    total -= size
+
+        for key, _ in evicted:
+            conn.execute("DELETE FROM renders WHERE render_key = ?", (key,))
+        for path in {path for _, path in evicted}:
+            still_used = conn.execute("SELECT 1 FROM renders WHERE path = ? LIMIT 1", (path,)).fetchone()
+            if still_used is None and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return len(evicted)
+
+    def stats(self):
+        with self._connect() as conn:
+            size, hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM renders").fetchone()
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT path, size FROM renders)"
+            ).fetchone()[0]
+        return {"size": size, "hits": hits, "bytes": total}
+
+    def clear(self, delete_files=True):
+        """Vide le cache (et supprime les images par défaut)."""
+        with self._lock, self._connect() as conn:
+            if delete_files:
+                for (path,) in conn.execute("SELECT DISTINCT path FROM renders").fetchall():
+                    if os.path.exists(path):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+            conn.execute("DELETE FROM renders")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_render_cache():
+    """Instance partagée du cache de rendus (désactivable avec RENDER_CACHE=0)."""
+    global _cache
+    if os.getenv("RENDER_CACHE", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache()
+        return _cache
+
+
+# --- Statistiques du cache ---
+if __name__ == "__main__":
+    import sys
+    cache = RenderCache()
+    if "--clear" in sys.argv:
+        cache.clear()
+        print("🗑️ Cache de rendus vidé.")
+    stats = cache.stats()
+    print(f"🖼️ Images : {stats['size']} ({stats['bytes'] / 1024 / 1024:.1f} Mo)")
+    print(f"✅ Rendus évités : {stats['hits']}")
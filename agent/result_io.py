@@ -0,0 +1,182 @@
+import os
+import csv
+import pandas as pd
+
+# pyarrow est optionnel : sans lui, on reste sur le CSV
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+# Formats supportés -> extension de fichier
+FORMATS = {
+    'csv': 'csv',
+    'parquet': 'parquet',
+    'feather': 'feather',   # Arrow IPC non compressé : lisible en memory-map
+    'arrow': 'arrow',
+}
+# Ordre de préférence en lecture (du plus rapide au plus lent)
+READ_PREFERENCE = ['feather', 'arrow', 'parquet', 'csv']
+
+
+def available_formats():
+    """Formats utilisables dans l'environnement courant."""
+    if HAS_ARROW:
+        return list(FORMATS)
+    return ['csv']
+
+
+def preferred_format():
+    """Format binaire le plus rapide disponible (CSV en dernier recours)."""
+    formats = available_formats()
+    return next(fmt for fmt in READ_PREFERENCE if fmt in formats)
+
+
+def format_of(filepath):
+    """Déduit le format d'un fichier à partir de son extension."""
+    ext = os.path.splitext(filepath)[1].lstrip('.').lower()
+    for fmt, fmt_ext in FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    raise ValueError(f"Format de fichier non supporté : {filepath}")
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Format non supporté : {fmt} (formats : {', '.join(FORMATS)})")
+    if fmt not in available_formats():
+        raise ValueError(f"Le format '{fmt}' nécessite pyarrow (pip install pyarrow)")
+
+
+def write_dataframe(df, filepath, fmt=None):
+    """Écrit un DataFrame dans le format demandé (déduit de l'extension par défaut)."""
+    fmt = fmt or format_of(filepath)
+    _check_format(fmt)
+    if fmt == 'csv':
+        df.to_csv(filepath, index=False, encoding='utf-8')
+    elif fmt == 'parquet':
+        df.to_parquet(filepath, index=False)
+    else:
+        # Pas de compression : le fichier peut être mappé en mémoire à la lecture
+        feather.write_feather(df, filepath, compression='uncompressed')
+    return filepath
+
+
+def read_result(filepath):
+    """Charge un résultat exporté en DataFrame (memory-map pour Arrow/Parquet)."""
+    fmt = format_of(filepath)
+    if fmt == 'csv':
+        return pd.read_csv(filepath)
+    _check_format(fmt)
+    if fmt == 'parquet':
+        return pq.read_table(filepath, memory_map=True).to_pandas()
+    return feather.read_table(filepath, memory_map=True).to_pandas()
+
+
+def sibling_paths(filepath):
+    """Chemins des autres formats existants pour le même export (même nom, autre extension)."""
+    stem = os.path.splitext(filepath)[0]
+    paths = {}
+    for fmt in READ_PREFERENCE:
+        candidate = f"{stem}.{FORMATS[fmt]}"
+        if os.path.exists(candidate):
+            paths[fmt] = candidate
+    return paths
+
+
+def fastest_path(filepath):
+    """
+    Choisit, parmi les exports disponibles pour ce résultat, le plus rapide à relire
+    (Feather/Arrow puis Parquet, le CSV ne servant qu'au téléchargement).
+    """
+    formats = available_formats()
+    for fmt, path in sibling_paths(filepath).items():
+        if fmt in formats:
+            return path
+    return filepath
+
+
+def load_fastest(filepath):
+    """Raccourci : charge le résultat depuis son format le plus rapide."""
+    return read_result(fastest_path(filepath))
+
+
+class BatchWriter:
+    """
+    Écriture incrémentale d'un résultat, lot par lot, dans un format donné.
+    Le schéma Arrow est fixé par le premier lot ; si un lot suivant n'est pas
+    compatible (typage dynamique de SQLite), l'écriture colonnaire est
+    abandonnée et failed passe à True (le CSV reste la référence).
+    """
+
+    def __init__(self, filepath, fmt):
+        _check_format(fmt)
+        self.filepath = filepath
+        self.fmt = fmt
+        self.failed = False
+        self._file = None
+        self._writer = None
+        self._schema = None
+
+    def write(self, columns, rows):
+        """Ajoute un lot de lignes (un lot vide écrit tout de même l'en-tête/le schéma)."""
+        if self.failed:
+            return
+        if self.fmt == 'csv':
+            if self._writer is None:
+                self._file = open(self.filepath, 'w', newline='', encoding='utf-8')
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(columns)
+            self._writer.writerows(rows)
+            return
+        try:
+            self._write_arrow(columns, rows)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            self.abort()
+
+    def _write_arrow(self, columns, rows):
+        data = {col: [row[i] for row in rows] for i, col in enumerate(columns)}
+        if self._schema is None:
+            table = pa.table(data)
+            # Colonnes entièrement NULL dans le premier lot : on suppose du texte
+            self._schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in table.schema
+            ])
+            table = table.cast(self._schema)
+            if self.fmt == 'parquet':
+                self._writer = pq.ParquetWriter(self.filepath, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.filepath, self._schema)
+        else:
+            table = pa.table(data, schema=self._schema)
+        self._writer.write_table(table)
+
+    @property
+    def bytes_written(self):
+        if self.fmt == 'csv' and self._file is not None:
+            return self._file.tell()
+        return os.path.getsize(self.filepath) if os.path.exists(self.filepath) else 0
+
+    def close(self):
+        """Finalise le fichier."""
+        if self._file is not None:
+            # CSV : le csv.writer n'a rien à fermer, seul le fichier compte
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        self._writer = self._file = None
+
+    def abort(self):
+        """Abandonne l'écriture et supprime le fichier partiel."""
+        self.failed = True
+        try:
+            self.close()
+        except Exception:
+            pass
+        self._writer = self._file = None
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
@@ -0,0 +1,227 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+import pandas as pd
+from result_io import FORMATS, write_dataframe
+from artifact_store import hash_dataframe, record_artifact
+
+EXPORT_DIR = "exports"
+
+# Bornes du stockage en mémoire (surchargeables par variables d'environnement)
+MAX_RESULTS = int(os.getenv("RESULT_STORE_MAX_RESULTS", 64))
+MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", 512 * 1024 * 1024))   # 512 Mo
+
+
+class ResultNotFound(KeyError):
+    """Identifiant de résultat inconnu ou déjà évincé du stockage."""
+
+
+class StoredResult:
+    """Un résultat de requête conservé en mémoire."""
+
+    def __init__(self, result_id, df, sql=None):
+        self.result_id = result_id
+        self.df = df
+        self.sql = sql
+        self.created_at = time.time()
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+        self.data_hash = hash_dataframe(df)
+        self.exports = {}   # format -> chemin, rempli à la demande
+        self._table = None  # copie SQLite en mémoire pour tri/filtre/pagination, créée à la demande
+        self._table_lock = threading.Lock()
+        self.table_columns = []
+        self.table_bytes = 0          # taille de cette copie, comptée dans le budget du stockage
+        self.table_accounted = False
+
+    def query_table(self):
+        """Connexion SQLite en mémoire contenant le résultat (table « resultat »)."""
+        with self._table_lock:
+            if self._table is None:
+                conn = sqlite3.connect(":memory:", check_same_thread=False)
+                # SQLite refuse les noms de colonnes en double (ex : deux « id » après un JOIN)
+                seen = {}
+                for name in map(str, self.df.columns):
+                    seen[name] = seen.get(name, 0) + 1
+                    self.table_columns.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+                self.df.set_axis(self.table_columns, axis=1).to_sql("resultat", conn, index=False)
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                self.table_bytes = page_count * conn.execute("PRAGMA page_size").fetchone()[0]
+                self._table = conn
+            return self._table
+
+    def close(self):
+        """Libère la copie SQLite (résultat évincé du stockage)."""
+        with self._table_lock:
+            if self._table is not None:
+                self._table.close()
+                self._table = None
+
+
+class ResultStore:
+    """
+    Stockage en mémoire des résultats de requêtes, indexés par un identifiant court.
+
+    L'exécuteur y dépose le DataFrame, le visualiseur et l'interface le relisent
+    directement par son identifiant : plus d'aller-retour écriture/relecture
+    de fichier entre deux outils. La taille est bornée (nombre de résultats et
+    octets) avec éviction LRU ; l'export disque n'est écrit qu'à la demande.
+    Un résultat identique, produit par la même requête, réutilise l'identifiant
+    déjà stocké ; deux requêtes différentes gardent chacune leur entrée (et leur SQL).
+    """
+
+    def __init__(self, max_results=MAX_RESULTS, max_bytes=MAX_BYTES):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self._results = OrderedDict()
+        self._by_key = {}         # (empreinte des données, sql) -> identifiant
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, df, sql=None):
+        """
+        Ajoute un DataFrame et renvoie son identifiant (celui du doublon s'il existe
+        déjà : mêmes données et même SQL).
+        """
+        entry = StoredResult(uuid.uuid4().hex[:12], df, sql)
+        key = (entry.data_hash, sql)
+        with self._lock:
+            existing = self._by_key.get(key)
+            if existing is not None:
+                self._results.move_to_end(existing)
+                return existing
+            self._results[entry.result_id] = entry
+            self._by_key[key] = entry.result_id
+            self._total_bytes += entry.nbytes
+            self._evict()
+        return entry.result_id
+
+    def _evict(self):
+        # On garde toujours au moins le résultat le plus récent
+        while len(self._results) > 1 and (
+            len(self._results) > self.max_results or self._total_bytes > self.max_bytes
+        ):
+            _, old = self._results.popitem(last=False)
+            self._by_key.pop((old.data_hash, old.sql), None)
+            self._total_bytes -= old.nbytes + (old.table_bytes if old.table_accounted else 0)
+            old.close()
+
+    def entry(self, result_id):
+        """Renvoie l'entrée complète (et la marque comme récemment utilisée)."""
+        with self._lock:
+            try:
+                self._results.move_to_end(result_id)
+                return self._results[result_id]
+            except KeyError:
+                raise ResultNotFound(f"Résultat introuvable ou expiré : {result_id}") from None
+
+    def table(self, result_id):
+        """
+        Entrée dont la copie SQLite (tri/filtre/pagination) est prête ; la taille de
+        la copie s'ajoute au budget du stockage, ce qui peut évincer d'autres résultats.
+        """
+        entry = self.entry(result_id)
+        entry.query_table()
+        with self._lock:
+            if not entry.table_accounted and self._results.get(result_id) is entry:
+                entry.table_accounted = True
+                self._total_bytes += entry.table_bytes
+                self._evict()
+        return entry
+
+    def get(self, result_id):
+        """Renvoie le DataFrame associé à l'identifiant."""
+        return self.entry(result_id).df
+
+    def __contains__(self, result_id):
+        with self._lock:
+            return result_id in self._results
+
+    def page(self, result_id, page=0, page_size=50, sort_by=None, descending=False,
+             search=None, search_column=None):
+        """
+        Une page du résultat, triée et filtrée en SQL sur la copie en mémoire
+        (l'interface n'a jamais à manipuler le DataFrame complet).
+        
+        Args:
+            page (int): Numéro de page (0 = première)
+            sort_by (str): Colonne de tri
+            search (str): Texte recherché (LIKE, insensible à la casse)
+            search_column (str): Colonne filtrée (toutes les colonnes par défaut)
+        
+        Returns:
+            tuple: (DataFrame de la page, nombre total de lignes après filtre)
+        """
+        entry = self.table(result_id)
+        columns = entry.table_columns
+        for column in (sort_by, search_column):
+            if column is not None and column not in columns:
+                raise ValueError(f"Colonne inconnue : {column}")
+        
+        quote = lambda name: '"' + name.replace('"', '""') + '"'
+        where, params = "", []
+        if search:
+            targets = [search_column] if search_column else columns
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where = " WHERE " + " OR ".join(f"CAST({quote(c)} AS TEXT) LIKE ? ESCAPE '\\'" for c in targets)
+            params = [pattern] * len(targets)
+        order = f" ORDER BY {quote(sort_by)} {'DESC' if descending else 'ASC'}" if sort_by else ""
+        
+        with entry._table_lock:
+            conn = entry._table
+            if conn is None:
+                # Évincé entre-temps (copie fermée)
+                raise ResultNotFound(f"Résultat introuvable ou expiré : {result_id}")
+            total = conn.execute(f"SELECT COUNT(*) FROM resultat{where}", params).fetchone()[0]
+            rows = pd.read_sql_query(
+                f"SELECT * FROM resultat{where}{order} LIMIT ? OFFSET ?",
+                conn, params=params + [page_size, page * page_size]
+            )
+        return rows, total
+
+    def export(self, result_id, fmt='csv', output_dir=EXPORT_DIR):
+        """
+        Écrit le résultat sur disque (une seule fois par format) et renvoie le chemin.
+        Appelé uniquement quand l'utilisateur télécharge ou qu'un fichier est requis.
+        """
+        entry = self.entry(result_id)
+        path = entry.exports.get(fmt)
+        if path is None or not os.path.exists(path):
+            if fmt not in FORMATS:
+                raise ValueError(f"Format non supporté : {fmt}")
+            os.makedirs(output_dir, exist_ok=True)
+            # Nom dérivé du contenu : deux résultats identiques partagent le même fichier
+            path = os.path.join(output_dir, f"export_{entry.data_hash}.{FORMATS[fmt]}")
+            if not os.path.exists(path):
+                tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+                write_dataframe(entry.df, tmp, fmt)
+                os.replace(tmp, path)
+            entry.exports[fmt] = path
+            record_artifact('export', path, result_id=result_id, format=fmt)
+        return path
+
+    def export_bytes(self, result_id, fmt='csv'):
+        """Contenu de l'export (pour un bouton de téléchargement)."""
+        with open(self.export(result_id, fmt), 'rb') as f:
+            return f.read()
+
+    def stats(self):
+        with self._lock:
+            return {'results': len(self._results), 'bytes': self._total_bytes}
+
+    def clear(self):
+        with self._lock:
+            for entry in self._results.values():
+                entry.close()
+            self._results.clear()
+            self._by_key.clear()
+            self._total_bytes = 0
+
+
+_store = ResultStore()
+
+def get_result_store():
+    """Stockage partagé par les outils et l'interface du processus."""
+    return _store
@@ -0,0 +1,235 @@
+import re
+import threading
+import pandas as pd
+from db_pool import get_connection
+from query_cache import schema_fingerprint
+from query_guard import table_aliases
+from schema_service import user_tables
+
+DB_PATH = "data/boutique.db"
+
+# Texte à faible cardinalité (taille, couleur, genre...) -> category
+CATEGORY_MAX_UNIQUE = 50
+CATEGORY_MAX_RATIO = 0.5
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+
+
+def affinity(declared):
+    """Affinité SQLite d'un type déclaré (règles de https://sqlite.org/datatype3.html)."""
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "integer"
+    if any(t in declared for t in ("CHAR", "CLOB", "TEXT")):
+        return "text"
+    if not declared or "BLOB" in declared:
+        return "blob"
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+        return "real"
+    if "DATE" in declared or "TIME" in declared:
+        return "datetime"
+    return "numeric"
+
+
+_table_types = {}
+_table_types_lock = threading.Lock()
+
+def table_types(db_path=DB_PATH):
+    """
+    Affinité déclarée des colonnes de chaque table ({table: {colonne: affinité}}).
+    Recalculé uniquement quand l'empreinte du schéma change.
+    """
+    key = (db_path, schema_fingerprint(db_path))
+    with _table_types_lock:
+        if key in _table_types:
+            return _table_types[key]
+    conn = get_connection(db_path)
+    # Les index plein texte (colonnes sans type) répètent des colonnes de produits : ignorés
+    types = {
+        table: {name: affinity(declared) for _, name, declared, *_ in conn.execute(f'PRAGMA table_info("{table}")')}
+        for table, module in user_tables(conn).items() if not module
+    }
+    with _table_types_lock:
+        _table_types.clear()
+        _table_types[key] = types
+    return types
+
+
+def _strip_comments(sql):
+    return re.sub(r"--[^\n]*|/\*.*?\*/", " ", sql, flags=re.DOTALL)
+
+
+def select_items(sql_query):
+    """
+    Expressions de la liste SELECT principale (hors CTE et sous-requêtes), ou []
+    si elle est introuvable. Pour une requête composée (UNION...), la première,
+    qui donne ses noms aux colonnes.
+    """
+    sql = _strip_comments(sql_query)
+    depth = 0
+    quote = None
+    start = None
+    items = []
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`[":
+            quote = "]" if char == "[" else char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+            word = re.match(r"[A-Za-z]+", sql[i:])
+            word = word.group(0).upper() if word else ""
+            if start is None and word == "SELECT":
+                start = i + len(word)
+                i = start
+                continue
+            if start is not None and word in _SELECT_END:
+                break
+        if start is not None and depth == 0 and char == ",":
+            items.append(sql[start:i])
+            start = i + 1
+        i += 1
+    if start is None:
+        return []
+    items.append(sql[start:i])
+    items = [item.strip() for item in items]
+    if items:
+        items[0] = re.sub(r"^(?:DISTINCT|ALL)\s+", "", items[0], flags=re.IGNORECASE)
+    return items
+
+
+_SELECT_END = {"FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW"}
+_NAME = r'(?:"[^"]+"|`[^`]+`|\[[^\]]+\]|\w+)'
+_COLUMN_REF = re.compile(rf"^(?:({_NAME})\.)?({_NAME})(?:\s+(?:AS\s+)?{_NAME})?$", re.IGNORECASE)
+_STAR = re.compile(rf"^(?:({_NAME})\.)?\*$")
+
+
+def _unquote(name):
+    return name[1:-1] if name and name[0] in "\"`[" else name
+
+
+def result_column_types(sql_query, columns, db_path=DB_PATH):
+    """
+    Affinité déclarée de chaque colonne du résultat (liste alignée sur columns,
+    les noms de cursor.description), None pour une colonne calculée (agrégat,
+    expression) ou d'origine inconnue (CTE, sous-requête) : celles-là sont inférées.
+
+    Une colonne de la liste SELECT qui est une référence directe (alias.colonne
+    ou colonne) prend le type de sa table d'origine, retrouvée via les alias du
+    FROM (query_guard.table_aliases) ; « * » et « alias.* » sont résolus par nom
+    dans les tables de la requête.
+    """
+    schema = table_types(db_path)
+    aliases = {name: table for name, table in table_aliases(sql_query).items() if table in schema}
+    tables = sorted(set(aliases.values()))
+
+    def by_name(name, candidates):
+        kinds = {schema[t][name] for t in candidates if name in schema[t]}
+        return kinds.pop() if len(kinds) == 1 else None
+
+    items = select_items(sql_query)
+    stars = [_STAR.match(item) for item in items]
+    if len(items) != len(columns) or any(stars):
+        # Liste avec « * » : chaque nom est cherché dans les tables (ou la table) visées
+        targets = tables
+        qualified = [m.group(1) for m in stars if m and m.group(1)]
+        if qualified and len(qualified) == len([m for m in stars if m]):
+            targets = sorted({aliases[_unquote(q)] for q in qualified if _unquote(q) in aliases})
+        return [by_name(name, targets) for name in columns]
+
+    types = []
+    for item in items:
+        match = _COLUMN_REF.match(item)
+        kind = None
+        if match and match.group(2).upper() not in ("NULL", "TRUE", "FALSE", "CURRENT_DATE"):
+            qualifier, column = _unquote(match.group(1)), _unquote(match.group(2))
+            if qualifier:
+                table = aliases.get(qualifier)
+                kind = schema[table].get(column) if table else None
+            else:
+                kind = by_name(column, tables)
+        types.append(kind)
+    return types
+
+
+def _as_numeric(series):
+    """Conversion numérique si toutes les valeurs non nulles s'y prêtent, sinon None."""
+    converted = pd.to_numeric(series, errors='coerce')
+    if converted.notna().sum() != series.notna().sum():
+        return None
+    return converted
+
+
+def _as_datetime(series):
+    sample = series.dropna().head(50).astype(str)
+    if sample.empty or not sample.str.match(_ISO_DATE).all():
+        return None
+    converted = pd.to_datetime(series, errors='coerce', format='ISO8601')
+    if converted.notna().sum() != series.notna().sum():
+        return None
+    return converted
+
+
+def _as_category(series):
+    n = series.notna().sum()
+    unique = series.nunique(dropna=True)
+    if n and unique <= CATEGORY_MAX_UNIQUE and unique / n <= CATEGORY_MAX_RATIO:
+        return series.astype('category')
+    return None
+
+
+def coerce_types(df, declared=None, sql_query=None, db_path=DB_PATH):
+    """
+    Type les colonnes d'un résultat de requête, de façon vectorisée (une opération
+    pandas par colonne) :
+    - colonnes issues d'une colonne TEXT d'une table : category si faible
+      cardinalité (les tailles « 42 » restent du texte)
+    - colonnes calculées ou d'origine inconnue : numérique, puis date ISO, puis category
+
+    Args:
+        df (pd.DataFrame): Résultat brut
+        declared (list): affinité de chaque colonne, None si inconnue
+            (result_column_types(sql_query, df.columns) par défaut)
+        sql_query (str): requête qui a produit df ; sans elle, tout est inféré
+        db_path (str): base interrogée (schéma des tables d'origine)
+
+    Returns:
+        pd.DataFrame: nouveau DataFrame typé (attrs conservés)
+    """
+    if df.empty:
+        return df
+    if declared is None:
+        declared = []
+        if sql_query:
+            try:
+                declared = result_column_types(sql_query, list(df.columns), db_path)
+            except Exception:
+                # Base indisponible : on se contente de l'inférence
+                declared = []
+    columns = {}
+    for i, name in enumerate(df.columns):
+        series = df.iloc[:, i]
+        kind = declared[i] if i < len(declared) else None
+        converted = None
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if kind == "text":
+                converted = _as_category(series)
+            elif kind == "datetime":
+                converted = _as_datetime(series)
+            else:
+                converted = _as_numeric(series)
+                if converted is None:
+                    converted = _as_datetime(series)
+                if converted is None:
+                    converted = _as_category(series)
+        columns[i] = series if converted is None else converted
+
+    typed = pd.concat(columns, axis=1)
+    typed.columns = df.columns
+    typed.attrs = dict(df.attrs)
+    return typed
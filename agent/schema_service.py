@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+from db_pool import get_connection
+from query_cache import normalize_question, schema_fingerprint
+
+DB_PATH = "data/boutique.db"
+
+# Valeurs d'exemple pour les colonnes texte à faible cardinalité (taille, couleur, genre...)
+SAMPLE_MAX_DISTINCT = int(os.getenv("SCHEMA_SAMPLE_MAX_DISTINCT", 12))
+SAMPLE_SCAN_ROWS = 100_000       # lignes lues au plus par colonne pour l'échantillon
+SAMPLE_MAX_LENGTH = 40
+# Au-delà de ce nombre de tables, seules les tables liées à la question sont envoyées
+SCHEMA_MAX_TABLES = int(os.getenv("SCHEMA_MAX_TABLES", 8))
+
+
+_VIRTUAL = re.compile(r"\s*CREATE\s+VIRTUAL\s+TABLE\s+.*?\bUSING\s+(\w+)", re.IGNORECASE | re.DOTALL)
+_DESCRIPTION = re.compile(r"\s*CREATE\s+TABLE[^(]*\(\s*--\s*([^\n]+)", re.IGNORECASE)
+_CONTENT = re.compile(r"\bcontent\s*=\s*['\"]?(\w+)", re.IGNORECASE)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _distinct_sample(conn, table, column, lookup=False):
+    """
+    Valeurs distinctes de la colonne, ou None si elle en a trop pour servir d'exemple
+    ou si chaque valeur est unique (références, descriptions...) - sauf dans une
+    table de référence (lookup), où les noms uniques sont justement utiles.
+    """
+    scanned = f"(SELECT {_quote(column)} AS v FROM {_quote(table)} WHERE v IS NOT NULL LIMIT {SAMPLE_SCAN_ROWS})"
+    rows = conn.execute(f"SELECT DISTINCT v FROM {scanned} LIMIT ?", (SAMPLE_MAX_DISTINCT + 1,)).fetchall()
+    if not rows or len(rows) > SAMPLE_MAX_DISTINCT:
+        return None
+    values = sorted(str(r[0]) for r in rows)
+    if any(len(v) > SAMPLE_MAX_LENGTH for v in values):
+        return None
+    if not lookup and conn.execute(f"SELECT COUNT(*) FROM {scanned}").fetchone()[0] <= len(values):
+        return None
+    return values
+
+
+def user_tables(conn):
+    """
+    Tables et vues de l'utilisateur : {nom: module} où module vaut 'fts5' pour
+    une table virtuelle, None sinon. Les tables internes de SQLite et celles
+    d'une table virtuelle (produits_fts_data, _idx...) sont exclues.
+    """
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view') "
+        "AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    modules = {}
+    for name, sql in rows:
+        match = _VIRTUAL.match(sql or "")
+        modules[name] = match.group(1).lower() if match else None
+    virtual = [name for name, module in modules.items() if module]
+    return {
+        name: module for name, module in modules.items()
+        if module or not any(name.startswith(f"{v}_") for v in virtual)
+    }
+
+
+def introspect(db_path=DB_PATH):
+    """
+    Lit le schéma réel de la base : tables, colonnes (type, clé primaire, NOT NULL),
+    clés étrangères et valeurs d'exemple des colonnes texte à faible cardinalité.
+
+    Returns:
+        dict: {table: {'columns': [...], 'foreign_keys': [...], 'virtual': module, 'content': table source}}
+    """
+    conn = get_connection(db_path)
+    modules = user_tables(conn)
+    tables = list(modules)
+    foreign_keys = {
+        table: [
+            {'column': fk[3], 'table': fk[2], 'to': fk[4]}
+            for fk in conn.execute(f"PRAGMA foreign_key_list({_quote(table)})")
+        ]
+        for table in tables
+    }
+    # Tables de référence : référencées par une clé étrangère sans en avoir elles-mêmes (categories, marques...)
+    lookups = {fk['table'] for fks in foreign_keys.values() for fk in fks} - {t for t in tables if foreign_keys[t]}
+    schema = {}
+    for table in tables:
+        columns = []
+        for _, name, declared, notnull, _, pk in conn.execute(f"PRAGMA table_info({_quote(table)})"):
+            column = {'name': name, 'type': declared or '', 'pk': bool(pk), 'notnull': bool(notnull)}
+            if not modules[table] and not pk and any(t in column['type'].upper() for t in ('CHAR', 'CLOB', 'TEXT')):
+                column['values'] = _distinct_sample(conn, table, name, table in lookups)
+            columns.append(column)
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone()[0] or ""
+        # Commentaire de tête du CREATE TABLE : description de la table (ex. agrégats pré-calculés)
+        description = _DESCRIPTION.match(sql)
+        schema[table] = {'columns': columns, 'foreign_keys': foreign_keys[table], 'virtual': modules[table],
+                         'description': description.group(1).strip() if description else None}
+        if modules[table]:
+            content = _CONTENT.search(sql)
+            schema[table]['content'] = content.group(1) if content else None
+    return schema
+
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+def get_schema(db_path=DB_PATH):
+    """Schéma introspecté, mis en cache sur l'empreinte du schéma (sqlite_master)."""
+    key = (db_path, schema_fingerprint(db_path))
+    with _schemas_lock:
+        schema = _schemas.get(key)
+    if schema is None:
+        schema = introspect(db_path)
+        with _schemas_lock:
+            _schemas.clear()
+            _schemas[key] = schema
+    return schema
+
+
+def relevant_tables(schema, question, max_tables=SCHEMA_MAX_TABLES):
+    """
+    Tables utiles pour la question : celles dont le nom, les colonnes ou les valeurs
+    d'exemple apparaissent dans la question, plus les tables qu'elles référencent
+    (pour les JOINs). Tout le schéma si il est petit ou si rien ne correspond.
+    """
+    if len(schema) <= max_tables or not question:
+        return list(schema)
+    words = set(normalize_question(question).split())
+
+    def score(table):
+        terms = {table} | {c['name'] for c in schema[table]['columns']}
+        terms |= {v for c in schema[table]['columns'] for v in (c.get('values') or [])}
+        tokens = set()
+        for term in terms:
+            tokens |= set(normalize_question(term).replace('_', ' ').split())
+        # « produits » / « produit » : on compare aussi sans le s final
+        tokens |= {t.rstrip('s') for t in tokens}
+        return len(words & tokens) + len({w.rstrip('s') for w in words} & tokens)
+
+    scores = {table: score(table) for table in schema}
+    selected = [t for t in sorted(schema, key=lambda t: -scores[t]) if scores[t] > 0][:max_tables]
+    if not selected:
+        return list(schema)
+    for table in list(selected):
+        for fk in schema[table]['foreign_keys']:
+            if fk['table'] in schema and fk['table'] not in selected:
+                selected.append(fk['table'])
+    # Index plein texte d'une table retenue
+    selected += [t for t in schema if schema[t].get('content') in selected and t not in selected]
+    return [t for t in schema if t in selected]
+
+
+def build_schema_context(question=None, db_path=DB_PATH):
+    """
+    Description compacte du schéma pour le prompt, une ligne par table (suivie
+    de sa description si le CREATE TABLE commence par un commentaire) :
+        produits(id INTEGER PK, genre TEXT [Femme|Homme|Unisexe], marque_id INTEGER -> marques.id, ...)
+    suivie du mode d'emploi des index plein texte (MATCH) s'il y en a.
+    """
+    schema = get_schema(db_path)
+    lines = []
+    text_indexes = []
+    for table in relevant_tables(schema, question):
+        if schema[table].get('virtual') == 'fts5':
+            text_indexes.append(table)
+            columns = ", ".join(c['name'] for c in schema[table]['columns'])
+            source = schema[table].get('content')
+            target = f" : index plein texte de {source} (rowid = {source}.id)" if source else " : index plein texte"
+            lines.append(f"{table}({columns}){target}")
+            continue
+        foreign = {fk['column']: f"{fk['table']}.{fk['to'] or 'id'}" for fk in schema[table]['foreign_keys']}
+        parts = []
+        for column in schema[table]['columns']:
+            part = f"{column['name']} {column['type']}".strip()
+            if column['pk']:
+                part += " PK"
+            if column['name'] in foreign:
+                part += f" -> {foreign[column['name']]}"
+            if column.get('values'):
+                part += f" [{'|'.join(column['values'])}]"
+            parts.append(part)
+        line = f"{table}({', '.join(parts)})"
+        if schema[table].get('description'):
+            line += f" -- {schema[table]['description']}"
+        lines.append(line)
+    for table in text_indexes:
+        source = schema[table].get('content') or table
+        names = [c['name'] for c in schema[table]['columns']]
+        column = 'composition' if 'composition' in names else names[0]
+        lines.append(
+            f"Recherche de mots dans les colonnes de {table} : utilise MATCH (insensible à la casse "
+            f"et aux accents, rapide) et jamais LIKE '%...%', ex. "
+            f"{source}.id IN (SELECT rowid FROM {table} WHERE {table} MATCH '{column}:coton') "
+            f"ou {table} MATCH 'merinos' pour toutes les colonnes."
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    print(build_schema_context(" ".join(sys.argv[1:]) or None))
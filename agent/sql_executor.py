@@ -1,68 +1,265 @@
-import sqlite3
+import asyncio
 import pandas as pd
 import os
-from datetime import datetime
+from contextlib import closing
 from langchain_core.tools import tool  
-from langchain_core.prompts import ChatPromptTemplate
+from db_pool import get_connection
+from query_guard import check_query, statement_timeout
+from result_io import FORMATS, BatchWriter, preferred_format, write_dataframe
+from result_store import get_result_store
+from result_types import coerce_types
+from tool_results import QueryResult, publish
+from artifact_store import adopt_file, hash_dataframe, hash_file, record_artifact, temp_path
+DB_PATH = "data/boutique.db"
+EXPORT_DIR = "exports"
+
+# Lecture par lots : la mémoire reste bornée quelle que soit la taille du résultat
+BATCH_SIZE = int(os.getenv("SQL_BATCH_SIZE", 5000))
+MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", 1_000_000))                     # plafond de lignes
+MAX_EXPORT_BYTES = int(os.getenv("SQL_MAX_EXPORT_BYTES", 200 * 1024 * 1024))  # plafond du fichier (200 Mo)
+# Résultat gardé en mémoire (pipeline, result_store) : plafonds plus bas que l'export disque
+MAX_MEMORY_ROWS = int(os.getenv("SQL_MAX_MEMORY_ROWS", 200_000))
+MAX_MEMORY_BYTES = int(os.getenv("SQL_MAX_MEMORY_BYTES", 128 * 1024 * 1024))  # 128 Mo
+PREVIEW_ROWS = 5
+
+def _fetch_batches(sql_query, batch_size=BATCH_SIZE, max_rows=MAX_ROWS):
+    """
+    Exécute la requête et produit les lignes par lots (cursor.fetchmany).
+    La requête passe d'abord par le garde-fou (query_guard) : plan estimé trop
+    coûteux refusé, LIMIT ajouté, exécution interrompue après SQL_TIMEOUT_SECONDS.
+    
+    Yields:
+        tuple: (description, rows, truncated) - description est cursor.description
+        (noms des colonnes du résultat), truncated vaut True sur le dernier lot
+        si le plafond de lignes a été atteint
+    
+    Raises:
+        QueryRejected: requête refusée ou interrompue (message avec le plan d'exécution)
+    """
+    conn = get_connection(DB_PATH)
+    # LIMIT max_rows + 1 : le dépassement du plafond reste détectable
+    sql_query, plan, _ = check_query(conn, sql_query, max_rows + 1 if max_rows else None)
+    with statement_timeout(conn, plan=plan) as timed:
+        cursor = timed(conn.execute, sql_query)
+        try:
+            if cursor.description is None:
+                raise ValueError("La requête ne renvoie aucune colonne (seules les requêtes SELECT sont acceptées).")
+            description = cursor.description
+            row_count = 0
+            while True:
+                rows = timed(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                truncated = False
+                if max_rows and row_count + len(rows) > max_rows:
+                    rows = rows[:max_rows - row_count]
+                    truncated = True
+                elif max_rows and row_count + len(rows) == max_rows:
+                    # Plafond atteint pile : tronqué seulement s'il reste des lignes
+                    truncated = timed(cursor.fetchone) is not None
+                row_count += len(rows)
+                yield description, rows, truncated
+                if truncated:
+                    break
+            if row_count == 0:
+                yield description, [], False
+        finally:
+            cursor.close()
+
+def _column_names(description):
+    return [d[0] for d in description]
+
+def run_sql_query(sql_query, max_rows=MAX_MEMORY_ROWS, max_bytes=MAX_MEMORY_BYTES):
+    """
+    Exécute une requête SQL sur la base de la boutique et renvoie un DataFrame pandas.
+    Le résultat est lu par lots et plafonné à max_rows lignes et à max_bytes
+    octets en mémoire, comptés au fil des lots (df.attrs['truncated'] indique si
+    un plafond a été atteint ; l'export disque en streaming n'a pas ces plafonds),
+    puis typé d'après le schéma (nombres, dates, category pour le texte répétitif).
+    """
+    columns = []
+    chunks = []
+    truncated = False
+    size = 0
+    with closing(_fetch_batches(sql_query, max_rows=max_rows)) as batches:
+        for description, rows, truncated in batches:
+            columns = _column_names(description)
+            if not rows:
+                continue
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            chunks.append(chunk)
+            size += int(chunk.memory_usage(index=False, deep=True).sum())
+            # Plafond en octets : on s'arrête au lot qui le dépasse (pic mémoire borné à ~2 x max_bytes)
+            if max_bytes and size >= max_bytes:
+                truncated = True
+                break
+    
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    del chunks
+    df.attrs['truncated'] = truncated
+    # Types déclarés des colonnes issues directement d'une table, inférence pour les colonnes calculées
+    return coerce_types(df, sql_query=sql_query, db_path=DB_PATH)
+
+async def arun_sql_query(sql_query, max_rows=MAX_MEMORY_ROWS, max_bytes=MAX_MEMORY_BYTES):
+    """Version asynchrone de run_sql_query : la lecture SQLite se fait dans un thread de l'executor."""
+    return await asyncio.to_thread(run_sql_query, sql_query, max_rows, max_bytes)
+
+def _export_formats(output_format):
+    """
+    Formats à écrire : le format demandé ('auto' = binaire le plus rapide disponible)
+    en premier, puis le CSV, conservé comme fichier de téléchargement.
+    """
+    fmt = output_format.lower()
+    if fmt == 'auto':
+        fmt = preferred_format()
+    if fmt not in FORMATS:
+        raise ValueError(f"Format non supporté : {output_format} (formats : auto, {', '.join(FORMATS)})")
+    return [fmt] if fmt == 'csv' else [fmt, 'csv']
+
+def export_dataframe(df, output_format='auto', output_dir=EXPORT_DIR):
+    """
+    Exporte un DataFrame dans le dossier d'export.
+    
+    Returns:
+        dict: {format: chemin} - le premier format est celui à relire, 'csv' sert au téléchargement
+    """
+    # Nom dérivé du contenu (export_<hash>) : pas de collision entre utilisateurs,
+    # et un résultat identique n'est écrit qu'une fois
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, f"export_{hash_dataframe(df)}")
+    paths = {}
+    for fmt in _export_formats(output_format):
+        path = f"{stem}.{FORMATS[fmt]}"
+        if not os.path.exists(path):
+            tmp = temp_path(output_dir, FORMATS[fmt])
+            write_dataframe(df, tmp, fmt)
+            os.replace(tmp, path)
+        paths[fmt] = path
+        record_artifact('export', path, format=fmt)
+    return paths
+
+def stream_query_export(sql_query, output_format='auto', output_dir=EXPORT_DIR,
+                        batch_size=BATCH_SIZE, max_rows=MAX_ROWS, max_bytes=MAX_EXPORT_BYTES):
+    """
+    Exécute la requête en streaming : chaque lot de lignes est écrit dans les
+    fichiers d'export (binaire + CSV) dès sa lecture, sans jamais charger le
+    résultat complet en mémoire. row_count et data_preview sont construits au fil de l'eau.
+    
+    Returns:
+        QueryResult: mêmes informations que build_result_info
+    """
+    # Écriture sous un nom temporaire unique, renommé ensuite d'après le contenu
+    writers = [BatchWriter(temp_path(output_dir, FORMATS[fmt]), fmt) for fmt in _export_formats(output_format)]
+    columns = []
+    preview = []
+    row_count = 0
+    truncated = False
+    
+    try:
+        for description, rows, truncated in _fetch_batches(sql_query, batch_size, max_rows):
+            columns = _column_names(description)
+            for writer in writers:
+                writer.write(columns, rows)
+            if len(preview) < PREVIEW_ROWS:
+                preview.extend(dict(zip(columns, row)) for row in rows[:PREVIEW_ROWS - len(preview)])
+            row_count += len(rows)
+            # Plafond en octets (mesuré sur le CSV) : on s'arrête au lot qui le dépasse
+            if max_bytes and writers[-1].bytes_written >= max_bytes:
+                truncated = True
+                break
+    except Exception:
+        for writer in writers:
+            writer.abort()
+        raise
+    for writer in writers:
+        writer.close()
+    
+    # Un format binaire incompatible avec les données est abandonné au profit du CSV.
+    # Tous les formats partagent l'empreinte du CSV pour rester « frères » (même nom).
+    content_hash = hash_file(writers[-1].filepath)
+    paths = {}
+    for writer in writers:
+        if not writer.failed:
+            ext = FORMATS[writer.fmt]
+            paths[writer.fmt] = adopt_file(writer.filepath, output_dir, 'export', ext, content_hash)
+            record_artifact('export', paths[writer.fmt], format=writer.fmt)
+    return _result_info(paths, row_count, columns, preview, truncated, sql_query=sql_query)
+
+def _result_info(paths, row_count, columns, preview, truncated, result_id=None, sql_query=None):
+    return QueryResult(
+        success=True,
+        sql=sql_query,
+        result_id=result_id,
+        filepath=next(iter(paths.values()), None),
+        format=next(iter(paths), None),
+        csv_path=paths.get('csv'),
+        row_count=row_count,
+        columns=columns,
+        data_preview=preview,
+        truncated=truncated
+    )
+
+def build_result_info(df, paths=None, result_id=None, sql_query=None):
+    """Résultat structuré (QueryResult) décrivant un DataFrame exécuté."""
+    return _result_info(
+        paths or {},
+        len(df),
+        list(df.columns),
+        df.head(PREVIEW_ROWS).to_dict('records'),
+        df.attrs.get('truncated', False),
+        result_id,
+        sql_query
+    )
+
+def execute_to_store(sql_query):
+    """
+    Exécute la requête et garde le DataFrame en mémoire (result_store) :
+    aucun fichier n'est écrit tant que l'utilisateur ne télécharge pas.
+    
+    Returns:
+        tuple: (result_id, df)
+    """
+    df = run_sql_query(sql_query)
+    result_id = get_result_store().put(df, sql_query)
+    record_artifact('result', result_id=result_id, sql=sql_query, row_count=len(df))
+    return result_id, df
+
 @tool
-def execute_and_export_sql( sql_query, output_format='csv')->str:
+def execute_and_export_sql( sql_query, export=False, output_format='auto')->str:
     """
-    Exécute une requête SQL et exporte les résultats en CSV 
+    Exécute une requête SQL. Par défaut le résultat est gardé en mémoire et
+    identifié par un 'result_id' à passer à generate_visualization.
     
     Args:
         
         sql_query (str): Requête SQL à exécuter
-        output_format (str): 'csv' 
-        output_dir (str): Dossier où sauvegarder les exports dans mon projet dans le dossier exports
+        export (bool): True = export disque en streaming (très gros résultats) au lieu du stockage mémoire
+        output_format (str): pour l'export disque : 'auto' (Feather si disponible), 'feather', 'arrow', 'parquet' ou 'csv'.
+            Un CSV est toujours produit pour le téléchargement.
     
     Returns:
-        str: Informations sur l'export
+        str: Résumé JSON compact (result_id, row_count, columns, aperçu ; filepath en cas d'export disque)
     """
-    output_dir="exports"
-    # Créer le dossier d'export s'il n'existe pas
-    os.makedirs(output_dir, exist_ok=True)
-    
     try:
-        # Connexion à la base de données
-        conn = sqlite3.connect("data/boutique.db")
-        
-        # Exécution de la requête et chargement dans un DataFrame pandas
-        df = pd.read_sql_query(sql_query, conn)
-        
-        # Fermeture de la connexion
-        conn.close()
-        
-        # Génération du nom de fichier avec timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        if output_format.lower() == 'csv':
-            # Export en CSV (option recommandée)
-            filename = f"export_{timestamp}.csv"
-            filepath = os.path.join(output_dir, filename)
-            df.to_csv(filepath, index=False, encoding='utf-8')
-              
+        if export:
+            result_info = stream_query_export(sql_query, output_format)
         else:
-            raise ValueError("Format non supporté. ")
-        
-        # Retourner les informations de l'export
-        result_info = {
-            'success': True,
-            'filepath': filepath,
-            'filename': filename,
-            'row_count': len(df),
-            'columns': list(df.columns),
-            'data_preview': df.head().to_dict('records')
-        }
-        
-        return f"details {result_info}"
+            result_id, df = execute_to_store(sql_query)
+            
+            # Retourner les informations du résultat
+            result_info = build_result_info(df, result_id=result_id, sql_query=sql_query)
         
     except Exception as e:
-        # 1. On crée le dictionnaire d'erreur proprement
-        error_data = {
-            'success': False,
-            'error': str(e)
-        }
-        
-        # 2. On le renvoie sous forme de chaîne (str)
-        return f"Erreur : {error_data}"
+        # On crée le résultat d'erreur proprement
+        result_info = QueryResult(success=False, sql=sql_query, error=str(e))
+    
+    # L'interface reçoit l'objet complet, le LLM un résumé JSON compact
+    return publish(result_info).to_agent_json()
+
+
+async def _aexecute_and_export_sql(sql_query, export=False, output_format='auto'):
+    # SQLite est synchrone : l'exécution part dans un thread (le contexte, donc la session, suit)
+    return await asyncio.to_thread(execute_and_export_sql.func, sql_query, export, output_format)
 
+# Variante asynchrone utilisée par agent.ainvoke
+execute_and_export_sql.coroutine = _aexecute_and_export_sql
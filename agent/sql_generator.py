@@ -1,36 +1,34 @@
-import os
+import re
+import json
+import asyncio
 from dotenv import load_dotenv  
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool  
-from langchain_core.prompts import ChatPromptTemplate
+from query_cache import get_query_cache
+from index_advisor import log_sql
+from llm_registry import get_llm
+from schema_service import build_schema_context
+from tool_results import SqlSpec, message_text, publish
 
 # 1. On charge les variables du fichier .env
 load_dotenv()
-@tool
-def generate_sql_query(query_text):
-    """Demande à Gemini de traduire le texte en SQL pour la boutique et le type ideal du visuel."""
-    
-    # On utilise 'gemini-1.5-flash' car il est rapide, pas cher et excellent en SQL
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
-    
-    # On décrit précisément le schéma relationnel à l'IA
-    schema_context = """
-    Tables disponibles :
-    1. categories (id, nom_categorie)
-    2. marques (id, nom_marque, pays)
-    3. produits (id, reference_interne, nom_modele, description, matiere_principale, composition, prix_public, genre, categorie_id, marque_id)
-    4. stocks (id, produit_id, taille, couleur, quantite_disponible, emplacement_entrepot)
 
-    Relations (Foreign Keys) :
-    - produits.categorie_id -> categories.id
-    - produits.marque_id -> marques.id
-    - stocks.produit_id -> produits.id
-    """
+def build_sql_prompt(query_text, feedback=None):
+    """Construit le prompt envoyé à Gemini pour une question (et un éventuel retour d'erreur)."""
+    
+    # Schéma lu dans la base (tables liées à la question seulement si le schéma est grand)
+    schema_context = build_schema_context(query_text)
+    
+    # Consigne sur les agrégats seulement s'ils figurent dans le schéma (bases créées par init_db.py)
+    aggregate_rule = ""
+    if "Agrégat pré-calculé" in schema_context:
+        aggregate_rule = ("\n    - Si une table « Agrégat pré-calculé » répond à la question (stock par marque, par catégorie, "
+                          "par taille, couleurs ou tailles d'un produit), utilise-la plutôt que d'agréger stocks.")
     
     prompt = f"""
     Tu es un expert SQL spécialisé dans SQLite.
     
-    Voici le schéma de la base de données d'une boutique de vêtements :
+    Voici le schéma de la base de données d'une boutique de vêtements
+    (table(colonne TYPE, PK = clé primaire, -> = clé étrangère, [valeurs possibles]) :
     {schema_context}
     
     Tâche : Écris une requête SQL SQLite valide pour répondre à la demande suivante : "{query_text}".
@@ -39,7 +37,7 @@ def generate_sql_query(query_text):
     - utilise (DISTINCT, GROUP BY, HAVING, ORDER BY, LIMIT, JOIN,SUM, COUNT, AVG, MIN, MAX, etc) si nécessaire.
     - Applique les filtres implicites (taille, marque, couleur) si mentionnés dans la question.
     - Si la demande fait référence à une catégorie de produit (ex : "Pull", "Chaussure"), utilise la table categories et fais le JOIN approprié avec produits.
-    - Utilise des JOINs si les informations sont dans plusieurs tables (ex: nom du produit + quantité en stock).
+    - Utilise des JOINs si les informations sont dans plusieurs tables (ex: nom du produit + quantité en stock).{aggregate_rule}
     - ajoute des alias clairs pour les colonnes calculées (ex : total_stock, average_price).
     - Ne fais PAS de requêtes de modification de données (INSERT, UPDATE, DELETE).
     - Renvoie comme reponse UNIQUEMENT  un JSON valide suivant ce format exact (sans markdown) :
@@ -49,12 +47,141 @@ def generate_sql_query(query_text):
     }}
     """
     
-    response = llm.invoke(prompt)
+    # Seconde tentative : on renvoie à l'IA la requête précédente et l'erreur obtenue
+    if feedback:
+        prompt += f"""
+    Attention : une tentative précédente a échoué. Corrige-la en tenant compte de ce retour :
+    {feedback}
+    """
+    
+    return prompt
+
+def _clean_response(content):
+    """Nettoyage de sécurité : on retire les balises markdown si l'IA en met quand même"""
+    # Gemini peut renvoyer une liste de blocs [{'type': 'text', 'text': ...}]
+    content = message_text(content)
+    return content.replace("```json", "").replace("```sql", "").replace("```", "").strip()
+
+def parse_sql_response(content):
+    """
+    Transforme la réponse brute du modèle en dictionnaire {"sql", "viz_type"}.
+    
+    Raises:
+        ValueError: si la réponse ne contient pas de JSON exploitable
+    """
+    text = _clean_response(content)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # L'IA ajoute parfois une phrase autour du JSON : on isole le premier objet
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            raise ValueError(f"Réponse du modèle non exploitable : {text[:200]}")
+        data = json.loads(match.group(0))
+    
+    if not isinstance(data, dict) or not data.get("sql"):
+        raise ValueError(f"Le JSON renvoyé ne contient pas de clé 'sql' : {text[:200]}")
+    
+    return {
+        "sql": data["sql"].strip(),
+        "viz_type": data.get("viz_type") or "tableau",
+    }
+
+def _cached_spec(query_text, feedback=None):
+    # Pas de lecture du cache en réparation : la réponse corrigée remplacera l'entrée fautive
+    cache = get_query_cache()
+    if cache is None or feedback is not None:
+        return None
+    spec = cache.get(query_text)
+    if spec is not None:
+        log_sql(spec["sql"])
+    return spec
+
+def _store_spec(query_text, spec):
+    # Journal de la charge SQL, rejouée par le conseiller d'index
+    log_sql(spec["sql"])
+    cache = get_query_cache()
+    if cache is not None:
+        cache.put(query_text, spec)
+    return spec
+
+def generate_sql_spec(query_text, feedback=None):
+    """
+    Appelle Gemini une seule fois et renvoie le couple {"sql", "viz_type"} déjà parsé.
+    Utilisé par le pipeline déterministe (orchestrator.run_pipeline).
+    Les questions déjà posées sont servies par le cache, sauf en cas de réparation
+    (feedback) où la réponse corrigée remplace l'entrée fautive.
+    """
+    cached = _cached_spec(query_text, feedback)
+    if cached is not None:
+        return cached
+    
+    llm = get_llm()
+    response = llm.invoke(build_sql_prompt(query_text, feedback))
+    return _store_spec(query_text, parse_sql_response(response.content))
+
+async def agenerate_sql_spec(query_text, feedback=None):
+    """
+    Version asynchrone de generate_sql_spec (orchestrator.arun_pipeline) :
+    l'appel Gemini passe par ainvoke, le cache SQLite par un thread de l'executor.
+    """
+    cached = await asyncio.to_thread(_cached_spec, query_text, feedback)
+    if cached is not None:
+        return cached
     
-    # Nettoyage de sécurité : on retire les balises markdown si l'IA en met quand même
-    clean_sql = response.content.replace("```sql", "").replace("```", "").strip()
+    # Introspection du schéma (SQLite) dans un thread : la boucle d'événements reste libre
+    prompt = await asyncio.to_thread(build_sql_prompt, query_text, feedback)
+    response = await get_llm().ainvoke(prompt)
+    spec = parse_sql_response(response.content)
+    return await asyncio.to_thread(_store_spec, query_text, spec)
+
+def _tool_output(query_text, content):
+    """Résultat de l'outil generate_sql_query à partir de la réponse brute du modèle."""
+    clean_sql = _clean_response(content)
+    try:
+        spec = parse_sql_response(clean_sql)
+    except ValueError:
+        # Réponse hors format : on la renvoie telle quelle à l'agent
+        return clean_sql
     
-    return clean_sql
+    # On ne met en cache que les réponses au bon format
+    _store_spec(query_text, spec)
+    return publish(SqlSpec(spec["sql"], spec["viz_type"])).to_agent_json()
+
+def _cached_tool_output(query_text, feedback=None):
+    cached = _cached_spec(query_text, feedback)
+    if cached is None:
+        return None
+    return publish(SqlSpec(cached["sql"], cached["viz_type"], cached=True)).to_agent_json()
+
+@tool
+def generate_sql_query(query_text, feedback=None):
+    """
+    Demande à Gemini de traduire le texte en SQL pour la boutique et le type ideal du visuel.
+    feedback : requête précédente et erreur reçue (refus du plan d'exécution, erreur SQLite) pour une réécriture.
+    """
+    
+    cached = _cached_tool_output(query_text, feedback)
+    if cached is not None:
+        return cached
+    
+    # Client partagé (gemini-2.5-flash par défaut : rapide, pas cher et excellent en SQL)
+    llm = get_llm()
+    
+    response = llm.invoke(build_sql_prompt(query_text, feedback))
+    return _tool_output(query_text, response.content)
+
+async def _agenerate_sql_query(query_text, feedback=None):
+    cached = await asyncio.to_thread(_cached_tool_output, query_text, feedback)
+    if cached is not None:
+        return cached
+    
+    prompt = await asyncio.to_thread(build_sql_prompt, query_text, feedback)
+    response = await get_llm().ainvoke(prompt)
+    return await asyncio.to_thread(_tool_output, query_text, response.content)
+
+# Variante asynchrone utilisée par agent.ainvoke (pas de thread bloqué pendant l'appel Gemini)
+generate_sql_query.coroutine = _agenerate_sql_query
 
 # --- Exemple d'utilisation pour tester ---
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+Agrégats de stock pré-calculés, tenus à jour par triggers.
+
+    python stock_aggregates.py              # crée les tables et triggers s'ils n'existent pas
+    python stock_aggregates.py --rebuild    # recalcule tout depuis stocks / produits
+    python stock_aggregates.py --check      # compare avec un recalcul complet
+
+Les questions fréquentes (stock par marque, par catégorie, répartition des
+tailles, couleurs et tailles distinctes d'un produit) lisent quelques lignes
+de ces tables au lieu d'agréger stocks joint à produits. Chaque INSERT / UPDATE /
+DELETE sur stocks (et le changement de marque ou de catégorie d'un produit)
+ajuste les compteurs concernés : aucun recalcul complet après la création.
+"""
+import sys
+import sqlite3
+
+DB_PATH = "data/boutique.db"
+
+# table -> (colonnes clés, description lue par le générateur SQL via le schéma)
+AGGREGATES = {
+    'agg_stock_marque': (('marque_id',), "stock total par marque"),
+    'agg_stock_categorie': (('categorie_id',), "stock total par catégorie"),
+    'agg_stock_taille': (('taille',), "stock total par taille (répartition des tailles)"),
+    'agg_stock_produit': (('produit_id',), "stock total, nombre de couleurs et de tailles distinctes par produit"),
+    'agg_produit_couleurs': (('produit_id', 'couleur'), "couleurs disponibles de chaque produit"),
+    'agg_produit_tailles': (('produit_id', 'taille'), "tailles disponibles de chaque produit"),
+}
+# Clés lues dans produits : une variante de stock est rattachée à la marque / catégorie de son produit
+_VIA_PRODUIT = {'marque_id', 'categorie_id'}
+_KEY_TYPES = {'taille': 'TEXT', 'couleur': 'TEXT'}
+# Clés étrangères déclarées : le schéma envoyé au LLM montre les jointures possibles
+_REFERENCES = {'marque_id': 'marques', 'categorie_id': 'categories', 'produit_id': 'produits'}
+
+
+def _create_tables():
+    statements = []
+    for table, (keys, description) in AGGREGATES.items():
+        extra = ",\n    nb_couleurs INTEGER NOT NULL DEFAULT 0,\n    nb_tailles INTEGER NOT NULL DEFAULT 0" \
+            if table == 'agg_stock_produit' else ""
+        columns = ",\n    ".join(f"{k} {_KEY_TYPES.get(k, 'INTEGER')} NOT NULL" for k in keys)
+        references = "".join(
+            f",\n    FOREIGN KEY ({k}) REFERENCES {_REFERENCES[k]}(id)" for k in keys if k in _REFERENCES
+        )
+        # Le commentaire de tête est repris dans le schéma envoyé au LLM (schema_service)
+        statements.append(f"""CREATE TABLE IF NOT EXISTS {table} ( -- Agrégat pré-calculé : {description}
+    {columns},
+    nb_variantes INTEGER NOT NULL DEFAULT 0,
+    quantite_totale INTEGER NOT NULL DEFAULT 0{extra},
+    PRIMARY KEY ({', '.join(keys)}){references}
+) WITHOUT ROWID;""")
+    return "\n".join(statements)
+
+
+def _adjust(table, ref, sign):
+    """
+    Ajoute (sign=1) ou retire (sign=-1) une variante de stock `ref` ('new' / 'old')
+    au compteur de la table, puis supprime la ligne si elle ne compte plus aucune variante.
+    """
+    keys = AGGREGATES[table][0]
+    quantity = f"COALESCE({ref}.quantite_disponible, 0)"
+    if keys[0] in _VIA_PRODUIT:
+        column = keys[0]
+        source = f"SELECT p.{column}, {sign}, {sign} * {quantity} FROM produits p " \
+                 f"WHERE p.id = {ref}.produit_id AND p.{column} IS NOT NULL"
+        match = f"{keys[0]} IN (SELECT {column} FROM produits WHERE id = {ref}.produit_id)"
+    else:
+        values = ", ".join(f"{ref}.{k}" for k in keys)
+        not_null = " AND ".join(f"{ref}.{k} IS NOT NULL" for k in keys)
+        source = f"SELECT {values}, {sign}, {sign} * {quantity} WHERE {not_null}"
+        match = " AND ".join(f"{k} = {ref}.{k}" for k in keys)
+    return f"""
+            INSERT INTO {table} ({', '.join(keys)}, nb_variantes, quantite_totale)
+            {source}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                nb_variantes = nb_variantes + excluded.nb_variantes,
+                quantite_totale = quantite_totale + excluded.quantite_totale;
+            DELETE FROM {table} WHERE {match} AND nb_variantes <= 0;"""
+
+
+def _stock_changes(ref, sign):
+    # agg_stock_produit d'abord : les triggers des tables couleurs / tailles y ajustent nb_couleurs / nb_tailles
+    order = ['agg_stock_produit', 'agg_produit_couleurs', 'agg_produit_tailles',
+             'agg_stock_taille', 'agg_stock_marque', 'agg_stock_categorie']
+    if sign < 0:
+        # En retrait, la ligne produit n'est supprimée qu'après ses couleurs et tailles
+        order = order[1:] + order[:1]
+    return "".join(_adjust(table, ref, sign) for table in order)
+
+
+def _create_triggers():
+    cols = "produit_id, taille, couleur, quantite_disponible"
+    # Stock du produit lu dans agg_stock_produit : pas de parcours de stocks
+    moved = "(SELECT nb_variantes FROM agg_stock_produit WHERE produit_id = {ref}.id)"
+    moved_qty = "(SELECT quantite_totale FROM agg_stock_produit WHERE produit_id = {ref}.id)"
+
+    def regroup(table, column, ref, sign):
+        # Tout le stock d'un produit change de marque / catégorie
+        keys = AGGREGATES[table][0]
+        return f"""
+            INSERT INTO {table} ({keys[0]}, nb_variantes, quantite_totale)
+            SELECT {ref}.{column}, {sign} * {moved.format(ref=ref)}, {sign} * {moved_qty.format(ref=ref)}
+            WHERE {ref}.{column} IS NOT NULL AND {moved.format(ref=ref)} > 0
+            ON CONFLICT ({keys[0]}) DO UPDATE SET
+                nb_variantes = nb_variantes + excluded.nb_variantes,
+                quantite_totale = quantite_totale + excluded.quantite_totale;
+            DELETE FROM {table} WHERE {keys[0]} = {ref}.{column} AND nb_variantes <= 0;"""
+
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS agg_stocks_ai AFTER INSERT ON stocks BEGIN{_stock_changes('new', 1)}\nEND;",
+        f"CREATE TRIGGER IF NOT EXISTS agg_stocks_ad AFTER DELETE ON stocks BEGIN{_stock_changes('old', -1)}\nEND;",
+        f"CREATE TRIGGER IF NOT EXISTS agg_stocks_au AFTER UPDATE OF {cols} ON stocks BEGIN"
+        f"{_stock_changes('old', -1)}{_stock_changes('new', 1)}\nEND;",
+    ]
+    for table, column in (('agg_stock_marque', 'marque_id'), ('agg_stock_categorie', 'categorie_id')):
+        triggers.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_produits_au AFTER UPDATE OF {column} ON produits "
+            f"WHEN old.{column} IS NOT new.{column} BEGIN"
+            f"{regroup(table, column, 'old', -1)}{regroup(table, column, 'new', 1)}\nEND;"
+        )
+        triggers.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_produits_ad AFTER DELETE ON produits BEGIN"
+            f"{regroup(table, column, 'old', -1)}\nEND;"
+        )
+    for table, counter in (('agg_produit_couleurs', 'nb_couleurs'), ('agg_produit_tailles', 'nb_tailles')):
+        triggers.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {table} BEGIN\n"
+            f"            UPDATE agg_stock_produit SET {counter} = {counter} + 1 WHERE produit_id = new.produit_id;\nEND;"
+        )
+        triggers.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {table} BEGIN\n"
+            f"            UPDATE agg_stock_produit SET {counter} = {counter} - 1 WHERE produit_id = old.produit_id;\nEND;"
+        )
+    return "\n".join(triggers)
+
+
+# Recalcul complet (création et vérification)
+_FULL = {
+    'agg_stock_marque': """SELECT p.marque_id, COUNT(*), COALESCE(SUM(s.quantite_disponible), 0)
+        FROM stocks s JOIN produits p ON p.id = s.produit_id WHERE p.marque_id IS NOT NULL GROUP BY p.marque_id""",
+    'agg_stock_categorie': """SELECT p.categorie_id, COUNT(*), COALESCE(SUM(s.quantite_disponible), 0)
+        FROM stocks s JOIN produits p ON p.id = s.produit_id WHERE p.categorie_id IS NOT NULL GROUP BY p.categorie_id""",
+    'agg_stock_taille': """SELECT taille, COUNT(*), COALESCE(SUM(quantite_disponible), 0)
+        FROM stocks WHERE taille IS NOT NULL GROUP BY taille""",
+    'agg_stock_produit': """SELECT produit_id, COUNT(*), COALESCE(SUM(quantite_disponible), 0),
+        COUNT(DISTINCT couleur), COUNT(DISTINCT taille)
+        FROM stocks WHERE produit_id IS NOT NULL GROUP BY produit_id""",
+    'agg_produit_couleurs': """SELECT produit_id, couleur, COUNT(*), COALESCE(SUM(quantite_disponible), 0)
+        FROM stocks WHERE produit_id IS NOT NULL AND couleur IS NOT NULL GROUP BY produit_id, couleur""",
+    'agg_produit_tailles': """SELECT produit_id, taille, COUNT(*), COALESCE(SUM(quantite_disponible), 0)
+        FROM stocks WHERE produit_id IS NOT NULL AND taille IS NOT NULL GROUP BY produit_id, taille""",
+}
+
+
+def _columns(table):
+    keys = AGGREGATES[table][0]
+    extra = ['nb_couleurs', 'nb_tailles'] if table == 'agg_stock_produit' else []
+    return list(keys) + ['nb_variantes', 'quantite_totale'] + extra
+
+
+def create_aggregates(conn, rebuild=True):
+    """
+    Crée les tables d'agrégats et leurs triggers sur une connexion en écriture,
+    puis (re)calcule leur contenu. Après un chargement en masse, appeler cette
+    fonction à la fin est bien plus rapide que de laisser les triggers tourner ligne à ligne.
+    """
+    conn.executescript(_create_tables())
+    conn.executescript(_create_triggers())
+    if rebuild:
+        with conn:
+            for table in _FULL:
+                conn.execute(f"DELETE FROM {table}")
+            # agg_stock_produit en dernier : ses compteurs de couleurs / tailles viennent du
+            # recalcul, les triggers des tables couleurs / tailles n'ont alors aucune ligne à ajuster
+            for table in sorted(_FULL, key=lambda t: t == 'agg_stock_produit'):
+                conn.execute(f"INSERT INTO {table} ({', '.join(_columns(table))}) {_FULL[table]}")
+
+
+def check_aggregates(conn):
+    """
+    Compare chaque table d'agrégats à un recalcul complet.
+
+    Returns:
+        dict: {table: nombre de lignes divergentes} (vide si tout est cohérent)
+    """
+    mismatches = {}
+    for table, query in _FULL.items():
+        stored = set(conn.execute(f"SELECT {', '.join(_columns(table))} FROM {table}").fetchall())
+        expected = set(conn.execute(query).fetchall())
+        if stored != expected:
+            mismatches[table] = len(stored ^ expected)
+    return mismatches
+
+
+def has_aggregates(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agg_stock_produit'"
+    ).fetchone() is not None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        existed = has_aggregates(conn)
+        rebuild = not existed or "--rebuild" in argv
+        create_aggregates(conn, rebuild=rebuild)
+        status = "créés" if not existed else "recalculés" if rebuild else "déjà à jour"
+        print(f"📊 Agrégats de stock {status} ({', '.join(AGGREGATES)})")
+        if "--check" in argv:
+            mismatches = check_aggregates(conn)
+            if mismatches:
+                print(f"❌ Agrégats incohérents : {mismatches}")
+                return 1
+            print("✅ Agrégats cohérents avec stocks")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Index plein texte (FTS5) sur les colonnes texte des produits.
+
+    python text_search.py              # crée l'index (et ses triggers) s'il n'existe pas
+    python text_search.py --rebuild    # reconstruit son contenu depuis produits
+
+L'index est une table virtuelle à contenu externe (content='produits') : il ne
+stocke que les termes, le texte reste dans produits. Les triggers le tiennent
+à jour à chaque INSERT / UPDATE / DELETE. Le tokenizer unicode61 avec
+remove_diacritics rend la recherche insensible à la casse et aux accents
+(« merinos » trouve « Mérinos »).
+"""
+import sys
+import sqlite3
+
+DB_PATH = "data/boutique.db"
+
+FTS_TABLE = "produits_fts"
+SOURCE_TABLE = "produits"
+FTS_COLUMNS = ("nom_modele", "description", "composition", "matiere_principale")
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def _columns(prefix=""):
+    return ", ".join(f"{prefix}{c}" for c in FTS_COLUMNS)
+
+
+def text_index_sql():
+    """DDL de l'index et des triggers de synchronisation (idempotent)."""
+    values = _columns("new.")
+    old_values = _columns("old.")
+    return f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {_columns()},
+            content='{SOURCE_TABLE}', content_rowid='id',
+            tokenize="{TOKENIZER}"
+        );
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {SOURCE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {_columns()}) VALUES (new.id, {values});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {SOURCE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns()}) VALUES ('delete', old.id, {old_values});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_columns()} ON {SOURCE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns()}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {_columns()}) VALUES (new.id, {values});
+        END;
+    """
+
+
+def create_text_index(conn, rebuild=True):
+    """
+    Crée l'index et ses triggers sur une connexion en écriture, puis (re)construit
+    son contenu à partir des produits existants et le compacte.
+    Après un chargement en masse, appeler cette fonction une fois à la fin est bien
+    plus rapide que de laisser les triggers indexer ligne par ligne.
+    """
+    conn.executescript(text_index_sql())
+    if rebuild:
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    conn.commit()
+
+
+def has_text_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        existed = has_text_index(conn)
+        rebuild = not existed or "--rebuild" in argv
+        create_text_index(conn, rebuild=rebuild)
+        count = conn.execute(f"SELECT COUNT(*) FROM {SOURCE_TABLE}").fetchone()[0]
+    finally:
+        conn.close()
+    status = "créé" if not existed else "reconstruit" if rebuild else "déjà à jour"
+    print(f"🔤 Index plein texte {FTS_TABLE} {status} ({count} produits)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
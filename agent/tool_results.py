@@ -0,0 +1,130 @@
+import json
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+
+# Taille de l'aperçu renvoyé au LLM (l'interface reçoit l'objet complet)
+AGENT_PREVIEW_ROWS = 3
+AGENT_MAX_CELL_CHARS = 40
+
+
+def message_text(content):
+    """Texte d'un message LLM, que le contenu soit une chaîne ou une liste de blocs."""
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in content
+        )
+    return "" if content is None else str(content)
+
+
+def _compact(value):
+    if isinstance(value, str) and len(value) > AGENT_MAX_CELL_CHARS:
+        return value[:AGENT_MAX_CELL_CHARS] + "…"
+    return value
+
+
+def _to_json(data):
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+@dataclass
+class SqlSpec:
+    """Sortie de generate_sql_query : la requête et le type de graphique conseillé."""
+    sql: str
+    viz_type: str = "tableau"
+    cached: bool = False
+
+    def to_agent_json(self):
+        return _to_json({'sql': self.sql, 'viz_type': self.viz_type})
+
+
+@dataclass
+class QueryResult:
+    """Sortie de execute_and_export_sql."""
+    success: bool
+    sql: str = None
+    result_id: str = None
+    row_count: int = 0
+    columns: list = field(default_factory=list)
+    data_preview: list = field(default_factory=list)
+    truncated: bool = False
+    filepath: str = None
+    csv_path: str = None
+    format: str = None
+    error: str = None
+
+    def to_agent_json(self):
+        """Résumé compact pour le LLM : quelques lignes d'aperçu, valeurs tronquées."""
+        if not self.success:
+            return _to_json({'success': False, 'error': self.error})
+        summary = {'success': True}
+        if self.result_id:
+            summary['result_id'] = self.result_id
+        summary.update({
+            'row_count': self.row_count,
+            'columns': self.columns,
+            'preview': [
+                {k: _compact(v) for k, v in row.items()}
+                for row in self.data_preview[:AGENT_PREVIEW_ROWS]
+            ],
+        })
+        if self.truncated:
+            summary['truncated'] = True
+        if self.filepath:
+            summary['filepath'] = self.filepath
+        return _to_json(summary)
+
+
+@dataclass
+class ChartResult:
+    """Sortie de generate_visualization (image PNG ou spécification Vega-Lite)."""
+    success: bool
+    filepath: str = None
+    spec: dict = None
+    chart_type: str = None
+    title: str = None
+    data_shape: tuple = None
+    columns: list = field(default_factory=list)
+    error: str = None
+
+    def to_agent_json(self):
+        if not self.success:
+            return _to_json({'success': False, 'error': self.error})
+        summary = {'success': True, 'chart_type': self.chart_type}
+        if self.filepath:
+            summary['filepath'] = self.filepath
+        elif self.spec:
+            # La spécification complète (données incluses) n'est pas renvoyée au LLM
+            summary['format'] = 'vega-lite'
+        else:
+            summary['format'] = 'table'
+        return _to_json(summary)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# --- Transmission des objets complets à l'interface -------------------------
+
+_result_callback = contextvars.ContextVar("result_callback", default=None)
+
+@contextmanager
+def on_tool_result(callback):
+    """
+    Pendant ce bloc, chaque objet produit par un outil (SqlSpec, QueryResult,
+    ChartResult) est transmis à callback, en plus du résumé JSON envoyé au LLM.
+    """
+    token = _result_callback.set(callback)
+    try:
+        yield
+    finally:
+        _result_callback.reset(token)
+
+
+def publish(result):
+    """Transmet l'objet au callback courant (s'il y en a un) et le renvoie."""
+    callback = _result_callback.get()
+    if callback is not None:
+        callback(result)
+    return result
@@ -0,0 +1,133 @@
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from tool_results import message_text
+
+# Badge affiché pour chaque outil (même rendu que l'historique du chat)
+TOOL_BADGES = {
+    'generate_sql_query': ("Générateur SQL", "⚡ Génération SQL"),
+    'execute_and_export_sql': ("Exécuteur SQL", "🗄️ Exécution requête"),
+    'generate_visualization': ("Générateur de visualisation", "📊 Création graphique"),
+}
+
+
+class StreamlitAgentCallbackHandler(BaseCallbackHandler):
+    """
+    Affiche en temps réel, dans les placeholders Streamlit, le déroulement de l'agent :
+    début/fin de chaque outil, tokens de la réponse au fil de l'eau et durée de
+    chaque étape. Remplace la capture de stdout (qui touchait tout le processus
+    et n'était lue qu'une fois l'agent terminé).
+    """
+
+    # Les placeholders Streamlit doivent être mis à jour depuis le thread du script
+    run_inline = True
+
+    def __init__(self, tools_placeholder, response_placeholder=None):
+        self.tools_placeholder = tools_placeholder
+        self.response_placeholder = response_placeholder
+        self.tools_used = []
+        self.timings = []
+        self._starts = {}
+        self._running_tools = {}
+        self._tokens = []
+        self._run_start = time.perf_counter()
+
+    # --- Rendu ---------------------------------------------------------------
+
+    def _render_tools(self):
+        tools_html = "**🔧 Raisonnement :** "
+        for step in self.timings:
+            if step['kind'] != 'tool' or step['name'] not in TOOL_BADGES:
+                continue
+            status = f" ({step['duration']:.1f}s)" if step['duration'] is not None else " …"
+            if step.get('error'):
+                status = " ❌"
+            tools_html += f'<span class="tool-badge">{TOOL_BADGES[step["name"]][1]}{status}</span> '
+        self.tools_placeholder.markdown(tools_html, unsafe_allow_html=True)
+
+    def _start_step(self, run_id, kind, name):
+        self._starts[run_id] = time.perf_counter()
+        step = {
+            'kind': kind,
+            'name': name,
+            'offset': self._starts[run_id] - self._run_start,
+            'duration': None,
+        }
+        self.timings.append(step)
+        return step
+
+    def _end_step(self, run_id, **extra):
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return None
+        for step in reversed(self.timings):
+            if step['duration'] is None and step.get('run_id', run_id) == run_id:
+                step['duration'] = time.perf_counter() - start
+                step.update(extra)
+                return step
+        return None
+
+    # --- Outils --------------------------------------------------------------
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get('name') or kwargs.get('name', 'outil')
+        step = self._start_step(run_id, 'tool', name)
+        step['run_id'] = run_id
+        self._running_tools[run_id] = name
+        if name in TOOL_BADGES and TOOL_BADGES[name][0] not in self.tools_used:
+            self.tools_used.append(TOOL_BADGES[name][0])
+        self._render_tools()
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._running_tools.pop(run_id, None)
+        self._end_step(run_id, output=message_text(getattr(output, 'content', output))[:200])
+        self._render_tools()
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._running_tools.pop(run_id, None)
+        self._end_step(run_id, error=str(error))
+        self._render_tools()
+
+    # --- LLM -----------------------------------------------------------------
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._on_model_start(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._on_model_start(run_id)
+
+    def _on_model_start(self, run_id):
+        # Un appel LLM fait depuis un outil (ex : génération SQL) n'est pas la réponse finale
+        nested = bool(self._running_tools)
+        step = self._start_step(run_id, 'llm', 'llm (outil)' if nested else 'llm')
+        step['run_id'] = run_id
+        if not nested:
+            self._tokens = []
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if self._running_tools or self.response_placeholder is None:
+            return
+        text = message_text(token)
+        if text:
+            self._tokens.append(text)
+            self.response_placeholder.markdown("".join(self._tokens) + "▌")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end_step(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end_step(run_id, error=str(error))
+
+    # --- Résumé --------------------------------------------------------------
+
+    def summary(self):
+        """Durées par étape (pour l'historique et l'affichage « Détails d'exécution »)."""
+        return [
+            {
+                'kind': step['kind'],
+                'name': step['name'],
+                'offset_s': round(step['offset'], 3),
+                'duration_s': round(step['duration'], 3) if step['duration'] is not None else None,
+                **({'error': step['error']} if step.get('error') else {}),
+            }
+            for step in self.timings
+        ]
@@ -1,291 +1,164 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
 import os
-from datetime import datetime
-import numpy as np
+import asyncio
+import contextvars
+import concurrent.futures
 from langchain_core.tools import tool  
-from langchain_core.prompts import ChatPromptTemplate
+from result_io import load_fastest
+from result_store import get_result_store
+from result_types import coerce_types
+from tool_results import ChartResult, publish
+from artifact_store import hash_dataframe, hash_key, record_artifact, save_bytes
+from chart_reduce import reduce_for_chart, reduced_title
+from chart_specs import build_spec
+from chart_renderer import RENDER_DPI, RENDER_STYLE_VERSION, get_render_service
+from render_cache import get_render_cache
 
+VIZ_DIR = 'visualizations'
+# 'vega' : spécification Vega-Lite rendue par le navigateur (PNG seulement au téléchargement)
+# 'png'  : image rendue côté serveur
+CHART_OUTPUT = os.getenv("CHART_OUTPUT", "vega").lower()
 
-def __init__(output_dir='visualizations'):
-        """
-        Initialise le générateur avec un style professionnel.
-        """
-        output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # --- Configuration Globale du Style ---
-        # On essaie d'appliquer un style moderne, sinon on configure manuellement
-        try:
-            plt.style.use('seaborn-v0_8-whitegrid')
-        except:
-            plt.style.use('ggplot')
-
-        colors = plt.cm.tab10.colors  # Palette de couleurs standard de haute qualité
-        
-        plt.rcParams.update({
-            'font.size': 12,
-            'font.family': 'sans-serif',
-            'figure.autolayout': True, # Ajustement automatique des marges
-            'axes.titlesize': 16,
-            'axes.titleweight': 'bold',
-            'axes.labelsize': 12,
-            'figure.dpi': 150 # Meilleure résolution pour l'affichage
-        })
 @tool
-def generate_visualization(csv_file_path, chart_type, title=None)->str:
+def generate_visualization(chart_type, result_id=None, csv_file_path=None, title=None)->str:
     """
-Génère un graphique visuel (PNG) à partir d'un fichier CSV donné.
+Génère un graphique visuel (PNG) à partir d'un résultat de requête.
 Args:
-    csv_file_path: Le chemin du fichier CSV.
     chart_type: Le type de graphique souhaité (Bar Charts, Pie Charts, Line Plots, Scatter Plots, Tableau).
+    result_id: L'identifiant renvoyé par execute_and_export_sql (résultat gardé en mémoire).
+    csv_file_path: À défaut, le chemin du fichier de données exporté ('filepath').
+    title: Le titre du graphique.
 Returns:
-    Un message de succès avec le chemin de l'image.
+    Un résumé JSON (success, chart_type, et filepath de l'image si elle est rendue côté serveur).
 """
-    print(f"DEBUG: Appel de l'outil Viz avec csv={csv_file_path} et type={chart_type}")
     try:
-        # Lecture robuste du CSV
-        df = pd.read_csv(csv_file_path)
+        if result_id:
+            # Lecture directe en mémoire : pas de relecture disque
+            df = get_result_store().get(result_id)
+        elif csv_file_path:
+            # Lecture depuis le format le plus rapide disponible (Feather mmap > Parquet > CSV),
+            # puis typage (le CSV a perdu les types SQLite)
+            df = coerce_types(load_fastest(csv_file_path))
+        else:
+            return _chart_error(chart_type, 'Il faut fournir result_id ou csv_file_path')
         
         if df.empty:
-            return {'success': False, 'error': 'Le fichier CSV est vide'}
-        # Nettoyage basique : essayer de convertir les colonnes numériques si elles sont en string
-        for col in df.columns:
-            pd.to_numeric(df[col], errors='ignore')
+            return _chart_error(chart_type, 'Le résultat est vide')
         if not title:
-            title = f"Analyse - {os.path.basename(csv_file_path)}"
-        # Normalisation du type de chart
-        ctype = chart_type.lower()
-        
-        if 'pie charts' in ctype:
-            filepath = _create_donut_chart(df, title) # Upgrade vers Donut
-        elif 'tableau' in ctype:
-            filepath = _create_styled_table(df, title)
-        elif 'line plots' in ctype:
-            filepath = _create_line_plot(df, title)
-        elif 'scatter plots' in ctype:
-            filepath = _create_scatter_plot(df, title)
-        elif 'bar charts' in ctype:
-            filepath = _create_bar_chart(df, title)
-        else:
-            return {'success': False, 'error': f'Type non supporté: {chart_type}'}
-        tmp={
-            'success': True,
-            'filepath': filepath,
-            'chart_type': chart_type,
-            'data_shape': df.shape,
-            'columns': list(df.columns)
-        }
-        return  f"Graphique généré avec succès ici : {tmp}"
+            title = f"Analyse - {result_id or os.path.basename(csv_file_path)}"
+        filepath = spec = None
+        try:
+            if chart_kind(chart_type) == 'table':
+                # Tableau : affiché directement par l'interface, image à la demande seulement
+                pass
+            elif CHART_OUTPUT == 'vega':
+                spec = chart_spec(df, chart_type, title)
+            else:
+                filepath = render_chart(df, chart_type, title)
+        except UnsupportedChartType:
+            return _chart_error(chart_type, f'Type non supporté: {chart_type}')
+        result = ChartResult(
+            success=True,
+            filepath=filepath,
+            spec=spec,
+            chart_type=chart_type,
+            title=title,
+            data_shape=df.shape,
+            columns=list(df.columns)
+        )
+        # L'interface reçoit l'objet complet, le LLM un résumé JSON compact
+        return publish(result).to_agent_json()
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return f"erreur {'success': False, 'error': str(e)}"
-def _create_donut_chart(df, title):
-    """Crée un Donut Chart (plus lisible qu'un Pie Chart classique)"""
-    if len(df.columns) < 2:
-        raise ValueError("Nécessite 2 colonnes (Labels, Valeurs)")
-    
-    labels = df.iloc[:, 0]
-    values = df.iloc[:, 1]
-    
-    # Création de la figure
-    fig, ax = plt.subplots(figsize=(10, 7))
-    
-    # Création du donut
-    wedges, texts, autotexts = ax.pie(
-        values, 
-        labels=labels, 
-        autopct='%1.1f%%', 
-        startangle=90,
-        pctdistance=0.85, # Pourcentage plus vers l'extérieur
-        wedgeprops=dict(width=0.5, edgecolor='white', linewidth=2), # L'anneau
-        colors=plt.cm.Pastel1.colors
-    )
-    
-    # Styliser le texte
-    plt.setp(texts, size=10, fontweight="bold")
-    plt.setp(autotexts, size=9, color="white", fontweight="bold")
-    
-    # Cercle blanc au centre (optionnel si wedgeprops width est utilisé, mais sécurise le look)
-    centre_circle = plt.Circle((0,0),0.70,fc='white')
-    fig.gca().add_artist(centre_circle)
-    
-    ax.set_title(title, pad=20)
-    ax.axis('equal')
-    
-    return _save_plot('donut')
-def _create_bar_chart( df, title):
-    """Crée un Bar Chart avec annotations de valeurs"""
-    categories = df.iloc[:, 0].astype(str) # Force string pour x
-    values = df.iloc[:, 1]
-    
-    fig, ax = plt.subplots(figsize=(12, 7))
-    
-    # Barres avec une couleur unique mais esthétique
-    bars = ax.bar(categories, values, color='#3498db', alpha=0.8, edgecolor='white', linewidth=1)
-    
-    ax.set_title(title, pad=20)
-    ax.set_xlabel(df.columns[0])
-    ax.set_ylabel(df.columns[1])
-    
-    # Rotation des labels si beaucoup de catégories
-    if len(categories) > 5:
-        plt.xticks(rotation=45, ha='right')
-        
-    # Grille horizontale seulement
-    ax.yaxis.grid(True, linestyle='--', alpha=0.7)
-    ax.xaxis.grid(False)
-    
-    # Suppression des bordures inutiles (Haut et Droite)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    # Annotation des valeurs sur les barres
-    for bar in bars:
-        height = bar.get_height()
-        ax.text(
-            bar.get_x() + bar.get_width()/2., 
-            height,
-            f'{height:,.0f}' if height > 100 else f'{height:.2f}', # Format intelligent
-            ha='center', 
-            va='bottom',
-            fontsize=10,
-            fontweight='bold',
-            color='#444444'
-        )
-    
-    return _save_plot('bar')
-def _create_line_plot(df, title):
-    """Crée un Line Plot multi-séries"""
-    fig, ax = plt.subplots(figsize=(12, 7))
-    
-    x_col = df.iloc[:, 0]
-    
-    # Tracer toutes les colonnes restantes comme des lignes
-    for i, col in enumerate(df.columns[1:]):
-        ax.plot(
-            x_col, 
-            df[col], 
-            marker='o', 
-            linewidth=2.5, 
-            label=col,
-            alpha=0.9
-        )
-    ax.set_title(title, pad=20)
-    ax.set_xlabel(df.columns[0])
-    ax.legend(frameon=True, fancybox=True, shadow=True)
-    ax.grid(True, linestyle='--', alpha=0.5)
-    
-    # Si x contient beaucoup de points, on allège les labels
-    if len(x_col) > 10:
-         plt.xticks(rotation=45)
-    return _save_plot('line')
-def _create_scatter_plot( df, title):
-    fig, ax = plt.subplots(figsize=(10, 7))
-    
-    # Ajout d'une dimension couleur si 3ème colonne existe
-    c = df.iloc[:, 2] if len(df.columns) > 2 else None
-    
-    scatter = ax.scatter(
-        df.iloc[:, 0], 
-        df.iloc[:, 1], 
-        c=c, 
-        cmap='viridis' if c is not None else None,
-        alpha=0.7, 
-        s=100, 
-        edgecolor='white'
-    )
-    
-    if c is not None:
-        plt.colorbar(scatter, label=df.columns[2])
-    ax.set_title(title)
-    ax.set_xlabel(df.columns[0])
-    ax.set_ylabel(df.columns[1])
-    ax.grid(True, linestyle=':', alpha=0.6)
-    
-    return _save_plot('scatter')
-def _create_styled_table( df, title):
-    """Crée un tableau rendu comme une image haute qualité"""
-    fig, ax = plt.subplots(figsize=(12, len(df) * 0.5 + 2)) # Hauteur dynamique
-    ax.axis('off')
-    
-    # Couleurs du tableau
-    header_color = '#40466e'
-    row_colors = ['#f1f1f2', 'w']
-    edge_color = 'w'
-    # Création du tableau
-    table = ax.table(
-        cellText=df.values,
-        colLabels=df.columns,
-        loc='center',
-        cellLoc='center'
-    )
-    
-    # Styling avancé
-    table.auto_set_font_size(False)
-    table.set_fontsize(11)
-    table.scale(1, 1.8) # Plus d'espace vertical
-    for k, cell in table.get_celld().items():
-        cell.set_edgecolor(edge_color)
-        if k[0] == 0: # Header
-            cell.set_text_props(weight='bold', color='w')
-            cell.set_facecolor(header_color)
-        else: # Rows
-            cell.set_facecolor(row_colors[k[0]%len(row_colors)])
-            
-    plt.title(title, fontsize=16, weight='bold', pad=10)
-    return _save_plot('table')
-def _save_plot( chart_type):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{chart_type}_{timestamp}.png"
-    filepath = os.path.join('visualizations', filename)
-    # bbox_inches='tight' est crucial pour ne pas couper les légendes
-    plt.savefig(filepath, dpi=200, bbox_inches='tight') 
-    plt.close()
-    return filepath
+        return _chart_error(chart_type, str(e))
 
-# --- Zone de Test ---
-# Cette partie doit être désindentée (collée à la marge de gauche)
-"""
-if __name__ == "__main__":
-    # 1. Instancier le générateur
-    generator = VisualGenerator()
+async def _agenerate_visualization(chart_type, result_id=None, csv_file_path=None, title=None):
+    return await asyncio.to_thread(generate_visualization.func, chart_type, result_id, csv_file_path, title)
 
-    # 2. Définir le chemin de ton fichier existant
-    # J'ai ajouté le 'r' devant la chaîne pour gérer correctement les backslashes sous Windows
-    csv_path = r"exports\export_20251124_203348.csv"
+# Variante asynchrone utilisée par agent.ainvoke (le rendu matplotlib part dans un thread)
+generate_visualization.coroutine = _agenerate_visualization
 
-    # 3. Vérifier que le fichier existe avant de lancer
-    if not os.path.exists(csv_path):
-        print(f"⚠️ Fichier introuvable : {csv_path}")
-        print("Assure-toi que le dossier 'exports' est bien au même endroit que ce script.")
-    else:
-        print(f"📂 Fichier trouvé : {csv_path}")
-        print("🚀 Lancement de la génération des visuels améliorés...\n")
+def _chart_error(chart_type, error):
+    return publish(ChartResult(success=False, chart_type=chart_type, error=error)).to_agent_json()
 
-        # Liste des tests à effectuer
-        test_scenarios = [
-            ("Bar", "Analyse Stocks (Barres)"),
-            ("Pie", "Répartition (Donut Chart)"),     
-            ("Tableau", "Vue Tabulaire Stylisée"),   
-            ("Line", "Tendances (Ligne)")
-        ]
+class UnsupportedChartType(ValueError):
+    """Type de graphique inconnu du générateur."""
 
-        for chart_type, title in test_scenarios:
-            print(f"🎨 Génération de : {chart_type}...")
-            
-            result = generator.generate_visualization(
-                csv_file_path=csv_path, 
-                chart_type=chart_type, 
-                title=title
-            )
-            
-            if result['success']:
-                print(f"   ✅ Succès ! Image sauvegardée ici : {result['filepath']}")
-            else:
-                print(f"   ❌ Erreur : {result['error']}")
+def chart_kind(chart_type):
+    """Type de rendu (clé de chart_renderer.RENDERERS) correspondant au type demandé."""
+    # Normalisation du type de chart
+    ctype = chart_type.lower()
+    
+    if 'pie charts' in ctype:
+        return 'donut' # Upgrade vers Donut
+    elif 'tableau' in ctype:
+        return 'table'
+    elif 'line plots' in ctype:
+        return 'line'
+    elif 'scatter plots' in ctype:
+        return 'scatter'
+    elif 'bar charts' in ctype:
+        return 'bar'
+    raise UnsupportedChartType(f'Type non supporté: {chart_type}')
+
+def chart_spec(df, chart_type, title):
+    """
+    Spécification Vega-Lite du graphique (affichée avec st.vega_lite_chart),
+    ou None pour un tableau. Aucun rendu côté serveur.
+    """
+    kind = chart_kind(chart_type)
+    df, note = reduce_for_chart(kind, df)
+    return build_spec(kind, df, reduced_title(title, note))
+
+def submit_chart(df, chart_type, title):
+    """
+    Soumet le rendu au pool de processus (chart_renderer) sans attendre.
+    
+    Returns:
+        concurrent.futures.Future: résultat = chemin de l'image PNG générée
+    """
+    kind = chart_kind(chart_type)
+    # Le manifeste de session (contextvar) doit suivre jusqu'au callback de fin de rendu
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+    
+    def done(path):
+        context.run(record_artifact, 'chart', path, chart_type=chart_type, title=title)
+        future.set_result(path)
+    
+    # Mêmes données + même type + même titre + même style : on ressert l'image déjà produite
+    cache = get_render_cache()
+    key = hash_key(hash_dataframe(df), kind, title, RENDER_STYLE_VERSION, RENDER_DPI)
+    filepath = cache.get(key) if cache is not None else None
+    if filepath is not None:
+        done(filepath)
+        return future
+    
+    def on_rendered(render_future):
+        try:
+            # Nom dérivé du contenu ({type}_{hash}.png) : pas d'écrasement entre
+            # utilisateurs, une image identique n'est écrite qu'une fois
+            path = save_bytes(render_future.result(), VIZ_DIR, kind, 'png')
+            if cache is not None:
+                cache.put(key, path)
+            done(path)
+        except Exception as e:
+            future.set_exception(e)
+    
+    # Données réduites avant l'envoi au processus de rendu (temps de rendu borné)
+    reduced, note = reduce_for_chart(kind, df)
+    get_render_service().submit(kind, reduced, reduced_title(title, note)).add_done_callback(on_rendered)
+    return future
+
+def render_chart(df, chart_type, title):
+    """
+    Dessine le DataFrame avec le renderer correspondant au type demandé
+    (dans un processus de rendu) et attend le résultat.
+    
+    Returns:
+        str: Chemin de l'image PNG générée
+    """
+    return submit_chart(df, chart_type, title).result()
 
-        print("\n✨ Test terminé. Vérifie le dossier 'visualizations'.")
-        """
\ No newline at end of file
+async def arender_chart(df, chart_type, title):
+    """Version asynchrone de render_chart : on attend le Future du pool sans bloquer de thread."""
+    return await asyncio.wrap_future(submit_chart(df, chart_type, title))
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark : coût d'initialisation du client Gemini par appel d'outil.
+
+Compare l'ancien comportement (un ChatGoogleGenerativeAI construit à chaque appel)
+avec le registre partagé (llm_registry.get_llm). Aucune requête réseau n'est
+envoyée : on ne mesure que la mise en place du client (HTTP, authentification).
+
+Usage (depuis la racine du projet) :
+    python benchmarks/bench_llm_registry.py --iterations 200
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agent"))
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_registry import get_llm, reset_registry, LLM_MODEL
+
+
+def _time_calls(fn, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _summary(durations):
+    return {
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p50_ms": statistics.median(durations) * 1000,
+        "max_ms": max(durations) * 1000,
+        "total_ms": sum(durations) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    # Avant : un client neuf à chaque appel d'outil
+    before = _time_calls(lambda: ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=0), args.iterations)
+
+    # Après : premier appel = création, les suivants réutilisent le client
+    reset_registry()
+    after = _time_calls(get_llm, args.iterations)
+
+    print(f"Setup du client sur {args.iterations} appels ({LLM_MODEL})")
+    for label, durations in (("Avant (client par appel)", before), ("Après (registre partagé)", after)):
+        s = _summary(durations)
+        print(f"  {label:<26} moyenne {s['mean_ms']:8.3f} ms | p50 {s['p50_ms']:8.3f} ms "
+              f"| max {s['max_ms']:8.3f} ms | total {s['total_ms']:9.1f} ms")
+    print(f"  Gain moyen par appel : {(statistics.mean(before) - statistics.mean(after)) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+"""
+Benchmark de bout en bout du pipeline : génération SQL, exécution, export,
+rendu du graphique et sérialisation vers l'interface.
+
+Aucun appel réseau : ChatGoogleGenerativeAI est remplacé par un modèle local qui
+rejoue les réponses enregistrées (benchmarks/recorded_sql.json, SQL écrit à la main
+tant qu'il n'est pas remplacé par --record-from-cache) pour les questions de
+data/user_input.txt, avec une latence simulée (--latency, --jitter). Les mesures
+sont faites pour plusieurs tailles de base (--sizes, 0 = catalogue de démonstration)
+et plusieurs niveaux de concurrence (--concurrency).
+
+Usage (depuis la racine du projet) :
+    python benchmarks/bench_pipeline.py --sizes 0,1e4,1e5 --concurrency 1,4 --repeat 3
+    python benchmarks/bench_pipeline.py --compare artifacts/bench/pipeline_ab5139e_*.json artifacts/bench/pipeline_c0ffee1_*.json
+    python benchmarks/bench_pipeline.py --record-from-cache data/query_cache.db
+
+Chaque base est générée une fois (data/init_db.py --products N, gardée dans
+artifacts/bench/db) puis mesurée dans un processus neuf, depuis un dossier de
+travail temporaire : exports, images et caches ne sont pas partagés entre deux
+mesures, et les caches de requêtes / de rendus sont désactivés. Le rapport JSON
+(artifacts/bench/pipeline_<commit>_<date>.json) contient, par taille et par niveau
+de concurrence, les durées par étape (moyenne, p50, p95, max) et le débit.
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import sqlite3
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextvars
+from collections import defaultdict
+from datetime import datetime
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+AGENT_DIR = os.path.join(ROOT, "agent")
+sys.path.insert(0, AGENT_DIR)
+
+BENCH_DIR = os.path.join(ROOT, "artifacts", "bench")
+RECORDINGS = os.path.join(ROOT, "benchmarks", "recorded_sql.json")
+QUESTIONS = os.path.join(ROOT, "data", "user_input.txt")
+STAGES = ("generation", "execution", "export", "render", "ui")
+UI_PAGE_SIZE = 50
+
+# Caches désactivés : chaque répétition refait tout le travail
+WORKER_ENV = {"QUERY_CACHE": "0", "RENDER_CACHE": "0", "SQL_WORKLOAD_LOG": "0", "LLM_REQUESTS_PER_MINUTE": "0"}
+
+_QUESTION = re.compile(r'demande suivante : "(.+?)"\.', re.DOTALL)
+_REPAIR_MARKER = "tentative précédente a échoué"
+
+
+# --- Modèle rejoué -----------------------------------------------------------
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def read_recordings(filepath=RECORDINGS):
+    """Fichier d'enregistrements : source ('synthetic' ou 'query_cache'), description, responses."""
+    with open(filepath, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_recordings(filepath=RECORDINGS):
+    """{question normalisée: enregistrement} - clés sql, viz_type et éventuellement repair."""
+    return {_normalize(item["question"]): item for item in read_recordings(filepath)["responses"]}
+
+
+def record_from_cache(cache_path, output=RECORDINGS):
+    """
+    Remplace les enregistrements par les vraies réponses du modèle conservées dans
+    le cache de requêtes (data/query_cache.db) pour les questions de data/user_input.txt
+    (la plus récemment utilisée si le cache en a plusieurs versions de schéma).
+
+    Returns:
+        list: questions absentes du cache (à poser une fois dans l'application)
+    """
+    from batch_runner import load_questions
+    from query_cache import normalize_question
+
+    conn = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+    try:
+        responses, missing = [], []
+        for question in (q["question"] for q in load_questions(QUESTIONS)):
+            row = conn.execute(
+                "SELECT sql, viz_type FROM entries WHERE question_key = ? ORDER BY last_access DESC LIMIT 1",
+                (normalize_question(question),)
+            ).fetchone()
+            if row is None:
+                missing.append(question)
+            else:
+                responses.append({"question": question, "sql": row[0], "viz_type": row[1] or "tableau"})
+    finally:
+        conn.close()
+    if missing:
+        return missing
+    document = {
+        "source": "query_cache",
+        "description": f"Réponses du modèle relevées dans {os.path.basename(cache_path)} "
+                       f"le {datetime.now():%Y-%m-%d} (commit {_git('rev-parse', '--short', 'HEAD') or '?'}).",
+        "responses": responses,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    return []
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Remplaçant local de ChatGoogleGenerativeAI : renvoie la réponse enregistrée pour
+    la question du prompt (la réponse « repair » si le prompt contient un retour
+    d'erreur) après une latence simulée. La variation (jitter) dépend de la question :
+    deux exécutions du benchmark attendent exactement les mêmes durées.
+    """
+
+    recordings: dict
+    latency: float = 0.0
+    jitter: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "replay"
+
+    def _respond(self, messages):
+        prompt = messages[-1].content if messages else ""
+        match = _QUESTION.search(prompt)
+        question = _normalize(match.group(1)) if match else ""
+        item = self.recordings.get(question)
+        repair = _REPAIR_MARKER in prompt
+        if item is None:
+            text = f"Question non enregistrée : {question[:80]}"
+        else:
+            answer = item.get("repair") if repair and item.get("repair") else item
+            text = json.dumps({"sql": answer["sql"], "viz_type": answer["viz_type"]}, ensure_ascii=False)
+        spread = (zlib.crc32(f"{question}|{repair}".encode()) % 1000) / 999 * 2 - 1
+        delay = max(0.0, self.latency * (1 + self.jitter * spread))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))]), delay
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        result, delay = self._respond(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        result, delay = self._respond(messages)
+        await asyncio.sleep(delay)
+        return result
+
+
+def install_replay_llm(recordings, latency, jitter):
+    """Remplace le client Gemini du registre partagé par le modèle rejoué."""
+    import llm_registry
+    llm_registry.ChatGoogleGenerativeAI = lambda **kwargs: ReplayChatModel(
+        recordings=recordings, latency=latency, jitter=jitter
+    )
+    llm_registry.reset_registry()
+
+
+# --- Mesure (processus de travail) -------------------------------------------
+
+_stage_times = contextvars.ContextVar("stage_times")
+
+
+def _timed(stage, fn):
+    """Enveloppe une étape du pipeline : sa durée s'ajoute aux mesures de la question en cours."""
+    def add(started):
+        times = _stage_times.get(None)
+        if times is not None:
+            times[stage] += time.perf_counter() - started
+
+    if asyncio.iscoroutinefunction(fn):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                add(started)
+    else:
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                add(started)
+    return wrapper
+
+
+def _instrument_pipeline():
+    import orchestrator
+    orchestrator.agenerate_sql_spec = _timed("generation", orchestrator.agenerate_sql_spec)
+    orchestrator.arun_sql_query = _timed("execution", orchestrator.arun_sql_query)
+    orchestrator.chart_spec = _timed("render", orchestrator.chart_spec)
+    orchestrator.arender_chart = _timed("render", orchestrator.arender_chart)
+
+
+def _export(result_id):
+    """Export disque du résultat (format binaire préféré + CSV), dans un dossier neuf."""
+    from result_store import get_result_store
+    from sql_executor import export_dataframe
+    df = get_result_store().get(result_id)
+    with tempfile.TemporaryDirectory(dir=".") as output_dir:
+        paths = export_dataframe(df, "auto", output_dir)
+        return sum(os.path.getsize(path) for path in paths.values())
+
+
+def _ui_payload(result):
+    """
+    Ce que l'interface envoie au navigateur : première page du tableau (Arrow IPC,
+    comme st.dataframe) et spécification Vega-Lite (JSON). Renvoie la taille en octets.
+    """
+    from result_io import HAS_ARROW
+    from result_store import get_result_store
+    size = 0
+    if result["result_id"]:
+        rows, _ = get_result_store().page(result["result_id"], 0, UI_PAGE_SIZE)
+        if HAS_ARROW:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(rows, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            size += sink.getvalue().size
+        else:
+            size += len(rows.to_json(orient="records", force_ascii=False).encode())
+    if result["chart_spec"]:
+        size += len(json.dumps(result["chart_spec"], ensure_ascii=False, default=str).encode())
+    return size
+
+
+async def _run_question(question, semaphore, chart_output):
+    from orchestrator import arun_pipeline
+    async with semaphore:
+        times = defaultdict(float)
+        _stage_times.set(times)
+        started = time.perf_counter()
+        result = await arun_pipeline(question, max_repairs=1, chart_output=chart_output)
+        export_bytes = ui_bytes = 0
+        if result["success"]:
+            t = time.perf_counter()
+            export_bytes = await asyncio.to_thread(_export, result["result_id"])
+            times["export"] += time.perf_counter() - t
+            t = time.perf_counter()
+            ui_bytes = await asyncio.to_thread(_ui_payload, result)
+            times["ui"] += time.perf_counter() - t
+        return {
+            "question": question,
+            "success": result["success"],
+            "error": result["error"],
+            "rows": result["row_count"],
+            "llm_calls": result["llm_calls"],
+            "export_bytes": export_bytes,
+            "ui_bytes": ui_bytes,
+            "times": dict(times),
+            "total": time.perf_counter() - started,
+        }
+
+
+def _summary(durations):
+    if not durations:
+        return None
+    ordered = sorted(durations)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(ordered[(len(ordered) - 1) // 2] * 1000, 3),
+        "p95_ms": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "total_ms": round(sum(ordered) * 1000, 3),
+    }
+
+
+async def measure(questions, concurrency, repeat, chart_output):
+    """Toutes les questions `repeat` fois, au plus `concurrency` à la fois."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(
+        _run_question(question, semaphore, chart_output)
+        for _ in range(repeat) for question in questions
+    ))
+    wall = time.perf_counter() - started
+
+    per_question = {}
+    for sample in samples:
+        entry = per_question.setdefault(sample["question"], {
+            "question": sample["question"], "rows": sample["rows"], "llm_calls": sample["llm_calls"],
+            "error": sample["error"], "export_bytes": sample["export_bytes"], "ui_bytes": sample["ui_bytes"],
+            "samples": defaultdict(list),
+        })
+        for stage, seconds in sample["times"].items():
+            entry["samples"][stage].append(seconds)
+        entry["samples"]["total"].append(sample["total"])
+    for entry in per_question.values():
+        entry["p50_ms"] = {stage: _summary(values)["p50_ms"] for stage, values in entry.pop("samples").items()}
+
+    return {
+        "concurrency": concurrency,
+        "jobs": len(samples),
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(len(samples) / wall, 3) if wall else None,
+        "errors": sum(1 for s in samples if not s["success"]),
+        "llm_calls": sum(s["llm_calls"] for s in samples),
+        "stages": {
+            stage: _summary([s["times"][stage] for s in samples if stage in s["times"]])
+            for stage in STAGES
+        },
+        "end_to_end": _summary([s["total"] for s in samples]),
+        "questions": list(per_question.values()),
+    }
+
+
+def run_worker(args):
+    """Mesures sur data/boutique.db du dossier courant ; écrit le résultat JSON dans --worker-output."""
+    from batch_runner import load_questions
+    from chart_renderer import RENDER_WORKERS, get_render_service
+    from db_pool import close_all
+    from result_io import preferred_format
+    import sql_executor
+
+    install_replay_llm(load_recordings(args.recordings), args.latency, args.jitter)
+    _instrument_pipeline()
+    questions = [q["question"] for q in load_questions(QUESTIONS)]
+    try:
+        # Tour à blanc : imports paresseux, connexions, pool de rendu, cache de pages SQLite
+        for _ in range(args.warmup):
+            asyncio.run(measure(questions, max(args.concurrency), 1, args.chart_output))
+        runs = []
+        for concurrency in args.concurrency:
+            run = asyncio.run(measure(questions, concurrency, args.repeat, args.chart_output))
+            print(f"    concurrence {concurrency:>3} : {run['throughput_qps']:8.2f} questions/s, "
+                  f"p50 {run['end_to_end']['p50_ms']:9.1f} ms, {run['errors']} erreur(s)", file=sys.stderr)
+            runs.append(run)
+    finally:
+        get_render_service().shutdown()
+        close_all()
+
+    settings = {
+        "batch_size": sql_executor.BATCH_SIZE,
+        "max_rows": sql_executor.MAX_MEMORY_ROWS,
+        "max_bytes": sql_executor.MAX_MEMORY_BYTES,
+        "export_format": preferred_format(),
+        "render_workers": RENDER_WORKERS,
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "runs": runs}, f, ensure_ascii=False, default=str)
+    return 0
+
+
+# --- Orchestration (processus principal) -------------------------------------
+
+def ensure_database(products, args):
+    """Base de la taille demandée, générée une seule fois dans artifacts/bench/db."""
+    db_dir = os.path.join(BENCH_DIR, "db")
+    os.makedirs(db_dir, exist_ok=True)
+    command = [sys.executable, os.path.join(ROOT, "data", "init_db.py")]
+    if products:
+        name = f"boutique_{products}_v{args.variants_per_product:g}_b{args.brands}_s{args.seed}.db"
+        command += ["--products", str(products), "--variants-per-product", str(args.variants_per_product),
+                    "--brands", str(args.brands), "--seed", str(args.seed)]
+    else:
+        name = "boutique_demo.db"
+    db_path = os.path.join(db_dir, name)
+    if not os.path.exists(db_path):
+        # Génération sous un nom temporaire : une génération interrompue n'est pas réutilisée
+        tmp = f"{db_path}.tmp"
+        print(f"  Génération de {name}...")
+        subprocess.run(command + ["--db", tmp], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        os.replace(tmp, db_path)
+    return db_path
+
+
+def describe_database(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = {table: conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                for table in ("marques", "produits", "stocks")}
+    finally:
+        conn.close()
+    return {"path": os.path.relpath(db_path, ROOT), "bytes": os.path.getsize(db_path), "rows": rows}
+
+
+def _git(*command):
+    try:
+        return subprocess.run(["git", *command], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import numpy
+    import pandas
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+    }
+
+
+def run_size(products, args):
+    db_path = ensure_database(products, args)
+    print(f"  {products or 'démo'} produits ({os.path.getsize(db_path) / 1e6:,.0f} Mo)")
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        # Dossier de travail neuf : data/boutique.db pointe vers la base mesurée
+        os.makedirs(os.path.join(workdir, "data"))
+        os.symlink(db_path, os.path.join(workdir, "data", "boutique.db"))
+        output = os.path.join(workdir, "worker.json")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker", "--worker-output", output,
+            "--concurrency", ",".join(map(str, args.concurrency)), "--repeat", str(args.repeat),
+            "--warmup", str(args.warmup), "--latency", str(args.latency), "--jitter", str(args.jitter),
+            "--chart-output", args.chart_output, "--recordings", os.path.abspath(args.recordings),
+        ]
+        subprocess.run(command, cwd=workdir, env={**os.environ, **WORKER_ENV}, check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(output, encoding="utf-8") as f:
+            measured = json.load(f)
+    return {"products": products, "database": describe_database(db_path), **measured}
+
+
+def compare(old_path, new_path):
+    """Écarts entre deux rapports (même taille, même concurrence) sur les p50 par étape et le débit."""
+    def index(path):
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+        runs = {(size["products"], run["concurrency"]): run for size in report["sizes"] for run in size["runs"]}
+        return report, runs
+
+    old_report, old_runs = index(old_path)
+    new_report, new_runs = index(new_path)
+    print(f"Avant : {old_report['environment']['commit']}  Après : {new_report['environment']['commit']}")
+
+    def line(label, before, after, unit):
+        if before is None or after is None:
+            return
+        delta = f"{(after - before) / before * 100:+7.1f} %" if before else "       -"
+        print(f"    {label:<14} {before:12.2f} {unit} -> {after:12.2f} {unit}  {delta}")
+
+    for key in sorted(old_runs.keys() & new_runs.keys()):
+        old, new = old_runs[key], new_runs[key]
+        print(f"  {key[0] or 'démo'} produits, concurrence {key[1]}")
+        line("débit", old["throughput_qps"], new["throughput_qps"], "q/s")
+        for stage in STAGES + ("end_to_end",):
+            before = (old["end_to_end"] if stage == "end_to_end" else old["stages"].get(stage)) or {}
+            after = (new["end_to_end"] if stage == "end_to_end" else new["stages"].get(stage)) or {}
+            line(stage, before.get("p50_ms"), after.get("p50_ms"), "ms")
+    for key in sorted(old_runs.keys() ^ new_runs.keys()):
+        print(f"  {key[0] or 'démo'} produits, concurrence {key[1]} : présent dans un seul rapport")
+    return 0
+
+
+def _int_list(value):
+    return [int(float(v)) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=_int_list, default=[0, 10_000, 100_000],
+                        help="nombres de produits, séparés par des virgules (0 = démo)")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=3, help="passages de chaque question par mesure")
+    parser.add_argument("--warmup", type=int, default=1, help="passages à blanc avant les mesures")
+    parser.add_argument("--latency", type=float, default=0.8, help="latence simulée du LLM (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.25, help="variation relative de la latence")
+    parser.add_argument("--chart-output", choices=["vega", "png"], default="vega")
+    parser.add_argument("--variants-per-product", type=float, default=20)
+    parser.add_argument("--brands", type=lambda v: int(float(v)), default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="chemin du rapport JSON")
+    parser.add_argument("--recordings", default=RECORDINGS, help="réponses rejouées par le modèle simulé")
+    parser.add_argument("--record-from-cache", metavar="CACHE_DB",
+                        help="écrit dans --recordings les vraies réponses du cache de requêtes, puis s'arrête")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="compare deux rapports")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+    if args.worker:
+        return run_worker(args)
+    if args.record_from_cache:
+        missing = record_from_cache(args.record_from_cache, args.recordings)
+        for question in missing:
+            print(f"Absente du cache : {question}")
+        if not missing:
+            print(f"Enregistrements : {args.recordings}")
+        return 1 if missing else 0
+
+    started = time.time()
+    report = {
+        "benchmark": "pipeline",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("sizes", "concurrency", "repeat", "warmup", "latency", "jitter", "chart_output",
+                        "variants_per_product", "brands", "seed")
+        },
+        "recordings": {
+            "path": os.path.relpath(os.path.abspath(args.recordings), ROOT),
+            "source": read_recordings(args.recordings).get("source"),
+        },
+        "sizes": [],
+    }
+    print(f"Benchmark du pipeline (LLM simulé : {args.latency:g} s ± {args.jitter:.0%})")
+    if report["recordings"]["source"] == "synthetic":
+        print("  SQL rejoué écrit à la main (voir benchmarks/README.md), pas des réponses réelles du modèle")
+    for products in args.sizes:
+        report["sizes"].append(run_size(products, args))
+    report["duration_s"] = round(time.time() - started, 1)
+
+    output = args.output or os.path.join(
+        BENCH_DIR, f"pipeline_{report['environment']['commit'] or 'nogit'}_{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"Rapport : {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
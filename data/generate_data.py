@@ -0,0 +1,195 @@
+"""
+Générateur de catalogue synthétique à grande échelle (tests de performance).
+
+Appelé par init_db.py :
+
+    python data/init_db.py --products 1e6 --variants-per-product 20 --brands 5000
+    python data/init_db.py --products 1e5 --seed 7 --db data/boutique_100k.db
+
+Les distributions imitent un vrai catalogue : popularité des marques en loi de
+Zipf, tailles centrées sur M / L, couleurs dominées par le noir et le bleu
+marine, prix log-normaux par catégorie terminés en ,90 / ,95 / ,99,
+compositions mono-matière ou mélangées, ~8 % de variantes en rupture.
+Le résultat ne dépend que des paramètres et de la graine (--seed).
+"""
+import time
+import numpy as np
+
+# Lots de génération fixes : la graine suffit à reproduire la base
+PRODUCT_CHUNK = 20_000
+
+# catégorie -> (poids, prix médian, système de tailles)
+CATEGORIES = {
+    'T-shirt': (14, 19, 'lettres'), 'Pull': (10, 45, 'lettres'), 'Chemise': (9, 39, 'lettres'),
+    'Pantalon': (9, 49, 'jean'), 'Jean': (8, 69, 'jean'), 'Robe': (7, 55, 'lettres'),
+    'Veste': (6, 89, 'lettres'), 'Sweat': (6, 42, 'lettres'), 'Manteau': (4, 149, 'lettres'),
+    'Jupe': (4, 39, 'lettres'), 'Short': (4, 25, 'jean'), 'Chaussures': (6, 79, 'pointures'),
+    'Accessoire': (5, 22, 'unique'), 'Sous-vêtement': (5, 15, 'lettres'), 'Maillot de bain': (3, 29, 'lettres'),
+}
+# système -> (tailles, poids)
+SIZE_SYSTEMS = {
+    'lettres': (['XS', 'S', 'M', 'L', 'XL', 'XXL', '3XL'], [6, 18, 28, 25, 14, 6, 3]),
+    'jean': (['28/32', '29/32', '30/32', '31/32', '32/32', '33/32', '34/32', '36/34', '38/34'],
+             [4, 7, 14, 15, 18, 14, 13, 9, 6]),
+    'pointures': ([str(s) for s in range(36, 47)], [3, 5, 8, 10, 12, 13, 13, 12, 10, 8, 6]),
+    'unique': (['TU'], [1]),
+}
+COLORS = (['Noir', 'Bleu Marine', 'Blanc', 'Gris', 'Beige', 'Bleu', 'Écru', 'Kaki', 'Bordeaux', 'Rouge',
+           'Vert', 'Marron', 'Rose', 'Camel', 'Jaune', 'Orange', 'Violet', 'Bleu Stone', 'Anthracite', 'Turquoise'],
+          [18, 14, 12, 10, 7, 6, 5, 4, 3, 3, 3, 3, 2.5, 2, 1.5, 1, 1, 1, 1, 0.5])
+MATERIALS = (['Coton', 'Polyester', 'Laine', 'Denim', 'Viscose', 'Lin', 'Cuir', 'Cachemire', 'Soie', 'Mérinos', 'Nylon'],
+             [34, 18, 9, 9, 8, 6, 4, 3, 2, 4, 3])
+BLENDS = ['Polyester', 'Élasthanne', 'Acrylique', 'Nylon', 'Viscose']
+GENRES = (['Femme', 'Homme', 'Unisexe'], [45, 40, 15])
+COUNTRIES = (['France', 'Italie', 'Espagne', 'USA', 'Japon', 'Suède', 'Allemagne', 'Royaume-Uni', 'Portugal', 'Danemark'],
+             [22, 14, 12, 12, 8, 7, 7, 7, 6, 5])
+STYLES = ['Classique', 'Oversize', 'Slim', 'Regular', 'Col V', 'Col Rond', 'Torsadé', 'Côtelé', 'Vintage', 'Essentiel',
+          'Premium', 'Sport', 'Urbain', 'Hiver', 'Été', 'Léger', 'Chiné', 'Brodé', 'Imprimé', 'Uni']
+DESCRIPTIONS = ['Coupe {style} en {matiere}', 'Le {categorie} {style} indémodable', '{categorie} en {matiere} doux et résistant',
+                'Maille fine, finitions soignées', 'Pièce {style} pour tous les jours', 'Édition limitée, {matiere} premium']
+BRAND_ROOTS = ['Nord', 'Atelier', 'Maison', 'Urban', 'Blue', 'Alpha', 'Studio', 'Verde', 'Linea', 'Terra', 'Sol',
+               'Nova', 'Riva', 'Hanami', 'Fjord', 'Oak', 'Luna', 'Marin', 'Kaze', 'Vela']
+BRAND_SUFFIXES = ['', ' & Co', ' Paris', ' Studio', ' Denim', ' Knit', ' Basics', ' Lab', ' Mode', ' Wear']
+
+
+def _weights(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def _pick(rng, choices, n):
+    """Tirage pondéré de n éléments (tableau d'objets)."""
+    values, weights = choices
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=_weights(weights))]
+
+
+def _brands(rng, count):
+    names = []
+    seen = set()
+    for i in range(count):
+        name = f"{BRAND_ROOTS[rng.integers(len(BRAND_ROOTS))]}{BRAND_SUFFIXES[rng.integers(len(BRAND_SUFFIXES))]}"
+        # Noms uniques (UNIQUE sur nom_marque) : numéro ajouté en cas de doublon
+        if name in seen:
+            name = f"{name} {i + 1}"
+        seen.add(name)
+        names.append(name)
+    countries = _pick(rng, COUNTRIES, count).tolist()
+    return list(zip(range(1, count + 1), names, countries))
+
+
+def _products(rng, first_id, count, brand_weights):
+    categories = list(CATEGORIES)
+    cat_index = rng.choice(len(categories), size=count, p=_weights([c[0] for c in CATEGORIES.values()]))
+    brand_ids = rng.choice(len(brand_weights), size=count, p=brand_weights) + 1
+    materials = _pick(rng, MATERIALS, count)
+    styles = np.asarray(STYLES, dtype=object)[rng.integers(len(STYLES), size=count)]
+    genres = _pick(rng, GENRES, count)
+    # Prix log-normal autour du prix médian de la catégorie, terminé en ,90 / ,95 / ,99
+    median = np.array([c[1] for c in CATEGORIES.values()])[cat_index]
+    prices = np.maximum(np.round(median * rng.lognormal(0, 0.45, size=count)), 5)
+    prices = prices - rng.choice([0.10, 0.05, 0.01], size=count, p=[0.5, 0.3, 0.2])
+    # Composition : mono-matière (60 %) ou mélange avec une fibre secondaire
+    share = rng.choice([100, 95, 80, 70, 60, 50], size=count, p=[0.6, 0.1, 0.12, 0.08, 0.05, 0.05])
+    blends = np.asarray(BLENDS, dtype=object)[rng.integers(len(BLENDS), size=count)]
+    templates = rng.integers(len(DESCRIPTIONS), size=count)
+
+    rows = []
+    for i in range(count):
+        product_id = first_id + i
+        categorie = categories[cat_index[i]]
+        matiere = materials[i]
+        composition = f"100% {matiere}" if share[i] == 100 else f"{share[i]}% {matiere}, {100 - share[i]}% {blends[i]}"
+        rows.append((
+            product_id,
+            f"{categorie[0]}{product_id:08d}",
+            f"{categorie} {styles[i]} {matiere}",
+            DESCRIPTIONS[templates[i]].format(style=styles[i].lower(), matiere=matiere.lower(), categorie=categorie.lower()),
+            matiere,
+            composition,
+            round(float(prices[i]), 2),
+            genres[i],
+            int(cat_index[i]) + 1,
+            int(brand_ids[i]),
+        ))
+    return rows, cat_index
+
+
+def _stocks(rng, first_id, product_ids, cat_index, variants_per_product):
+    # Nombre de variantes par produit : 1 + Poisson (moyenne variants_per_product)
+    counts = 1 + rng.poisson(max(variants_per_product - 1, 0), size=len(product_ids))
+    owners = np.repeat(product_ids, counts)
+    systems = np.repeat(np.array([CATEGORIES[c][2] for c in CATEGORIES], dtype=object)[cat_index], counts)
+    n = len(owners)
+
+    sizes = np.empty(n, dtype=object)
+    for system, choices in SIZE_SYSTEMS.items():
+        mask = systems == system
+        if mask.any():
+            sizes[mask] = _pick(rng, choices, int(mask.sum()))
+    colors = _pick(rng, COLORS, n)
+    # Quantités très asymétriques, ~8 % de ruptures
+    quantities = rng.negative_binomial(1.2, 0.08, size=n)
+    quantities[rng.random(n) < 0.08] = 0
+    locations = [f"{chr(65 + a)}{b}" for a, b in zip(rng.integers(8, size=n), rng.integers(1, 21, size=n))]
+
+    return list(zip(
+        range(first_id, first_id + n), owners.tolist(), sizes.tolist(), colors.tolist(),
+        quantities.tolist(), locations,
+    ))
+
+
+def generate(conn, products, variants_per_product=20, brands=5000, seed=0):
+    """
+    Remplit une base vide (schéma de init_db.py) : catégories, marques, produits, stocks.
+    Insertion en lots (executemany) dans une transaction par lot ; journal et
+    synchronisation désactivés pendant le chargement.
+
+    Returns:
+        dict: nombre de lignes par table et durée
+    """
+    started = time.perf_counter()
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    # Identifiants explicites et cohérents par construction : pas de contrôle ligne à ligne
+    conn.execute("PRAGMA foreign_keys = OFF")
+
+    rng = np.random.default_rng(seed)
+    with conn:
+        conn.executemany("INSERT INTO categories (id, nom_categorie) VALUES (?, ?)",
+                         list(enumerate(CATEGORIES, start=1)))
+        conn.executemany("INSERT INTO marques (id, nom_marque, pays) VALUES (?, ?, ?)", _brands(rng, brands))
+    # Popularité des marques : loi de Zipf (quelques marques portent l'essentiel du catalogue)
+    brand_weights = _weights(1 / np.arange(1, brands + 1) ** 1.1)
+
+    stock_id = 1
+    for chunk, first in enumerate(range(1, products + 1, PRODUCT_CHUNK)):
+        count = min(PRODUCT_CHUNK, products - first + 1)
+        chunk_rng = np.random.default_rng([seed, chunk])
+        product_rows, cat_index = _products(chunk_rng, first, count, brand_weights)
+        stock_rows = _stocks(chunk_rng, stock_id, np.arange(first, first + count), cat_index, variants_per_product)
+        with conn:
+            conn.executemany(
+                "INSERT INTO produits (id, reference_interne, nom_modele, description, matiere_principale, "
+                "composition, prix_public, genre, categorie_id, marque_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                product_rows
+            )
+            conn.executemany(
+                "INSERT INTO stocks (id, produit_id, taille, couleur, quantite_disponible, emplacement_entrepot) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                stock_rows
+            )
+        stock_id += len(stock_rows)
+        done = first + count - 1
+        elapsed = time.perf_counter() - started
+        print(f"\r  {done:,}/{products:,} produits, {stock_id - 1:,} variantes ({elapsed:.0f}s)", end="", flush=True)
+    print()
+
+    return {
+        'categories': len(CATEGORIES),
+        'marques': brands,
+        'produits': products,
+        'stocks': stock_id - 1,
+        'seconds': round(time.perf_counter() - started, 1),
+    }
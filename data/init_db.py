@@ -1,10 +1,93 @@
 import sqlite3
+import argparse
 import os
+import sys
 
-db_file = "data/boutique.db"
+# Index plein texte et agrégats (modules de l'agent)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agent"))
+from text_search import create_text_index
+from stock_aggregates import create_aggregates
 
-if os.path.exists(db_file):
-    os.remove(db_file)
+
+# --- SEEDING (Remplissage) ---
+def seed_demo(cursor):
+    """Petit catalogue de démonstration (4 produits, 11 variantes)."""
+    # A. Catégories
+    cats = [('Pull',), ('Pantalon',), ('Veste',), ('Accessoire',)]
+    cursor.executemany("INSERT INTO categories (nom_categorie) VALUES (?)", cats)
+
+    # B. Marques
+    brands = [('Zara', 'Espagne'), ('Uniqlo', 'Japon'), ('Levi\'s', 'USA'), ('H&M', 'Suède')]
+    cursor.executemany("INSERT INTO marques (nom_marque, pays) VALUES (?, ?)", brands)
+
+    # Récupération des ID pour les liaisons
+    cursor.execute("SELECT id, nom_categorie FROM categories")
+    cat_map = {nom: id for id, nom in cursor.fetchall()} # {'Pull': 1, 'Pantalon': 2...}
+
+    cursor.execute("SELECT id, nom_marque FROM marques")
+    brand_map = {nom: id for id, nom in cursor.fetchall()}
+
+    # C. Produits (Catalogue)
+    produits_data = [
+        # ref, nom, desc, matiere, compo, prix, genre, cat_id, brand_id
+        ('P001', 'Pull Col V Mérinos', 'Pull fin classique', 'Laine', '100% Mérinos', 49.90, 'Homme', cat_map['Pull'], brand_map['Uniqlo']),
+        ('P002', 'Sweat Oversize', 'Sweat à capuche street', 'Coton', '80% Coton, 20% Poly', 35.00, 'Unisexe', cat_map['Pull'], brand_map['H&M']),
+        ('J001', 'Jean 501 Original', 'Le classique indémodable', 'Denim', '100% Coton', 99.00, 'Homme', cat_map['Pantalon'], brand_map['Levi\'s']),
+        ('P003', 'Pull Torsadé Hiver', 'Grosse maille chaude', 'Laine', '50% Laine, 50% Acrylique', 59.95, 'Femme', cat_map['Pull'], brand_map['Zara'])
+    ]
+
+    cursor.executemany('''
+        INSERT INTO produits (reference_interne, nom_modele, description, matiere_principale, composition, prix_public, genre, categorie_id, marque_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', produits_data)
+
+    # D. Stocks (Variantes Taille/Couleur)
+    # On doit récupérer les ID des produits qu'on vient de créer
+    cursor.execute("SELECT id, reference_interne FROM produits")
+    prod_map = {ref: id for id, ref in cursor.fetchall()}
+
+    stocks_data = [
+        # Le Pull Mérinos (P001) existe en plusieurs variantes
+        (prod_map['P001'], 'M', 'Gris', 10, 'A1'),
+        (prod_map['P001'], 'L', 'Gris', 5, 'A1'),
+        (prod_map['P001'], 'M', 'Bleu Marine', 8, 'A2'),
+        (prod_map['P001'], 'XL', 'Bleu Marine', 2, 'A2'),
+
+        # Le Sweat H&M (P002)
+        (prod_map['P002'], 'S', 'Noir', 20, 'B1'),
+        (prod_map['P002'], 'M', 'Noir', 15, 'B1'),
+
+        # Le Jean Levi's (J001) - Tailles américaines
+        (prod_map['J001'], '30/32', 'Bleu Stone', 12, 'C1'),
+        (prod_map['J001'], '32/32', 'Bleu Stone', 8, 'C1'),
+
+        # Le Pull Zara (P003)
+        (prod_map['P003'], 'S', 'Écru', 6, 'D4'),
+        (prod_map['P003'], 'M', 'bleu', 6, 'D4'),
+        (prod_map['P003'], 'M', 'Écru', 0, 'D4') # Rupture de stock pour tester l'IA
+    ]
+
+    cursor.executemany('''
+        INSERT INTO stocks (produit_id, taille, couleur, quantite_disponible, emplacement_entrepot)
+        VALUES (?, ?, ?, ?, ?)
+    ''', stocks_data)
+
+
+parser = argparse.ArgumentParser(description="Crée la base boutique (démo, ou catalogue synthétique avec --products).")
+parser.add_argument("--db", default="data/boutique.db")
+parser.add_argument("--products", type=lambda v: int(float(v)), default=0,
+                    help="nombre de produits synthétiques (ex. 1e6) ; 0 = catalogue de démonstration")
+parser.add_argument("--variants-per-product", type=float, default=20)
+parser.add_argument("--brands", type=lambda v: int(float(v)), default=5000)
+parser.add_argument("--seed", type=int, default=0)
+args = parser.parse_args()
+
+db_file = args.db
+
+# Fichiers -wal / -shm d'une ancienne base : seraient rejoués sur la nouvelle
+for path in (db_file, db_file + "-wal", db_file + "-shm"):
+    if os.path.exists(path):
+        os.remove(path)
 
 conn = sqlite3.connect(db_file)
 cursor = conn.cursor()
@@ -60,71 +143,36 @@ CREATE TABLE stocks (
 );
 ''')
 
-# --- SEEDING (Remplissage) ---
-
-print("Injection des données...")
-
-# A. Catégories
-cats = [('Pull',), ('Pantalon',), ('Veste',), ('Accessoire',)]
-cursor.executemany("INSERT INTO categories (nom_categorie) VALUES (?)", cats)
-
-# B. Marques
-brands = [('Zara', 'Espagne'), ('Uniqlo', 'Japon'), ('Levi\'s', 'USA'), ('H&M', 'Suède')]
-cursor.executemany("INSERT INTO marques (nom_marque, pays) VALUES (?, ?)", brands)
-
-# Récupération des ID pour les liaisons
-cursor.execute("SELECT id, nom_categorie FROM categories")
-cat_map = {nom: id for id, nom in cursor.fetchall()} # {'Pull': 1, 'Pantalon': 2...}
-
-cursor.execute("SELECT id, nom_marque FROM marques")
-brand_map = {nom: id for id, nom in cursor.fetchall()}
-
-# C. Produits (Catalogue)
-produits_data = [
-    # ref, nom, desc, matiere, compo, prix, genre, cat_id, brand_id
-    ('P001', 'Pull Col V Mérinos', 'Pull fin classique', 'Laine', '100% Mérinos', 49.90, 'Homme', cat_map['Pull'], brand_map['Uniqlo']),
-    ('P002', 'Sweat Oversize', 'Sweat à capuche street', 'Coton', '80% Coton, 20% Poly', 35.00, 'Unisexe', cat_map['Pull'], brand_map['H&M']),
-    ('J001', 'Jean 501 Original', 'Le classique indémodable', 'Denim', '100% Coton', 99.00, 'Homme', cat_map['Pantalon'], brand_map['Levi\'s']),
-    ('P003', 'Pull Torsadé Hiver', 'Grosse maille chaude', 'Laine', '50% Laine, 50% Acrylique', 59.95, 'Femme', cat_map['Pull'], brand_map['Zara'])
-]
-
-cursor.executemany('''
-    INSERT INTO produits (reference_interne, nom_modele, description, matiere_principale, composition, prix_public, genre, categorie_id, marque_id)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-''', produits_data)
-
-# D. Stocks (Variantes Taille/Couleur)
-# On doit récupérer les ID des produits qu'on vient de créer
-cursor.execute("SELECT id, reference_interne FROM produits")
-prod_map = {ref: id for id, ref in cursor.fetchall()}
-
-stocks_data = [
-    # Le Pull Mérinos (P001) existe en plusieurs variantes
-    (prod_map['P001'], 'M', 'Gris', 10, 'A1'),
-    (prod_map['P001'], 'L', 'Gris', 5, 'A1'),
-    (prod_map['P001'], 'M', 'Bleu Marine', 8, 'A2'),
-    (prod_map['P001'], 'XL', 'Bleu Marine', 2, 'A2'),
-    
-    # Le Sweat H&M (P002)
-    (prod_map['P002'], 'S', 'Noir', 20, 'B1'),
-    (prod_map['P002'], 'M', 'Noir', 15, 'B1'),
-    
-    # Le Jean Levi's (J001) - Tailles américaines
-    (prod_map['J001'], '30/32', 'Bleu Stone', 12, 'C1'),
-    (prod_map['J001'], '32/32', 'Bleu Stone', 8, 'C1'),
-    
-    # Le Pull Zara (P003)
-    (prod_map['P003'], 'S', 'Écru', 6, 'D4'),
-    (prod_map['P003'], 'M', 'bleu', 6, 'D4'),
-    (prod_map['P003'], 'M', 'Écru', 0, 'D4') # Rupture de stock pour tester l'IA
-]
-
-cursor.executemany('''
-    INSERT INTO stocks (produit_id, taille, couleur, quantite_disponible, emplacement_entrepot)
-    VALUES (?, ?, ?, ?, ?)
-''', stocks_data)
+if args.products:
+    # Catalogue synthétique (tests de performance), chargé en masse
+    from generate_data import generate
+    print(f"Génération de {args.products:,} produits (graine {args.seed})...")
+    stats = generate(conn, args.products, args.variants_per_product, args.brands, args.seed)
+else:
+    print("Injection des données...")
+    seed_demo(cursor)
 
 conn.commit()
+
+# Index plein texte (FTS5) sur les textes des produits, tenu à jour par triggers
+create_text_index(conn)
+# Agrégats de stock pré-calculés (par marque, catégorie, taille, produit), tenus à jour par triggers
+create_aggregates(conn)
+# Journal WAL (réglage persistant du fichier) : les lectures de l'agent, en lecture
+# seule, ne bloquent pas les écritures et ne sont pas bloquées par elles
+conn.execute("PRAGMA journal_mode = WAL")
+
+if args.products:
+    # Statistiques de l'optimiseur (et des estimations de coût du garde-fou SQL)
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    size = os.path.getsize(db_file) / 1e6
+    print(f"Base '{db_file}' générée : {stats['produits']:,} produits, {stats['stocks']:,} variantes, "
+          f"{stats['marques']:,} marques ({size:,.0f} Mo, chargement {stats['seconds']:.0f} s).")
+    sys.exit(0)
+
 print("Base de données 'boutique_complexe.db' générée avec succès.")
 
 # Test visuel : Jointure pour voir l'inventaire complet
@@ -0,0 +1,46 @@
+"""
+Fixtures communes : base générée par data/init_db.py (catalogue synthétique de
+data/generate_data.py, index plein texte, agrégats, WAL), une fois par session.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules de l'agent importés à plat, comme depuis agent/
+sys.path.insert(0, os.path.join(ROOT, "agent"))
+
+TEST_PRODUCTS = 2_000
+TEST_BRANDS = 50
+
+
+def build_db(path, products=TEST_PRODUCTS, brands=TEST_BRANDS, seed=0):
+    """Crée une base avec init_db.py (script de ligne de commande)."""
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "data", "init_db.py"), "--db", str(path),
+         "--products", str(products), "--brands", str(brands), "--seed", str(seed)],
+        check=True, capture_output=True, cwd=ROOT,
+    )
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def generated_db(tmp_path_factory):
+    """Base générée partagée, à ne lire qu'en lecture seule."""
+    return build_db(tmp_path_factory.mktemp("db") / "boutique.db")
+
+
+@pytest.fixture
+def writable_db(tmp_path):
+    """Base générée propre au test (modifications autorisées)."""
+    return build_db(tmp_path / "boutique.db", products=500, brands=20)
+
+
+@pytest.fixture
+def read_conn(generated_db):
+    conn = sqlite3.connect(f"file:{generated_db}?mode=ro", uri=True)
+    yield conn
+    conn.close()
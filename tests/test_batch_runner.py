@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import batch_runner
+
+
+def _question(qid):
+    return {'id': qid, 'question': f"question {qid}"}
+
+
+def _failure(error, transient):
+    return {'success': False, 'sql': None, 'viz_type': None, 'row_count': 0, 'truncated': False,
+            'columns': [], 'viz_path': None, 'llm_calls': None, 'result_id': None,
+            'error': error, 'is_transient': transient}
+
+
+def test_record_flags_transient_failures():
+    started = 0.0
+    quota = batch_runner._record(_question("a"), _failure("429 Resource exhausted", True), 4, started)
+    sql = batch_runner._record(_question("b"), _failure("no such column: prix_ht", False), 1, started)
+    assert quota['is_transient'] is True
+    assert sql['is_transient'] is False
+
+
+def test_resume_retries_only_transient_and_unfinished(tmp_path, monkeypatch):
+    journal = tmp_path / "nuit.jsonl"
+    questions = [_question(qid) for qid in ("ok", "quota", "sql", "ancien", "nouveau")]
+    previous = [
+        {'id': "ok", 'success': True, 'error': None, 'is_transient': False},
+        {'id': "quota", 'success': False, 'error': "429 quota", 'is_transient': True},
+        {'id': "sql", 'success': False, 'error': "Requête refusée : plan trop coûteux", 'is_transient': False},
+        # Journal écrit avant le champ is_transient : classé d'après le message
+        {'id': "ancien", 'success': False, 'error': "503 Service Unavailable"},
+    ]
+    journal.write_text("".join(json.dumps(r) + "\n" for r in previous), encoding="utf-8")
+
+    done = []
+
+    async def fake_run_question(question, semaphore, agent=None, max_attempts=1):
+        done.append(question['id'])
+        return {'id': question['id'], 'question': question['question'], 'success': True,
+                'error': None, 'is_transient': False, 'duration_s': 0.0}
+
+    monkeypatch.setattr(batch_runner, "run_question", fake_run_question)
+    manifest = asyncio.run(batch_runner.run_batch(questions, str(journal)))
+
+    assert sorted(done) == ["ancien", "nouveau", "quota"]
+    assert manifest['failed'] == 1
+
+    done.clear()
+    records = batch_runner.read_journal(str(journal))
+    assert batch_runner.pending_questions(questions, records) == []
+    assert batch_runner.pending_questions(questions, records, retry_deterministic=True) == [questions[2]]
+    assert batch_runner.pending_questions(questions, records, retry_failed=False) == []
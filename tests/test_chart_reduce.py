@@ -0,0 +1,22 @@
+import pandas as pd
+
+from chart_reduce import MAX_SLICES, OTHER_LABEL, reduce_for_chart
+
+
+def test_top_n_keeps_query_order():
+    # ORDER BY mois : le top doit rester chronologique, « Autres » en dernier
+    months = [f"2024-{m:02d}" for m in range(1, 13)]
+    sales = [5, 120, 7, 90, 3, 150, 1, 80, 60, 2, 110, 4]
+    df = pd.DataFrame({'mois': months, 'ventes': sales})
+
+    reduced, note = reduce_for_chart('donut', df)
+
+    kept = reduced['mois'].tolist()
+    assert len(reduced) == MAX_SLICES
+    assert kept[-1] == OTHER_LABEL
+    assert kept[:-1] == sorted(kept[:-1])
+    top = set(df.nlargest(MAX_SLICES - 1, 'ventes')['mois'])
+    assert set(kept[:-1]) == top
+    assert reduced['ventes'].iloc[-1] == df.loc[~df['mois'].isin(top), 'ventes'].sum()
+    assert reduced['ventes'].sum() == df['ventes'].sum()
+    assert note
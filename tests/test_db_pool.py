@@ -0,0 +1,27 @@
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+import db_pool
+
+
+def test_thread_connections_closed_when_thread_ends(generated_db):
+    opened = []
+    worker = threading.Thread(target=lambda: opened.append(db_pool.get_connection(generated_db)))
+    worker.start()
+    worker.join()
+    conn = opened[0]
+    assert conn in db_pool._all_connections
+
+    del worker
+    gc.collect()
+
+    assert conn not in db_pool._all_connections
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_connection_reused_within_thread(generated_db):
+    assert db_pool.get_connection(generated_db) is db_pool.get_connection(generated_db)
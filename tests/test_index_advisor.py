@@ -0,0 +1,62 @@
+import json
+import os
+import sqlite3
+
+from conftest import ROOT
+from index_advisor import INDEX_PREFIX, advise, apply_indexes, create_index_sql
+
+
+def recorded_workload():
+    with open(os.path.join(ROOT, "benchmarks", "recorded_sql.json"), encoding="utf-8") as f:
+        return [(entry['sql'], 1) for entry in json.load(f)['responses']]
+
+
+def _index_keys(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        indexes = conn.execute(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND name LIKE ?", (f"{INDEX_PREFIX}%",)
+        ).fetchall()
+        return {name: (table, [r[2] for r in conn.execute(f'PRAGMA index_info("{name}")')])
+                for name, table in indexes}
+    finally:
+        conn.close()
+
+
+def _prefix_pairs(keys):
+    """Couples (préfixe, index) sur une même table."""
+    return [
+        (short, long) for short, (t1, c1) in keys.items() for long, (t2, c2) in keys.items()
+        if short != long and t1 == t2 and len(c1) < len(c2) and c2[:len(c1)] == c1
+    ]
+
+
+def test_no_recommendation_is_a_prefix_of_another(writable_db):
+    report = advise(recorded_workload(), writable_db)
+    keys = {rec['name']: (rec['table'], rec['columns']) for rec in report['recommendations']}
+    assert any(rec['table'] == 'produits' and rec['columns'][0] == 'categorie_id' for rec in report['recommendations'])
+    assert _prefix_pairs(keys) == []
+
+    apply_indexes(report['recommendations'], writable_db, report['dropped'])
+    assert _prefix_pairs(_index_keys(writable_db)) == []
+
+
+def test_existing_auto_prefix_is_dropped(writable_db):
+    conn = sqlite3.connect(writable_db)
+    try:
+        with conn:
+            conn.execute(create_index_sql('produits', ('categorie_id',)))
+    finally:
+        conn.close()
+    prefix = f"{INDEX_PREFIX}produits_categorie_id"
+
+    report = advise(recorded_workload(), writable_db)
+    wider = [rec for rec in report['recommendations']
+             if rec['table'] == 'produits' and rec['columns'][:1] == ['categorie_id']]
+    assert wider and len(wider[0]['columns']) > 1
+    assert [rec['name'] for rec in report['dropped']] == [prefix]
+
+    apply_indexes(report['recommendations'], writable_db, report['dropped'])
+    created = _index_keys(writable_db)
+    assert prefix not in created
+    assert wider[0]['name'] in created
@@ -0,0 +1,106 @@
+import sqlite3
+import zlib
+
+import pytest
+
+from conftest import build_db
+from query_cache import QueryCache, normalize_question, schema_fingerprint
+
+QUESTION = "Donne le nombre total de pièces en stock par marque, classé du plus grand au plus petit."
+SPEC = {"sql": "SELECT marque_id, quantite_totale FROM agg_stock_marque", "viz_type": "Bar Charts"}
+
+
+@pytest.fixture
+def cache(tmp_path, writable_db):
+    cache = QueryCache(path=str(tmp_path / "query_cache.db"), db_path=writable_db)
+    cache.put(QUESTION, SPEC)
+    return cache
+
+
+def _execute(db_path, sql):
+    # Connexion d'écriture séparée, sans checkpoint : le DDL reste dans le fichier -wal
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(sql)
+    finally:
+        conn.close()
+
+
+def test_hit_on_normalized_question(cache):
+    assert cache.get(QUESTION) == SPEC
+    assert cache.get("  donne le nombre total de pieces en stock par marque, classe du plus grand au plus petit ") == SPEC
+    assert cache.stats()["hits"] == 2
+
+
+def test_index_keeps_entries(cache, writable_db):
+    before = schema_fingerprint(writable_db)
+    _execute(writable_db, "CREATE INDEX idx_test_stocks_couleur ON stocks (couleur)")
+    assert schema_fingerprint(writable_db) == before
+    assert cache.get(QUESTION) == SPEC
+
+
+def test_schema_change_invalidates(cache, writable_db):
+    before = schema_fingerprint(writable_db)
+    _execute(writable_db, "ALTER TABLE produits ADD COLUMN saison TEXT")
+    assert schema_fingerprint(writable_db) != before
+    assert cache.get(QUESTION) is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["size"] == 0
+
+
+def test_recreated_database_invalidates(cache, writable_db):
+    # Base recréée par init_db.py (nouveau fichier) avec une table de plus
+    build_db(writable_db, products=500, brands=20)
+    _execute(writable_db, "CREATE TABLE promotions (id INTEGER PRIMARY KEY, remise REAL)")
+    assert cache.get(QUESTION) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+class _CountingEmbedder:
+    """Embeddings factices (sac de mots) ; vérifie qu'aucun appel n'a lieu sous le verrou du cache."""
+
+    def __init__(self):
+        self.calls = 0
+        self.locked_calls = 0
+        self.cache = None
+
+    def __call__(self, question):
+        # Une exception serait avalée par le cache (_embed) : on compte
+        self.locked_calls += self.cache._lock.locked()
+        self.calls += 1
+        vector = [0.0] * 64
+        for word in normalize_question(question).split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+
+@pytest.fixture
+def semantic_cache(tmp_path, writable_db):
+    embedder = _CountingEmbedder()
+    cache = QueryCache(path=str(tmp_path / "query_cache.db"), db_path=writable_db,
+                       embed_fn=embedder, similarity_threshold=0.8)
+    embedder.cache = cache
+    return cache, embedder
+
+
+def test_miss_embeds_once_outside_lock(semantic_cache):
+    cache, embedder = semantic_cache
+    assert cache.get(QUESTION) is None
+    cache.put(QUESTION, SPEC)
+    assert embedder.calls == 1
+    # Reformulation proche : trouvée par similarité, un seul embedding de plus
+    assert cache.get("Donne le nombre total de pièces en stock par marque, du plus grand au plus petit") == SPEC
+    assert embedder.calls == 2
+    assert embedder.locked_calls == 0
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_put_without_get_embeds(semantic_cache):
+    cache, embedder = semantic_cache
+    cache.put(QUESTION, SPEC)
+    assert embedder.calls == 1
+    assert cache.get(QUESTION) == SPEC
+    assert embedder.calls == 1
+    assert embedder.locked_calls == 0
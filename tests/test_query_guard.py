@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import sqlite3
+
+import pytest
+
+from conftest import ROOT
+from query_guard import MAX_PLAN_COST, QueryRejected, check_query, ensure_limit, estimate_cost, explain
+
+# Volumes du catalogue généré de 1e6 produits (calibrage de MAX_PLAN_COST)
+SCALE_1E6 = {
+    'categories': 15, 'marques': 5_000, 'produits': 1_000_000, 'stocks': 20_000_000,
+    'produits_fts': 1_000_000, 'agg_stock_produit': 1_000_000, 'agg_stock_marque': 5_000,
+    'agg_stock_categorie': 15, 'agg_stock_taille': 28, 'agg_produit_tailles': 7_000_000,
+    'agg_produit_couleurs': 11_000_000,
+}
+
+# Réponse attendue sur les tables de base, dans l'ordre de data/user_input.txt
+BASE_SQL = [
+    "SELECT p.id, p.nom_modele FROM produits p LEFT JOIN stocks s ON s.produit_id = p.id "
+    "GROUP BY p.id, p.nom_modele HAVING COALESCE(SUM(s.quantite_disponible), 0) = 0",
+    "SELECT m.nom_marque, COUNT(s.id) AS total_variantes FROM marques m JOIN produits p ON p.marque_id = m.id "
+    "JOIN stocks s ON s.produit_id = p.id GROUP BY m.id, m.nom_marque HAVING COUNT(s.id) > 20 ORDER BY total_variantes DESC",
+    "SELECT p.nom_modele, COUNT(DISTINCT s.couleur) AS nombre_couleurs FROM produits p JOIN stocks s ON s.produit_id = p.id "
+    "GROUP BY p.id, p.nom_modele HAVING COUNT(DISTINCT s.couleur) >= 5",
+    "SELECT c.nom_categorie FROM categories c JOIN produits p ON p.categorie_id = c.id "
+    "GROUP BY c.id, c.nom_categorie HAVING MIN(p.prix_public) > 100",
+    "SELECT nom_modele, composition, prix_public FROM produits WHERE composition LIKE '%coton%' ORDER BY prix_public DESC",
+    "SELECT m.nom_marque, SUM(s.quantite_disponible) AS total_stock FROM stocks s JOIN produits p ON s.produit_id = p.id "
+    "JOIN marques m ON p.marque_id = m.id GROUP BY m.id, m.nom_marque ORDER BY total_stock DESC",
+    "SELECT p.nom_modele, COUNT(DISTINCT s.taille) AS nombre_tailles FROM produits p JOIN stocks s ON s.produit_id = p.id "
+    "GROUP BY p.id, p.nom_modele HAVING COUNT(DISTINCT s.taille) >= 3 AND COUNT(DISTINCT s.couleur) = 1",
+    "WITH moyennes AS (SELECT categorie_id, AVG(prix_public) AS prix_moyen FROM produits GROUP BY categorie_id) "
+    "SELECT p.nom_modele, p.prix_public FROM produits p JOIN moyennes mo ON mo.categorie_id = p.categorie_id "
+    "WHERE p.prix_public > mo.prix_moyen",
+    "SELECT m.nom_marque, MIN(p.prix_public) AS prix_minimum, MAX(p.prix_public) AS prix_maximum, "
+    "AVG(p.prix_public) AS prix_moyen FROM produits p JOIN marques m ON p.marque_id = m.id GROUP BY m.id, m.nom_marque",
+    "SELECT p.nom_modele, p.matiere_principale, c.nom_categorie FROM produits p JOIN categories c ON c.id = p.categorie_id "
+    "WHERE p.matiere_principale IN (SELECT matiere_principale FROM produits GROUP BY matiere_principale "
+    "HAVING COUNT(DISTINCT categorie_id) > 1)",
+    "SELECT c.nom_categorie, SUM(s.quantite_disponible) AS total_stock FROM categories c "
+    "JOIN produits p ON p.categorie_id = c.id JOIN stocks s ON s.produit_id = p.id "
+    "GROUP BY c.id, c.nom_categorie HAVING SUM(s.quantite_disponible) < 10",
+]
+
+# Question 8 en sous-requête corrélée : sans index sur categorie_id, produits est reparcouru à chaque ligne
+CORRELATED_SQL = (
+    "SELECT p.nom_modele, p.prix_public FROM produits p WHERE p.prix_public > "
+    "(SELECT AVG(p2.prix_public) FROM produits p2 WHERE p2.categorie_id = p.categorie_id)"
+)
+
+
+def user_questions():
+    with open(os.path.join(ROOT, "data", "user_input.txt"), encoding="utf-8") as f:
+        return re.findall(r"«\s*(.+?)\s*»", f.read())
+
+
+def recorded_sql():
+    with open(os.path.join(ROOT, "benchmarks", "recorded_sql.json"), encoding="utf-8") as f:
+        return {entry['question']: entry['sql'] for entry in json.load(f)['responses']}
+
+
+def scaled_cost(conn, sql):
+    sql = ensure_limit(sql, 1000)
+    return estimate_cost(conn, sql, explain(conn, sql), SCALE_1E6)
+
+
+def test_every_question_has_sql():
+    questions = user_questions()
+    assert len(questions) == len(BASE_SQL) == 11
+    assert set(questions) <= set(recorded_sql())
+
+
+@pytest.mark.parametrize("number", range(1, 12))
+def test_user_questions_pass_guard(read_conn, number):
+    question = user_questions()[number - 1]
+    for sql in (BASE_SQL[number - 1], recorded_sql()[question]):
+        check_query(read_conn, sql, limit=1000)
+        cost, _ = scaled_cost(read_conn, sql)
+        assert cost < MAX_PLAN_COST, f"question {number} refusée à 1e6 produits (~{cost:,.0f})"
+
+
+def test_correlated_rescan_rejected(read_conn):
+    cost, warnings = scaled_cost(read_conn, CORRELATED_SQL)
+    assert cost > MAX_PLAN_COST
+    assert any("corrélée" in w for w in warnings)
+    with pytest.raises(QueryRejected) as rejected:
+        check_query(read_conn, CORRELATED_SQL, max_cost=cost / 1e6)
+    assert "CORRELATED SCALAR SUBQUERY" in rejected.value.plan_text
+
+
+def test_correlated_search_priced_per_outer_row(writable_db):
+    conn = sqlite3.connect(writable_db)
+    try:
+        rescan = estimate_cost(conn, CORRELATED_SQL, explain(conn, CORRELATED_SQL))[0]
+        conn.execute("CREATE INDEX idx_test_categorie ON produits (categorie_id, prix_public)")
+        conn.execute("ANALYZE")
+        plan = explain(conn, CORRELATED_SQL)
+        assert any(detail.startswith("SEARCH p2") for _, _, detail in plan)
+        searched = estimate_cost(conn, CORRELATED_SQL, plan)[0]
+        products, categories = conn.execute("SELECT COUNT(*), COUNT(DISTINCT categorie_id) FROM produits").fetchone()
+    finally:
+        conn.close()
+    # Une recherche dans l'index (produits de la catégorie) par ligne externe, pas un parcours de la table
+    assert searched < rescan
+    assert searched <= 4 * products * (products / categories)
+
+
+def test_group_by_priced_linearly(read_conn):
+    sql = "SELECT couleur, SUM(quantite_disponible) FROM stocks GROUP BY couleur"
+    cost, warnings = scaled_cost(read_conn, sql)
+    assert any("group by" in w for w in warnings)
+    assert cost <= 3 * SCALE_1E6['stocks']
+
+
+def test_cartesian_product_rejected(read_conn):
+    sql = "SELECT p.nom_modele, s.taille FROM produits p, stocks s"
+    cost, warnings = scaled_cost(read_conn, sql)
+    assert cost > MAX_PLAN_COST
+    assert any("cartésien" in w for w in warnings)
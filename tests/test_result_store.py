@@ -0,0 +1,31 @@
+import pandas as pd
+
+from result_store import ResultStore
+
+
+def test_same_data_different_sql_keeps_both():
+    store = ResultStore()
+    df = pd.DataFrame({"nom_marque": ["Zara", "H&M"], "total": [3, 1]})
+    first = store.put(df, "SELECT nom_marque, COUNT(*) AS total FROM a GROUP BY nom_marque")
+    second = store.put(df.copy(), "SELECT nom_marque, SUM(x) AS total FROM b GROUP BY nom_marque")
+    assert first != second
+    assert store.entry(first).sql.startswith("SELECT nom_marque, COUNT")
+    assert store.entry(second).sql.startswith("SELECT nom_marque, SUM")
+
+
+def test_same_query_reuses_entry():
+    store = ResultStore()
+    df = pd.DataFrame({"taille": ["M", "L"]})
+    sql = "SELECT taille FROM stocks"
+    assert store.put(df, sql) == store.put(df.copy(), sql)
+    assert len(store._results) == 1
+
+
+def test_eviction_frees_dedup_key():
+    store = ResultStore(max_results=1)
+    df = pd.DataFrame({"a": [1]})
+    first = store.put(df, "SELECT 1 AS a")
+    store.put(pd.DataFrame({"a": [2]}), "SELECT 2 AS a")
+    assert first not in store
+    again = store.put(df, "SELECT 1 AS a")
+    assert again != first and again in store
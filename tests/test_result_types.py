@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+import sql_executor
+from result_types import coerce_types, result_column_types, select_items
+from sql_executor import run_sql_query
+
+
+@pytest.fixture(autouse=True)
+def database(generated_db, monkeypatch):
+    monkeypatch.setattr(sql_executor, "DB_PATH", generated_db)
+
+
+def test_select_items_skips_ctes_and_subqueries():
+    sql = ("WITH m AS (SELECT a, b FROM t) SELECT DISTINCT p.nom, COUNT(*) AS taille, f(x, y) "
+           "FROM p JOIN m ON (p.a = m.a) WHERE p.id IN (SELECT id FROM q) UNION SELECT 1, 2, 3")
+    assert select_items(sql) == ["p.nom", "COUNT(*) AS taille", "f(x, y)"]
+
+
+def test_types_follow_origin_tables(generated_db):
+    sql = ("SELECT s.taille, p.prix_public AS prix, COUNT(*) AS couleur, m.nom_marque "
+           "FROM stocks s JOIN produits p ON p.id = s.produit_id JOIN marques AS m ON m.id = p.marque_id "
+           "GROUP BY s.taille, p.prix_public, m.nom_marque")
+    columns = ["taille", "prix", "couleur", "nom_marque"]
+    assert result_column_types(sql, columns, generated_db) == ["text", "real", None, "text"]
+
+
+def test_star_resolved_by_name(generated_db):
+    sql = "SELECT s.* FROM stocks s JOIN produits p ON p.id = s.produit_id"
+    types = result_column_types(sql, ["id", "produit_id", "taille", "couleur"], generated_db)
+    assert types == ["integer", "integer", "text", "text"]
+
+
+def test_computed_alias_named_like_a_column_is_inferred():
+    # « taille » est TEXT dans stocks, mais ici c'est un comptage
+    df = run_sql_query("SELECT couleur, COUNT(*) AS taille FROM stocks GROUP BY couleur")
+    assert pd.api.types.is_integer_dtype(df["taille"])
+    assert not pd.api.types.is_numeric_dtype(df["couleur"])
+
+
+def test_low_cardinality_text_becomes_category():
+    df = run_sql_query("SELECT p.genre, s.couleur FROM stocks s JOIN produits p ON p.id = s.produit_id LIMIT 2000")
+    assert isinstance(df["genre"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["couleur"].dtype, pd.CategoricalDtype)
+
+
+def test_text_sizes_stay_text():
+    df = run_sql_query("SELECT taille FROM stocks WHERE taille GLOB '[0-9]*' LIMIT 500")
+    assert not pd.api.types.is_numeric_dtype(df["taille"])
+
+
+def test_without_sql_everything_is_inferred():
+    df = coerce_types(pd.DataFrame({"taille": ["42", "44", "42", "44"]}))
+    assert pd.api.types.is_numeric_dtype(df["taille"])
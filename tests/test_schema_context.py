@@ -0,0 +1,35 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import ROOT
+from sql_generator import build_sql_prompt
+
+QUESTION = "Trouve les produits dont la composition contient du coton, triés par prix décroissant."
+
+
+@pytest.fixture
+def in_workdir(tmp_path, monkeypatch):
+    """Répertoire de travail dont data/boutique.db (chemin par défaut de l'agent) est la base donnée."""
+    def use(db_path):
+        os.makedirs(tmp_path / "data", exist_ok=True)
+        shutil.copy(db_path, tmp_path / "data" / "boutique.db")
+        monkeypatch.chdir(tmp_path)
+    return use
+
+
+def test_prompt_without_text_index_or_aggregates(in_workdir):
+    # Base livrée dans le dépôt : antérieure à l'index plein texte et aux agrégats
+    in_workdir(os.path.join(ROOT, "data", "boutique.db"))
+    prompt = build_sql_prompt(QUESTION)
+    assert "MATCH" not in prompt
+    assert "produits_fts" not in prompt
+    assert "Agrégat pré-calculé" not in prompt
+
+
+def test_prompt_with_text_index_and_aggregates(in_workdir, generated_db):
+    in_workdir(generated_db)
+    prompt = build_sql_prompt(QUESTION)
+    assert "produits_fts MATCH" in prompt
+    assert "Si une table « Agrégat pré-calculé » répond à la question" in prompt
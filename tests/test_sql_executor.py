@@ -0,0 +1,36 @@
+import pytest
+
+import sql_executor
+from sql_executor import run_sql_query
+
+
+@pytest.fixture(autouse=True)
+def database(generated_db, monkeypatch):
+    monkeypatch.setattr(sql_executor, "DB_PATH", generated_db)
+
+
+def test_full_result_within_caps():
+    df = run_sql_query("SELECT id, taille, couleur FROM stocks WHERE produit_id <= 10")
+    assert len(df) > 0
+    assert df.attrs['truncated'] is False
+
+
+def test_row_cap():
+    df = run_sql_query("SELECT * FROM stocks", max_rows=1_234)
+    assert len(df) == 1_234
+    assert df.attrs['truncated'] is True
+
+
+def test_byte_cap_stops_reading():
+    full = run_sql_query("SELECT * FROM stocks", max_rows=None, max_bytes=None)
+    budget = int(full.memory_usage(index=False, deep=True).sum() / 10)
+
+    df = run_sql_query("SELECT * FROM stocks", max_rows=None, max_bytes=budget)
+    assert df.attrs['truncated'] is True
+    # Arrêt au lot qui dépasse le budget : au plus un lot de trop
+    assert len(full) / 10 <= len(df) <= len(full) / 10 + sql_executor.BATCH_SIZE
+
+
+def test_default_caps_below_export_caps():
+    assert sql_executor.MAX_MEMORY_ROWS < sql_executor.MAX_ROWS
+    assert sql_executor.MAX_MEMORY_BYTES < sql_executor.MAX_EXPORT_BYTES
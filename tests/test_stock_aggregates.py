@@ -0,0 +1,55 @@
+import random
+import sqlite3
+
+import pytest
+
+from stock_aggregates import check_aggregates, has_aggregates
+
+SIZES = ['XS', 'S', 'M', 'L', 'XL', '42', '30/32', 'TU']
+COLORS = ['Noir', 'Blanc', 'Gris', 'Bleu Marine', 'Rouge', 'Écru']
+
+
+def _random_dml(conn, rng):
+    """Une modification au hasard sur stocks ou produits (chemins couverts par les triggers)."""
+    products = conn.execute("SELECT MAX(id) FROM produits").fetchone()[0]
+    stock_ids = [r[0] for r in conn.execute("SELECT id FROM stocks ORDER BY random() LIMIT 1")]
+    action = rng.choice(['insert', 'quantity', 'variant', 'move', 'delete', 'product'])
+    if action == 'insert' or not stock_ids:
+        conn.execute(
+            "INSERT INTO stocks (produit_id, taille, couleur, quantite_disponible) VALUES (?, ?, ?, ?)",
+            (rng.randint(1, products), rng.choice(SIZES), rng.choice(COLORS), rng.choice([0, 0, 3, 17, 250])),
+        )
+    elif action == 'quantity':
+        conn.execute("UPDATE stocks SET quantite_disponible = ? WHERE id = ?", (rng.randint(0, 40), stock_ids[0]))
+    elif action == 'variant':
+        conn.execute("UPDATE stocks SET taille = ?, couleur = ? WHERE id = ?",
+                     (rng.choice(SIZES), rng.choice(COLORS), stock_ids[0]))
+    elif action == 'move':
+        conn.execute("UPDATE stocks SET produit_id = ? WHERE id = ?", (rng.randint(1, products), stock_ids[0]))
+    elif action == 'delete':
+        conn.execute("DELETE FROM stocks WHERE id = ?", (stock_ids[0],))
+    else:
+        brands = conn.execute("SELECT MAX(id) FROM marques").fetchone()[0]
+        categories = conn.execute("SELECT MAX(id) FROM categories").fetchone()[0]
+        conn.execute("UPDATE produits SET marque_id = ?, categorie_id = ? WHERE id = ?",
+                     (rng.randint(1, brands), rng.randint(1, categories), rng.randint(1, products)))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_aggregates_consistent_after_random_dml(writable_db, seed):
+    conn = sqlite3.connect(writable_db)
+    try:
+        assert has_aggregates(conn)
+        assert check_aggregates(conn) == {}
+        rng = random.Random(seed)
+        for step in range(300):
+            with conn:
+                _random_dml(conn, rng)
+            if step % 100 == 99:
+                assert check_aggregates(conn) == {}, f"divergence après {step + 1} modifications"
+        # Suppression en masse (une variante sur trois) dans une seule transaction
+        with conn:
+            conn.execute("DELETE FROM stocks WHERE id % 3 = 0")
+        assert check_aggregates(conn) == {}
+    finally:
+        conn.close()